@@ -0,0 +1,358 @@
+import multiprocessing as mp
+import queue
+import typing
+
+import numpy as np
+
+from arm_core import Arm
+from arm_parallel_env import SharedArray
+from arm_vec_env import VectorArm
+from exploration_noise import make_noise
+from goal_sampler import make_rngs
+from numpy_policy import NumpyPolicy
+from replay_buffer import ReplayBuffer
+
+BROADCAST_EVERY = 50  # learner updates between two weight broadcasts
+WEIGHTS_POLL_EVERY = 20  # actor steps between two checks for new weights
+
+
+class SharedReplayBuffer(ReplayBuffer):
+    """Replay buffer whose arrays and pointer live in shared memory, the actor processes
+    insert into it and the learner gathers its batches from it under the same lock, so a
+    batch never mixes the fields of a transition with those of the one overwriting it.
+    """
+
+    FIELDS = ("states", "actions", "rewards", "next_states")
+
+    def __init__(
+        self,
+        capacity: int,
+        s_dim: int,
+        a_dim: int,
+        lock=None,
+        names: typing.Dict[str, str] = None,
+        seed: int = None,
+    ):
+        """
+        :param capacity: the maximum number of transitions, the oldest ones are replaced
+        :param s_dim: state dimension
+        :param a_dim: action dimension
+        :param lock: the multiprocessing lock of the inserts
+        :param names: the names of the shared blocks to attach to, new ones if None
+        :param seed: the seed of the sampling
+        """
+        self.lock = lock
+        self._names = names
+        super().__init__(capacity, s_dim, a_dim, np.float32, seed)
+
+    def _allocate(self, dtype):
+        names = self._names or {}
+        shapes = {
+            "states": (self.capacity, self.s_dim),
+            "actions": (self.capacity, self.a_dim),
+            "rewards": (self.capacity, 1),
+            "next_states": (self.capacity, self.s_dim),
+        }
+        self._shared = {
+            field: SharedArray(shape, dtype, name=names.get(field))
+            for field, shape in shapes.items()
+        }
+        self._shared["header"] = SharedArray((1,), np.int64, name=names.get("header"))
+        for field in self.FIELDS:
+            setattr(self, field, self._shared[field].array)
+        self._header = self._shared["header"].array
+        if not names:
+            self.pointer = 0
+
+    @property
+    def pointer(self) -> int:
+        """total number of transitions inserted, read from shared memory"""
+        return int(self._header[0])
+
+    @pointer.setter
+    def pointer(self, value: int):
+        self._header[0] = value
+
+    def spec(self) -> typing.Tuple:
+        """returns what another process needs to attach to the buffer"""
+        names = {field: shared.shm.name for field, shared in self._shared.items()}
+        return self.capacity, self.s_dim, self.a_dim, self.lock, names
+
+    def add(self, s, a, r, s_) -> int:
+        with self.lock:
+            return super().add(s, a, r, s_)
+
+    def add_batch(
+        self,
+        states: np.ndarray,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        next_states: np.ndarray,
+    ) -> np.ndarray:
+        with self.lock:
+            return super().add_batch(states, actions, rewards, next_states)
+
+    def gather(
+        self, indices: np.ndarray
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        with self.lock:
+            return super().gather(indices)
+
+    def state_dict(self) -> typing.Dict[str, np.ndarray]:
+        with self.lock:
+            return super().state_dict()
+
+    def close(self):
+        """releases the shared blocks, the process that created them also destroys them"""
+        self.states = self.actions = self.rewards = self.next_states = None
+        self._header = None
+        for shared in self._shared.values():
+            shared.close()
+
+
+class SharedWeights(object):
+    """The actor weights in a shared block guarded by a version counter (a seqlock), the
+    learner writes them and the actors read a consistent copy when the version changed.
+    """
+
+    def __init__(
+        self,
+        shapes: typing.Sequence[typing.Tuple],
+        names: typing.Tuple[str, str] = None,
+    ):
+        """
+        :param shapes: the shapes of the weight arrays
+        :param names: the names of the shared blocks to attach to, new ones if None
+        """
+        self.shapes = [tuple(shape) for shape in shapes]
+        self.sizes = [int(np.prod(shape)) for shape in self.shapes]
+        names = names or (None, None)
+        self._values = SharedArray((sum(self.sizes),), np.float32, name=names[0])
+        self._version = SharedArray((1,), np.int64, name=names[1])
+
+    def spec(self) -> typing.Tuple:
+        """returns what another process needs to attach to the weights"""
+        return self.shapes, (self._values.shm.name, self._version.shm.name)
+
+    @property
+    def version(self) -> int:
+        return int(self._version.array[0])
+
+    def write(self, weights: typing.Sequence[np.ndarray]):
+        """
+        Publishes new weights, the version is odd while they are written.
+        :param weights: the weight arrays
+        :return:
+        """
+        self._version.array[0] += 1
+        self._values.array[:] = np.concatenate([np.ravel(w) for w in weights])
+        self._version.array[0] += 1
+
+    def read(
+        self, known_version: int = -1
+    ) -> typing.Tuple[typing.Optional[typing.List[np.ndarray]], int]:
+        """
+        Copies the weights if they changed since the known version.
+        :param known_version: the version of the weights the reader already has
+        :return: the weight arrays, None if there is nothing new, and their version
+        """
+        while True:
+            version = self.version
+            if version == known_version:
+                return None, version
+            if version % 2 == 1:
+                continue  # being written
+            values = self._values.array.copy()
+            if self.version == version:
+                break
+        weights, start = [], 0
+        for shape, size in zip(self.shapes, self.sizes):
+            weights.append(values[start : start + size].reshape(shape))
+            start += size
+        return weights, version
+
+    def close(self):
+        self._values.close()
+        self._version.close()
+
+
+def _actor(
+    index: int,
+    arm: Arm,
+    buffer_spec: typing.Tuple,
+    weights_spec: typing.Tuple,
+    a_bound: float,
+    episodes,
+    stop,
+    n_actors: int,
+    n_envs: int,
+    max_ep_steps: int,
+    noise: str,
+    noise_sigma: float,
+    seed: typing.Optional[int],
+):
+    """
+    Actor loop, it steps its own batch of arms with the latest published policy and pushes
+    the transitions into the shared replay buffer. It never imports tensorflow.
+    """
+    capacity, s_dim, a_dim, lock, names = buffer_spec
+    memory = SharedReplayBuffer(capacity, s_dim, a_dim, lock, names)
+    weights = SharedWeights(*weights_spec)
+    venv = VectorArm(arm, n_envs)
+    # the envs and the noise of every actor draw from their own children of the seed
+    rngs = make_rngs(seed, n_actors * (n_envs + 1))
+    venv.rngs = rngs[index * n_envs : (index + 1) * n_envs]
+    noise = make_noise(noise, n_envs, a_dim, noise_sigma)
+    if noise is not None:
+        noise.rng = rngs[n_actors * n_envs + index]
+    values, version = weights.read()
+    policy = NumpyPolicy(*values, a_bound)
+    ep_r = np.zeros(n_envs)
+    ep_steps = np.zeros(n_envs, dtype=np.int64)
+    s = venv.reset()
+    step = 0
+    try:
+        while not stop.is_set():
+            a = policy.choose_actions(s, noise)
+            s_, r, done = venv.step(a)
+            memory.add_batch(s, a, r, s_)
+            ep_r += r
+            s = s_
+            finished = np.flatnonzero(done | (ep_steps == max_ep_steps - 1))
+            for k in finished:
+                episodes.put((float(ep_r[k]), int(ep_steps[k]), bool(done[k])))
+            ep_steps += 1
+            if len(finished) > 0:
+                ep_r[finished] = 0.0
+                ep_steps[finished] = 0
+                s = venv.reset(finished)
+                if noise:
+                    noise.reset(finished)
+            step += 1
+            if step % WEIGHTS_POLL_EVERY == 0:
+                values, version = weights.read(version)
+                if values is not None:
+                    policy = NumpyPolicy(*values, a_bound)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        memory.close()
+        weights.close()
+
+
+class ActorLearner(object):
+    """Decoupled experience collection: actor processes run copies of the policy with numpy
+    against their own batch of arms and push the transitions into a shared replay buffer,
+    while the learner, the process that owns this object, trains the model on it and
+    periodically broadcasts the actor weights back through shared memory."""
+
+    def __init__(
+        self,
+        arm: Arm,
+        model,
+        n_actors: int,
+        n_envs: int = 1,
+        max_ep_steps: int = 300,
+        noise: str = None,
+        noise_sigma: float = 0.1,
+        seed: int = None,
+        start_method: str = "spawn",
+    ):
+        """
+        :param arm: the template arm
+        :param model: the DDPG model trained by the learner, its memory is replaced by the
+            shared buffer, keeping the transitions it already holds
+        :param n_actors: the number of actor processes
+        :param n_envs: the number of arms stepped by every actor
+        :param max_ep_steps: the maximum number of steps of an episode
+        :param noise: the exploration noise of the actors, "gaussian", "ou" or None
+        :param noise_sigma: the scale of the exploration noise
+        :param seed: the root seed of the envs and the noise of the actors
+        :param start_method: the multiprocessing start method, spawn keeps tensorflow out
+            of the actors
+        """
+        context = mp.get_context(start_method)
+        self.model = model
+        self.memory = SharedReplayBuffer(
+            model.memory.capacity, model.s_dim, model.a_dim, context.Lock()
+        )
+        if model.pointer > 0:
+            self.memory.load_state_dict(model.memory.state_dict())
+        self.memory.rng = model.memory.rng  # the sampling keeps its stream
+        model.memory = self.memory
+        self.weights = SharedWeights([w.shape for w in model.actor_weights()])
+        self.broadcast()
+
+        self._episodes = context.Queue()
+        self._stop = context.Event()
+        self._processes = []
+        for index in range(n_actors):
+            process = context.Process(
+                target=_actor,
+                args=(
+                    index,
+                    arm,
+                    self.memory.spec(),
+                    self.weights.spec(),
+                    model.a_bound,
+                    self._episodes,
+                    self._stop,
+                    n_actors,
+                    n_envs,
+                    max_ep_steps,
+                    noise,
+                    noise_sigma,
+                    seed,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        self.closed = False
+
+    def broadcast(self):
+        """
+        Publishes the current actor weights of the model to the actors.
+        :return:
+        """
+        self.weights.write(self.model.actor_weights())
+
+    def episodes(self) -> typing.List[typing.Tuple[float, int, bool]]:
+        """
+        Collects the episodes the actors completed since the last call.
+        :return: a list of (reward, steps, done)
+        """
+        completed = []
+        while True:
+            try:
+                completed.append(self._episodes.get_nowait())
+            except queue.Empty:
+                return completed
+
+    def close(self):
+        """
+        Stops the actors and releases the shared memory.
+        :return:
+        """
+        if self.closed:
+            return
+        self._stop.set()
+        for process in self._processes:
+            # an actor only exits once its queued episodes are flushed into the pipe
+            while process.is_alive():
+                self.episodes()
+                process.join(0.1)
+        self.episodes()
+        self.model.memory = ReplayBuffer(
+            self.memory.capacity, self.memory.s_dim, self.memory.a_dim
+        )
+        self.model.memory.load_state_dict(self.memory.state_dict())
+        self.memory.close()
+        self.weights.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,439 @@
+from __future__ import annotations
+import math
+import typing
+
+import numpy as np
+
+from arm_kinematics import update_forward_kinematics
+from goal_sampler import GoalSampler, GoalSource
+from math_utils import Point2D, Size2D, deg2rad
+
+
+class ArmLink(object):
+    """Arm link class, based on our implementation a single arm could have multiple links.
+    A link does not keep its own pose, it is a view over the kinematic arrays of the arm it belongs to.
+    """
+
+    def __init__(
+        self,
+        arm: Arm,
+        index: int,
+        length: int,
+        width: int,
+        color: tuple,
+        constraints: typing.List[int] = [0, math.pi],
+    ):
+        """
+        :param arm: the arm the link belongs to
+        :param index: the position of the link in the arm chain
+        :param length: the length of the link
+        :param width: the width of the link
+        :param color: the color of the link
+        :param constraints: the [min, max] range of the local angle
+        """
+        self.arm = arm
+        self.index = index
+        self.length = length
+        self.width = width
+        self.color = color
+        self.constraints = constraints
+
+    @property
+    def parent(self):
+        """get the parent link, None for the first link of the arm"""
+        return self.arm.links[self.index - 1] if self.index > 0 else None
+
+    @property
+    def constraints(self):
+        """get the [min, max] range of the local angle"""
+        return [self.arm.lower_limits[self.index], self.arm.upper_limits[self.index]]
+
+    @constraints.setter
+    def constraints(self, constraints: typing.List[int]):
+        """set the [min, max] range of the local angle"""
+        self.arm.lower_limits[self.index] = constraints[0]
+        self.arm.upper_limits[self.index] = constraints[1]
+
+    @property
+    def dirty(self) -> bool:
+        """true if the pose of the link is waiting to be recomputed"""
+        return self.index >= self.arm.dirty_from
+
+    @property
+    def origin(self):
+        """get the origin of the arm link"""
+        return Point2D.from_array(self.arm.origins[self.index])
+
+    @property
+    def endpoint(self):
+        """get the endpoint of the arm link"""
+        return Point2D.from_array(self.arm.endpoints[self.index])
+
+    @property
+    def global_angle(self):
+        """get the global angle of the arm link"""
+        return self.arm.global_angles[self.index]
+
+    @global_angle.setter
+    def global_angle(self, angle: int):
+        """ "set the global angle making sure that it falls into the 0, math.pi range
+        :param angle:
+        :return:
+        """
+        self.angle = self.remove_offset_angle(angle)
+
+    @property
+    def angle(self):
+        """get the local angle of the arm link"""
+        return self.arm.angles[self.index]
+
+    @angle.setter
+    def angle(self, angle: int):
+        """set the local angle making sure that it falls into the 0, math.pi range
+        :param angle:
+        :return:
+        """
+        self.arm.set_link_angle(self.index, angle)
+
+    def get_offset_angle(self, angle) -> float:
+        """
+        Returns the angle with the offset from the parent.
+        :param angle:
+        :return:
+        """
+        # from the parent and returns
+        if self.parent is not None:
+            offset = angle - math.pi / 2 + self.parent.global_angle
+            return offset % (2 * math.pi)
+        else:
+            return angle
+
+    def remove_offset_angle(self, angle) -> float:
+        """
+        Removes the offset from the parent and returns
+        :param angle:
+        :return:
+        """
+        if self.parent:
+            offset = angle - self.parent.global_angle + math.pi / 2
+            return offset % (2 * math.pi)
+        else:
+            return angle
+
+    def angle_to(self, point: typing.Union[typing.List, Point2D]) -> float:
+        """
+        Returns the angle between the arm link origin and a point.
+        :param point:
+        :return:
+        """
+        x, y = self.arm.origins[self.index]
+        return math.atan2(point[1] - y, point[0] - x)
+
+    # X=(xcosθ+ysinθ) and and Y=(−xsinθ+ycosθ).
+
+    def point_at(self, angle: typing.Union[float, int]) -> Point2D:
+        """
+        get the coordinates of a point at the specified angle and distance from the link's origin,
+        this function is mainly used to compute the endpoint of the link
+        :param angle:
+        :return:
+        """
+        # angle = self.remove_offset_angle()
+        return Point2D(
+            self.origin.x + self.length * math.cos(angle),
+            self.origin.y + self.length * math.sin(angle),
+        )
+
+    def distance_to(self, point: typing.Union[typing.List, Point2D]) -> float:
+        """
+        Returns the distance for the link endpoint to a given point.
+        :param point:
+        :return:
+        """
+        x, y = self.arm.endpoints[self.index]
+        return math.hypot(point[0] - x, point[1] - y)
+
+
+class Arm(object):
+    """A class to represent an arm, based on our implementation a single arm could
+    have multiple links. The joint angles are kept in a numpy array and the pose of
+    every link is computed in a single forward kinematics pass, the links are just
+    views over these arrays. Changing the joint k marks k and its descendants as dirty
+    and their pose is lazily recomputed from the first dirty joint down."""
+
+    def __init__(
+        self,
+        origin: Point2D,
+        env_size: Size2D,
+        link_width: int = 1,
+        goal: typing.List = None,
+        seed: int = None,
+    ):
+        """
+        :param origin: the origin of the arm
+        :param env_size: the size of the environment
+        :param link_width: the width of the arm link
+        :param goal: the goal point
+        :param seed: the seed of the random generator used to reset the arm
+        """
+        # arm
+        self.origin = origin
+        self.links = []
+        self.link_width = link_width
+        # kinematics
+        self.lengths = np.zeros(0)
+        self.lower_limits = np.zeros(0)
+        self.upper_limits = np.zeros(0)
+        self._angles = np.zeros(0)
+        self._gangles = np.zeros(0)
+        self._origins = np.zeros((0, 2))
+        self._endpoints = np.zeros((0, 2))
+        self.dirty_from = 0  # index of the first link whose pose is stale
+        # goal
+        self.goal_len = 30
+        self.goal = goal if goal else [500, 500, self.goal_len]
+        self.on_goal = 0
+        self.goal_sampler: GoalSource = None  # defaults to the arm's reachable annulus
+        self._default_goal_sampler = None
+        self.rng = np.random.default_rng(seed)
+        # env attributes
+        self.state_dim = 9
+        self.action_dim = 2
+        self.action_bound = [-1, +1]
+        self.env_size = env_size
+        self._env_scale = env_size.to_array()
+
+        self.step_size = 0.05  # granularity
+
+    def head(self):
+        """returns the last link of the arm"""
+        return self.links[-1] if len(self.links) > 0 else None
+
+    def tail(self):
+        """returns the first link of the arm"""
+        return self.links[0] if len(self.links) > 0 else None
+
+    def add_link(self, length: int, color: tuple = (255, 255, 255)):
+        """
+        Adds a link to the arm.
+        :param length:
+        :param width:
+        :param color:
+        :return:
+        """
+        self.lengths = np.append(self.lengths, float(length))
+        self.lower_limits = np.append(self.lower_limits, 0.0)
+        self.upper_limits = np.append(self.upper_limits, math.pi)
+        self._angles = np.append(self._angles, 0.0)
+        self._gangles = np.append(self._gangles, 0.0)
+        self._origins = np.append(self._origins, [[0.0, 0.0]], axis=0)
+        self._endpoints = np.append(self._endpoints, [[0.0, 0.0]], axis=0)
+        self.invalidate(len(self.links))
+        self._default_goal_sampler = None
+        self.links.append(
+            ArmLink(self, len(self.links), length, self.link_width, color)
+        )
+
+        self.action_dim = len(self.links)
+        self.state_dim = 4 * self.action_dim + 1  # total number of observations
+
+    @property
+    def angles(self) -> np.ndarray:
+        """get the local angles of the arm links, the returned array must not be modified"""
+        return self._angles
+
+    @angles.setter
+    def angles(self, angles: np.ndarray):
+        """set the local angles of the arm links making sure they fall into the links constraints"""
+        self._angles = np.clip(
+            np.asarray(angles, dtype=np.float64), self.lower_limits, self.upper_limits
+        )
+        self.invalidate(0)
+
+    def set_link_angle(self, index: int, angle: float):
+        """
+        Sets the local angle of a single link making sure it falls into the link constraints.
+        :param index: the index of the link
+        :param angle: the angle in radians
+        :return:
+        """
+        angle = min(max(angle, self.lower_limits[index]), self.upper_limits[index])
+        if angle != self._angles[index]:
+            self._angles[index] = angle
+            self.invalidate(index)
+
+    def invalidate(self, index: int = 0):
+        """
+        Marks the link at the given index and all its descendants as dirty.
+        :param index: the index of the first link whose pose changed
+        :return:
+        """
+        self.dirty_from = min(self.dirty_from, index)
+
+    def _update_kinematics(self):
+        """recomputes the pose of the dirty links, from the first dirty joint down"""
+        if self.dirty_from < len(self.links):
+            update_forward_kinematics(
+                self.origin,
+                self._angles,
+                self.lengths,
+                self._gangles,
+                self._origins,
+                self._endpoints,
+                self.dirty_from,
+            )
+        self.dirty_from = len(self.links)
+
+    @property
+    def global_angles(self) -> np.ndarray:
+        """get the global angles of the arm links, shape (n_links,)"""
+        self._update_kinematics()
+        return self._gangles
+
+    @property
+    def origins(self) -> np.ndarray:
+        """get the origins of the arm links, shape (n_links, 2)"""
+        self._update_kinematics()
+        return self._origins
+
+    @property
+    def endpoints(self) -> np.ndarray:
+        """get the endpoints of the arm links, shape (n_links, 2)"""
+        self._update_kinematics()
+        return self._endpoints
+
+    def set_angles(self, *angles: int):
+        """
+        Sets the angles of the arm links.
+        :param angles:
+        :return:
+        """
+        if len(angles) != len(self.links):
+            raise ValueError("Invalid number of angles specified.")
+        self.angles = deg2rad(np.asarray(angles, dtype=np.float64))
+
+    def get_observation(self, goal: typing.List = None) -> np.ndarray:
+        """
+        Returns the observation of the arm.
+        :param goal: the goal point
+        :return: the observation of the arm
+        """
+        endpoints = self.endpoints
+        goal = np.asarray(goal[:2], dtype=np.float64)
+        return np.concatenate(
+            (
+                (endpoints / self._env_scale).ravel(),  # normalize
+                ((goal - endpoints) / self._env_scale).ravel(),  # normalize
+            )
+        )
+
+    def get_reward(self, goal: typing.List) -> float:
+        """
+        Returns the reward of the arm.
+        """
+        x, y = self.endpoints[-1]
+        return -math.sqrt((goal[0] - x) ** 2 + (goal[1] - y) ** 2) / max(
+            self.env_size.width, self.env_size.height
+        )
+
+    def _goal_hit(self) -> typing.Tuple[bool, bool]:
+        """
+        Checks whether the endpoint of the arm falls into the goal box.
+        :return: a tuple with the result of the check along the x and y axis
+        """
+        x, y = self.endpoints[-1]
+        half = self.goal[2] / 2
+        return (
+            self.goal[0] - half < x < self.goal[0] + half,
+            self.goal[1] - half < y < self.goal[1] + half,
+        )
+
+    def _check_on_goal(self):
+        """updates the on goal flag after the goal or the arm were reset"""
+        in_x, in_y = self._goal_hit()
+        self.on_goal = 1 if in_x and in_y else 0
+
+    def get_goal_sampler(self) -> GoalSource:
+        """returns the goal sampler used by reset, by default goals are drawn from the
+        annulus the arm can reach"""
+        if self.goal_sampler is not None:
+            return self.goal_sampler
+        if self._default_goal_sampler is None:
+            self._default_goal_sampler = GoalSampler.from_arm(self)
+        return self._default_goal_sampler
+
+    def step(self, action: typing.List) -> typing.Tuple:
+        """
+        Performs a step in the environment.
+        :param action: the action to perform defined as the angle of each link
+        """
+        done = False
+        n = len(action)
+        angles = np.clip(
+            self._angles[:n] + np.clip(action, -1, 1) * self.step_size,
+            self.lower_limits[:n],
+            self.upper_limits[:n],
+        )
+        # only the links from the first joint that moved are recomputed, none when every
+        # joint is still or pinned at its limits
+        moved = np.flatnonzero(angles != self._angles[:n])
+        if len(moved) > 0:
+            self._angles[:n] = angles
+            self.invalidate(int(moved[0]))
+
+        r = self.get_reward(self.goal)
+
+        # done and reward
+        in_x, in_y = self._goal_hit()
+        if in_x:
+            if in_y:
+                r += 1.0
+                self.on_goal += 1
+                if self.on_goal > 50:  # if it is over the goal for 50 times
+                    done = True
+        else:
+            self.on_goal = 0
+
+        observations = self.get_observation(self.goal)
+        s = np.concatenate((observations, [1.0 if self.on_goal else 0.0]))
+
+        return s, r, done
+
+    def reset(self):
+        """
+        Draws a new goal within the arm's range and randomizes the arm angles, both
+        from the arm's random generator so resets are reproducible given the seed.
+        :return: the observation of the arm
+        """
+        u = self.rng.random(3 + len(self.links))
+        self.goal = self.get_goal_sampler().from_uniform(u[None, :3])[0].tolist()
+
+        # randomize arm angles
+        self.angles = self.lower_limits + u[3:] * (
+            self.upper_limits - self.lower_limits
+        )
+
+        # check if on goal
+        self._check_on_goal()
+
+        observations = self.get_observation(self.goal)
+
+        s = np.concatenate((observations, [1.0 if self.on_goal else 0.0]))
+        return s
+
+    def setenv(self, goal) -> np.ndarray:
+
+        self.goal = goal
+        # check if on goal
+        self._check_on_goal()
+
+        # for link in self.links: # randomize arm angles
+        #    link.angle = math.pi * np.random.rand(1)[0]
+
+        observations = self.get_observation(self.goal)
+
+        s = np.concatenate((observations, [1.0 if self.on_goal else 0.0]))
+        return s
+
+    def __getitem__(self, item):
+        return self.links[item] if item < len(self.links) else None
@@ -0,0 +1,223 @@
+import math
+import typing
+
+import numpy as np
+
+from arm_kinematics import forward_kinematics
+
+
+def _wrap(angles: np.ndarray) -> np.ndarray:
+    """wraps angles into the [-pi, pi) range"""
+    return (angles + math.pi) % (2 * math.pi) - math.pi
+
+
+def _violation(angles: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """total amount by which each row of angles falls out of the joint limits"""
+    return (np.clip(lower - angles, 0, None) + np.clip(angles - upper, 0, None)).sum(
+        axis=-1
+    )
+
+
+def solve_two_link(
+    base: np.ndarray,
+    lengths: np.ndarray,
+    targets: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Closed form inverse kinematics of a 2-link arm for a batch of targets. Among the two
+    elbow configurations the one that satisfies the joint limits is picked.
+    :param base: (x, y) of the arm origin
+    :param lengths: the lengths of the two links
+    :param targets: the targets with shape (n, 2)
+    :param lower: the lower limits of the local angles, shape (2,)
+    :param upper: the upper limits of the local angles, shape (2,)
+    :return: the local angles with shape (n, 2) and a mask of the targets that were reached
+    """
+    l1, l2 = lengths
+    d = np.asarray(targets, dtype=np.float64) - np.asarray(base, dtype=np.float64)
+    dist = np.hypot(d[:, 0], d[:, 1])
+    reachable = (dist <= l1 + l2) & (dist >= abs(l1 - l2))
+    # unreachable targets are projected to the closest reachable distance
+    dist = np.clip(dist, abs(l1 - l2), l1 + l2)
+    cos_q = np.clip((dist**2 - l1**2 - l2**2) / (2 * l1 * l2), -1.0, 1.0)
+    heading = np.arctan2(d[:, 1], d[:, 0])
+
+    candidates = []
+    for q in (np.arccos(cos_q), -np.arccos(cos_q)):
+        a0 = _wrap(heading - np.arctan2(l2 * np.sin(q), l1 + l2 * np.cos(q)))
+        # the local angle of the second link is offset by pi/2 from its parent
+        candidates.append(np.stack((a0, q + math.pi / 2), axis=-1))
+    candidates = np.stack(candidates)  # (2, n, 2)
+
+    violation = _violation(candidates, lower, upper)
+    best = np.argmin(violation, axis=0)
+    rows = np.arange(len(d))
+    angles = np.clip(candidates[best, rows], lower, upper)
+    reached = reachable & (violation[best, rows] <= 1e-9)
+    return angles, reached
+
+
+def jacobian(lengths: np.ndarray, gangles: np.ndarray) -> np.ndarray:
+    """
+    Jacobian of the arm endpoint with respect to the local joint angles. Every local
+    angle rotates all the links after it, so column k sums the tangents of the links k..n.
+    :param lengths: link lengths with shape (n_links,)
+    :param gangles: global angles with shape (..., n_links)
+    :return: the jacobian with shape (..., 2, n_links)
+    """
+    tangents = np.stack(
+        (-lengths * np.sin(gangles), lengths * np.cos(gangles)), axis=-2
+    )  # (..., 2, n_links)
+    return np.flip(np.cumsum(np.flip(tangents, axis=-1), axis=-1), axis=-1)
+
+
+def _dls_step(
+    j: np.ndarray, error: np.ndarray, damping_matrix: np.ndarray
+) -> np.ndarray:
+    """damped least squares update J^T (J J^T + lambda^2 I)^-1 e for a batch of jacobians"""
+    jt = np.swapaxes(j, -1, -2)
+    return (jt @ np.linalg.solve(j @ jt + damping_matrix, error[..., None]))[..., 0]
+
+
+def solve_damped_least_squares(
+    base: np.ndarray,
+    lengths: np.ndarray,
+    targets: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    initial: np.ndarray = None,
+    damping: float = None,
+    tolerance: float = 0.5,
+    max_iters: int = 100,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Damped least squares inverse kinematics for a batch of targets, every iteration
+    updates the whole batch at once and the angles are clipped to the joint limits.
+    :param base: (x, y) of the arm origin
+    :param lengths: link lengths with shape (n_links,)
+    :param targets: the targets with shape (n, 2)
+    :param lower: the lower limits of the local angles, shape (n_links,)
+    :param upper: the upper limits of the local angles, shape (n_links,)
+    :param initial: the starting angles, (n_links,) or (n, n_links), the middle of the
+        joint ranges if None
+    :param damping: the damping factor, a tenth of the mean link length if None
+    :param tolerance: the distance at which a target is considered reached
+    :param max_iters: the maximum number of iterations
+    :return: the local angles with shape (n, n_links) and a mask of the targets that were reached
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    n = len(targets)
+    if initial is None:
+        initial = (lower + upper) / 2
+    angles = np.array(np.broadcast_to(initial, (n, len(lengths))), dtype=np.float64)
+    if damping is None:
+        damping = 0.1 * float(np.mean(lengths))
+    damping_matrix = damping**2 * np.eye(2)
+
+    active = np.ones(n, dtype=bool)
+    for _ in range(max_iters):
+        gangles, _, endpoints = forward_kinematics(base, angles[active], lengths)
+        error = targets[active] - endpoints[:, -1, :]
+        pending = np.hypot(error[:, 0], error[:, 1]) > tolerance
+        indices = np.flatnonzero(active)
+        active[indices[~pending]] = False
+        if not active.any():
+            break
+        rows = indices[pending]
+        j = jacobian(lengths, gangles[pending])
+        delta = _dls_step(j, error[pending], damping_matrix)
+        # joints pushed against their limits are locked so the rest of the chain takes over
+        locked = ((angles[rows] <= lower) & (delta < 0)) | (
+            (angles[rows] >= upper) & (delta > 0)
+        )
+        if locked.any():
+            j *= ~locked[:, None, :]
+            delta = _dls_step(j, error[pending], damping_matrix)
+        angles[rows] = np.clip(angles[rows] + delta, lower, upper)
+
+    _, _, endpoints = forward_kinematics(base, angles, lengths)
+    error = targets - endpoints[:, -1, :]
+    return angles, np.hypot(error[:, 0], error[:, 1]) <= tolerance
+
+
+class ArmIKSolver(object):
+    """Inverse kinematics for the geometry of an arm. The 2-link case is solved in closed
+    form, longer arms use the damped least squares solver, restarting from random
+    configurations the targets it got stuck on."""
+
+    def __init__(
+        self,
+        arm,
+        tolerance: float = 0.5,
+        max_iters: int = 100,
+        restarts: int = 4,
+        seed: int = 0,
+    ):
+        """
+        :param arm: the arm, its origin, link lengths and joint limits are used
+        :param tolerance: the distance at which a target is considered reached
+        :param max_iters: the maximum number of iterations of the numerical solver
+        :param restarts: the number of random restarts for the targets that were not reached
+        :param seed: the seed of the random restarts
+        """
+        self.base = arm.origin.to_array()
+        self.lengths = arm.lengths.copy()
+        self.lower = arm.lower_limits.copy()
+        self.upper = arm.upper_limits.copy()
+        self.tolerance = tolerance
+        self.max_iters = max_iters
+        self.restarts = restarts
+        self.rng = np.random.default_rng(seed)
+
+    def solve(
+        self, targets: np.ndarray, initial: np.ndarray = None
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes the local angles that move the arm endpoint to the targets.
+        :param targets: the targets with shape (n, 2)
+        :param initial: the starting angles of the numerical solver
+        :return: the local angles with shape (n, n_links) and a mask of the targets that were reached
+        """
+        targets = np.atleast_2d(np.asarray(targets, dtype=np.float64))
+        if len(self.lengths) == 2:
+            angles, reached = solve_two_link(
+                self.base, self.lengths, targets, self.lower, self.upper
+            )
+            if reached.all():
+                return angles, reached
+            # out of the limits, the numerical solver finds the closest configuration
+            initial = angles if initial is None else initial
+        angles, reached = self.refine(targets, initial)
+        for _ in range(self.restarts):
+            missing = np.flatnonzero(~reached)
+            if len(missing) == 0:
+                break
+            start = self.rng.uniform(
+                self.lower, self.upper, (len(missing), len(self.lengths))
+            )
+            retry, ok = self.refine(targets[missing], start)
+            angles[missing[ok]] = retry[ok]
+            reached[missing[ok]] = True
+        return angles, reached
+
+    def refine(
+        self, targets: np.ndarray, initial: np.ndarray = None
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Refines a configuration, e.g. the output of the policy, with the numerical solver.
+        :param targets: the targets with shape (n, 2)
+        :param initial: the starting angles, (n_links,) or (n, n_links)
+        :return: the local angles with shape (n, n_links) and a mask of the targets that were reached
+        """
+        return solve_damped_least_squares(
+            self.base,
+            self.lengths,
+            np.atleast_2d(np.asarray(targets, dtype=np.float64)),
+            self.lower,
+            self.upper,
+            initial=initial,
+            tolerance=self.tolerance,
+            max_iters=self.max_iters,
+        )
@@ -0,0 +1,77 @@
+import math
+import typing
+
+import numpy as np
+
+
+def global_angles(angles: np.ndarray) -> np.ndarray:
+    """
+    Converts local joint angles into global link angles.
+    Every link is offset by -pi/2 from its parent, so the global angle of the
+    link i is sum(angles[:i + 1]) - i * pi/2 (wrapped into [0, 2pi) for i > 0).
+    :param angles: local joint angles with shape (..., n_links)
+    :return: global link angles with shape (..., n_links)
+    """
+    angles = np.asarray(angles, dtype=np.float64)
+    offsets = np.arange(angles.shape[-1]) * (math.pi / 2)
+    gangles = np.cumsum(angles, axis=-1) - offsets
+    gangles[..., 1:] %= 2 * math.pi
+    return gangles
+
+
+def forward_kinematics(
+    base: np.ndarray, angles: np.ndarray, lengths: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the global angles, origins and endpoints of every link in one
+    cumulative pass over the chain.
+    :param base: (x, y) of the arm origin, shape (2,) or (..., 2)
+    :param angles: local joint angles with shape (..., n_links)
+    :param lengths: link lengths with shape (n_links,)
+    :return: global angles (..., n_links), origins (..., n_links, 2) and
+        endpoints (..., n_links, 2)
+    """
+    gangles = global_angles(angles)
+    base = np.asarray(base, dtype=np.float64)[..., None, :]
+    segments = np.stack((lengths * np.cos(gangles), lengths * np.sin(gangles)), axis=-1)
+    endpoints = base + np.cumsum(segments, axis=-2)
+    origins = np.concatenate(
+        (np.broadcast_to(base, endpoints[..., :1, :].shape), endpoints[..., :-1, :]),
+        axis=-2,
+    )
+    return gangles, origins, endpoints
+
+
+def update_forward_kinematics(
+    base: np.ndarray,
+    angles: np.ndarray,
+    lengths: np.ndarray,
+    gangles: np.ndarray,
+    origins: np.ndarray,
+    endpoints: np.ndarray,
+    start: int,
+):
+    """
+    Recomputes in place the pose of the links from `start` to the end of the chain,
+    the links before `start` are assumed to be up to date.
+    :param base: (x, y) of the arm origin
+    :param angles: local joint angles with shape (n_links,)
+    :param lengths: link lengths with shape (n_links,)
+    :param gangles: global angles to update, shape (n_links,)
+    :param origins: link origins to update, shape (n_links, 2)
+    :param endpoints: link endpoints to update, shape (n_links, 2)
+    :param start: the index of the first link that changed
+    :return:
+    """
+    if start == 0:
+        gangles[:], origins[:], endpoints[:] = forward_kinematics(base, angles, lengths)
+        return
+    chain = np.cumsum(angles[start:] - math.pi / 2)
+    gangles[start:] = (gangles[start - 1] + chain) % (2 * math.pi)
+    tail = lengths[start:]
+    segments = np.stack(
+        (tail * np.cos(gangles[start:]), tail * np.sin(gangles[start:])), axis=-1
+    )
+    endpoints[start:] = endpoints[start - 1] + np.cumsum(segments, axis=0)
+    origins[start] = endpoints[start - 1]
+    origins[start + 1 :] = endpoints[start:-1]
@@ -0,0 +1,296 @@
+import multiprocessing as mp
+import typing
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+from arm_core import Arm
+from arm_vec_env import VectorArm
+from goal_sampler import make_rngs
+
+
+class SharedArray(object):
+    """A numpy array backed by a `multiprocessing.shared_memory` block."""
+
+    def __init__(self, shape: typing.Tuple, dtype, name: str = None):
+        """
+        :param shape: the shape of the array
+        :param dtype: the type of the array
+        :param name: the name of an existing block to attach to, a new one is created if None
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    def spec(self) -> typing.Tuple:
+        """returns what a worker needs to attach to the block"""
+        return self.shape, self.dtype.str, self.shm.name
+
+    def close(self):
+        """releases the block, the owner also destroys it"""
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker(
+    conn,
+    arm: Arm,
+    specs: typing.Dict,
+    start: int,
+    stop: int,
+    n_envs: int,
+    seed: typing.Optional[int],
+):
+    """
+    Worker loop, it steps the envs [start, stop) of the batch reading the actions from and
+    writing the results into the shared buffers.
+    """
+    buffers = {key: SharedArray(*spec[:2], name=spec[2]) for key, spec in specs.items()}
+    actions, observations = buffers["actions"].array, buffers["observations"].array
+    rewards, dones = buffers["rewards"].array, buffers["dones"].array
+    angles, goals = buffers["angles"].array, buffers["goals"].array
+    venv = VectorArm(arm, stop - start)
+    # the same streams a single VectorArm with n_envs would give to these envs
+    venv.rngs = make_rngs(seed, n_envs)[start:stop]
+    try:
+        while True:
+            command, payload = conn.recv()
+            if command == "step":
+                s, r, done = venv.step(actions[start:stop])
+                observations[start:stop] = s
+                rewards[start:stop] = r
+                dones[start:stop] = done
+            elif command == "reset":
+                observations[start:stop] = venv.reset(payload)
+                dones[start:stop] = False
+            elif command == "rng_states":
+                conn.send(venv.rng_states())
+                continue
+            elif command == "set_rng_states":
+                venv.set_rng_states(payload)
+            elif command == "close":
+                break
+            angles[start:stop] = venv.angles
+            goals[start:stop] = venv.goals
+            conn.send(command)
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        for buffer in buffers.values():
+            buffer.close()
+        conn.close()
+
+
+class ParallelVectorArm(object):
+    """A batch of arms sharded across worker processes. Actions and results are exchanged
+    through shared memory, the pipes only carry short commands. It exposes the same
+    `step`/`reset` interface as `VectorArm` (lockstep mode) plus `step_async`/`step_wait`
+    to collect the first shards that are ready."""
+
+    def __init__(
+        self,
+        arm: Arm,
+        n_envs: int,
+        n_workers: int = None,
+        seed: int = None,
+        start_method: str = None,
+    ):
+        """
+        :param arm: the template arm
+        :param n_envs: the number of arms in the batch
+        :param n_workers: the number of worker processes, one per cpu if None
+        :param seed: the root seed of the per-env random generators
+        :param start_method: the multiprocessing start method, the platform default if None
+        """
+        n_workers = min(n_workers or mp.cpu_count(), n_envs)
+        self.n_envs = n_envs
+        self.n_workers = n_workers
+        self.state_dim = arm.state_dim
+        self.action_dim = arm.action_dim
+        self.action_bound = arm.action_bound
+
+        self._buffers = {
+            "actions": SharedArray((n_envs, arm.action_dim), np.float64),
+            "observations": SharedArray((n_envs, arm.state_dim), np.float64),
+            "rewards": SharedArray((n_envs,), np.float64),
+            "dones": SharedArray((n_envs,), np.bool_),
+            "angles": SharedArray((n_envs, len(arm.links)), np.float64),
+            "goals": SharedArray((n_envs, 3), np.float64),
+        }
+        specs = {key: buffer.spec() for key, buffer in self._buffers.items()}
+        bounds = np.linspace(0, n_envs, n_workers + 1).astype(np.int64)
+        self.shards = [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+        context = mp.get_context(start_method)
+        self._conns = []
+        self._processes = []
+        for lo, hi in self.shards:
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker,
+                args=(child_conn, arm, specs, lo, hi, n_envs, seed),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+        self._pending = set()
+        self.closed = False
+
+    @property
+    def observations(self) -> np.ndarray:
+        """the latest observations of every env, this is a view over the shared buffer"""
+        return self._buffers["observations"].array
+
+    @property
+    def angles(self) -> np.ndarray:
+        """the local link angles of every env, this is a view over the shared buffer"""
+        return self._buffers["angles"].array
+
+    @property
+    def goals(self) -> np.ndarray:
+        """the goals of every env, this is a view over the shared buffer"""
+        return self._buffers["goals"].array
+
+    def _results(
+        self, indices: np.ndarray = None
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """copies the results of the given envs out of the shared buffers"""
+        if indices is None:
+            indices = slice(None)
+        return (
+            self._buffers["observations"].array[indices].copy(),
+            self._buffers["rewards"].array[indices].copy(),
+            self._buffers["dones"].array[indices].copy(),
+        )
+
+    def _send(self, shard: int, command: str, payload=None):
+        if shard in self._pending:
+            raise RuntimeError(
+                f"Shard {shard} has a pending step, call step_wait first."
+            )
+        self._conns[shard].send((command, payload))
+        self._pending.add(shard)
+
+    def _wait(self, shards: typing.Iterable[int]):
+        for shard in shards:
+            self._conns[shard].recv()
+            self._pending.discard(shard)
+
+    def step_async(self, actions: np.ndarray, shards: typing.Sequence[int] = None):
+        """
+        Starts a step on some shards without waiting for the results.
+        :param actions: the actions of every env, shape (n_envs, action_dim), only the rows
+            of the given shards are read
+        :param shards: the shards to step, all of them if None
+        :return:
+        """
+        shards = range(self.n_workers) if shards is None else shards
+        buffer = self._buffers["actions"].array
+        for shard in shards:
+            lo, hi = self.shards[shard]
+            buffer[lo:hi] = actions[lo:hi]
+            self._send(shard, "step")
+
+    def step_wait(
+        self, k: int = None
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, typing.List[int]]:
+        """
+        Waits until at least k of the pending shards finished their step.
+        :param k: the number of shards to wait for, all the pending ones if None
+        :return: the env indices, observations, rewards and done flags of the finished
+            shards and the list of those shards
+        """
+        k = len(self._pending) if k is None else min(k, len(self._pending))
+        ready = []
+        while len(ready) < k:
+            conns = [self._conns[shard] for shard in self._pending]
+            for conn in connection.wait(conns):
+                shard = self._conns.index(conn)
+                self._wait([shard])
+                ready.append(shard)
+        ready.sort()
+        indices = np.zeros(0, dtype=np.int64)
+        if ready:
+            indices = np.concatenate([np.arange(*self.shards[i]) for i in ready])
+        return (indices,) + self._results(indices) + (ready,)
+
+    def step(
+        self, actions: np.ndarray
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Performs a step in every environment, all the workers move in lockstep.
+        :param actions: the actions to perform, shape (n_envs, action_dim)
+        :return: the observations (n_envs, state_dim), rewards (n_envs,) and done flags (n_envs,)
+        """
+        self.step_async(np.asarray(actions, dtype=np.float64))
+        self._wait(range(self.n_workers))
+        return self._results()
+
+    def rng_states(self) -> typing.List[typing.Dict]:
+        """
+        Returns the states of the random generators of the envs, kept by the workers.
+        :return: one json serializable state per env
+        """
+        states = []
+        for shard in range(self.n_workers):
+            self._send(shard, "rng_states")
+            states.extend(self._conns[shard].recv())
+            self._pending.discard(shard)
+        return states
+
+    def set_rng_states(self, states: typing.Sequence[typing.Dict]):
+        """
+        Sets the states of the random generators of the envs.
+        :param states: one state per env, as returned by rng_states
+        :return:
+        """
+        for shard, (lo, hi) in enumerate(self.shards):
+            self._send(shard, "set_rng_states", list(states[lo:hi]))
+        self._wait(range(self.n_workers))
+
+    def reset(self, indices: typing.Sequence[int] = None) -> np.ndarray:
+        """
+        Resets some or all the environments.
+        :param indices: the environments to reset, all of them if None
+        :return: the observations of every environment, shape (n_envs, state_dim)
+        """
+        indices = np.arange(self.n_envs) if indices is None else np.asarray(indices)
+        shards = []
+        for shard, (lo, hi) in enumerate(self.shards):
+            local = indices[(indices >= lo) & (indices < hi)] - lo
+            if len(local) > 0:
+                self._send(shard, "reset", local)
+                shards.append(shard)
+        self._wait(shards)
+        return self._results()[0]
+
+    def close(self):
+        """
+        Stops the workers and releases the shared buffers.
+        :return:
+        """
+        if self.closed:
+            return
+        self._wait(list(self._pending))
+        for conn in self._conns:
+            conn.send(("close", None))
+        for process in self._processes:
+            process.join()
+        for conn in self._conns:
+            conn.close()
+        for buffer in self._buffers.values():
+            buffer.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
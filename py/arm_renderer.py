@@ -0,0 +1,103 @@
+import typing
+
+import numpy as np
+import pyglet
+from pyglet import shapes
+
+from arm_core import Arm, ArmLink
+from math_utils import Point2D, deg2rad
+
+DEBUG = False
+
+
+class ArmTarget(object):
+    """Arm target class"""
+
+    def __init__(self, origin: Point2D, color: typing.Tuple, size: float = 10):
+        self.origin = origin
+        self.color = color
+        self.size = size
+
+    def draw(self):
+        """
+        Draws the arm target.
+        :return:
+        """
+        shape = shapes.Circle(self.origin.x, self.origin.y, self.size, color=self.color)
+        shape.draw()
+
+
+class ArmRenderer(object):
+    """Draws an arm with pyglet, it only reads the pose the arm already computed."""
+
+    def __init__(self, debug: bool = DEBUG):
+        """
+        :param debug: draws the axis and the angle grid of every link
+        """
+        self.debug = debug
+
+    def draw_axis(self, link: ArmLink):
+        """
+        Draws the arm link axis.
+        :return:
+        """
+        ox, oy = link.arm.origins[link.index]
+        pyglet.gl.glLineWidth(2)
+        pyglet.graphics.draw(
+            2,
+            pyglet.gl.GL_LINES,
+            ("v2f", (ox, oy, ox + 100, oy)),
+            ("c3B", (255, 0, 0) * 2),
+        )
+        pyglet.graphics.draw(
+            2,
+            pyglet.gl.GL_LINES,
+            ("v2f", (ox, oy, ox, oy + 100)),
+            ("c3B", (0, 255, 0) * 2),
+        )
+
+    def draw_grid(self, link: ArmLink):
+        """
+        Draws the arm link grid.
+        :return:
+        """
+        self.draw_axis(link)
+        pyglet.gl.glLineWidth(0.1)
+        ox, oy = link.arm.origins[link.index]
+        angles = deg2rad(np.arange(0, 360, 10))
+        xs = ox + link.length * np.cos(angles)
+        ys = oy + link.length * np.sin(angles)
+        for x, y in zip(xs, ys):
+            pyglet.graphics.draw(
+                2,
+                pyglet.gl.GL_LINES,
+                ("v2f", (ox, oy, x, y)),
+                ("c3B", (255, 255, 255) * 2),
+            )
+
+    def draw_link(self, link: ArmLink):
+        """
+        Draws the arm link.
+        :return:
+        """
+        ox, oy = link.arm.origins[link.index]
+        ex, ey = link.arm.endpoints[link.index]
+        pyglet.gl.glLineWidth(link.width)
+        pyglet.graphics.draw(
+            2,
+            pyglet.gl.GL_LINES,
+            ("v2f", (ox, oy, ex, ey)),
+            ("c3B", link.color * 2),
+        )
+
+        if self.debug:
+            self.draw_grid(link)
+            self.draw_axis(link)
+
+    def draw(self, arm: Arm):
+        """
+        Draws the arm.
+        :return:
+        """
+        for link in arm.links:
+            self.draw_link(link)
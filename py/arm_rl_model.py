@@ -2,15 +2,11 @@ import tensorflow.compat.v1 as tf
 
 tf.disable_v2_behavior()
 import numpy as np
+import os
 
-#####################  hyper parameters  ####################
-
-LR_A = 0.001  # learning rate for actor
-LR_C = 0.001  # learning rate for critic
-GAMMA = 0.9  # reward discount
-TAU = 0.01  # soft replacement
-MEMORY_CAPACITY = 30000
-BATCH_SIZE = 32
+from ddpg_params import BATCH_SIZE, GAMMA, LR_A, LR_C, MEMORY_CAPACITY, TAU
+from numpy_policy import ACTOR_PATH, save_actor
+from replay_buffer import PrioritizedReplayBuffer, make_replay_buffer
 
 
 class DDPG(object):
@@ -21,94 +17,189 @@ class DDPG(object):
         a_dim,
         s_dim,
         a_bound,
+        prioritized=False,
+        memory_path=None,
+        lr_a=LR_A,
+        lr_c=LR_C,
+        gamma=GAMMA,
+        tau=TAU,
+        memory_capacity=MEMORY_CAPACITY,
+        batch_size=BATCH_SIZE,
+        threads=None,
     ):
         """Initialize the network
         @param a_dim: action dimension
         @param s_dim: state dimension
         @param a_bound: action bound
+        @param prioritized: sample the memory proportionally to the td errors
+        @param memory_path: folder of a disk backed (memmap) memory, in RAM if None
+        @param lr_a: learning rate of the actor
+        @param lr_c: learning rate of the critic
+        @param gamma: reward discount
+        @param tau: soft replacement rate of the target networks
+        @param memory_capacity: number of transitions in the memory
+        @param batch_size: number of transitions of an update
+        @param threads: the threads of the tensorflow session, all the cores if None
         """
 
-        self.memory = np.zeros(
-            (MEMORY_CAPACITY, s_dim * 2 + a_dim + 1), dtype=np.float32
+        self.memory = make_replay_buffer(
+            memory_capacity, s_dim, a_dim, prioritized, memory_path
         )
-        self.pointer = 0
-        self.memory_full = False
-        self.sess = tf.Session()
+        self.lr_a, self.lr_c, self.gamma, self.tau = lr_a, lr_c, gamma, tau
+        self.batch_size = batch_size
         self.a_replace_counter, self.c_replace_counter = 0, 0
 
         self.a_dim, self.s_dim, self.a_bound = a_dim, s_dim, a_bound[1]
-        self.S = tf.placeholder(tf.float32, [None, s_dim], "s")
-        self.S_ = tf.placeholder(tf.float32, [None, s_dim], "s_")
-        self.R = tf.placeholder(tf.float32, [None, 1], "r")
-
-        with tf.variable_scope("Actor"):
-            self.a = self._build_a(self.S, scope="eval", trainable=True)
-            a_ = self._build_a(self.S_, scope="target", trainable=False)
-            
-        with tf.variable_scope("Critic"):
-            # assign self.a = a in memory when calculating q for td_error,
-            # otherwise the self.a is from Actor when updating Actor
-            q = self._build_c(self.S, self.a, scope="eval", trainable=True)
-            q_ = self._build_c(self.S_, a_, scope="target", trainable=False)
-
-        # networks parameters
-        self.ae_params = tf.get_collection(
-            tf.GraphKeys.GLOBAL_VARIABLES, scope="Actor/eval"
-        )
-        self.at_params = tf.get_collection(
-            tf.GraphKeys.GLOBAL_VARIABLES, scope="Actor/target"
-        )
-        self.ce_params = tf.get_collection(
-            tf.GraphKeys.GLOBAL_VARIABLES, scope="Critic/eval"
-        )
-        self.ct_params = tf.get_collection(
-            tf.GraphKeys.GLOBAL_VARIABLES, scope="Critic/target"
-        )
+        # every model has its own graph and session, several can live in a process
+        self.graph = tf.Graph()
+        config = None
+        if threads:
+            config = tf.ConfigProto(
+                intra_op_parallelism_threads=threads,
+                inter_op_parallelism_threads=threads,
+            )
+        self.sess = tf.Session(graph=self.graph, config=config)
+        with self.graph.as_default():
+            self.S = tf.placeholder(tf.float32, [None, s_dim], "s")
+            self.S_ = tf.placeholder(tf.float32, [None, s_dim], "s_")
+            self.R = tf.placeholder(tf.float32, [None, 1], "r")
+            self.A = tf.placeholder(tf.float32, [None, a_dim], "a")
+            # importance sampling weights of the prioritized memory
+            self.W = tf.placeholder_with_default(tf.ones_like(self.R), [None, 1], "w")
+
+            with tf.variable_scope("Actor"):
+                self.a = self._build_a(self.S, scope="eval", trainable=True)
+                a_ = self._build_a(self.S_, scope="target", trainable=False)
+
+            with tf.variable_scope("Critic"):
+                # q of the actions in memory for the td_error
+                q_memory = self._build_c(self.S, self.A, scope="eval", trainable=True)
+                q_ = self._build_c(self.S_, a_, scope="target", trainable=False)
 
-        # target net replacement
-        self.soft_replace = [
-            [
-                tf.assign(ta, (1 - TAU) * ta + TAU * ea),
-                tf.assign(tc, (1 - TAU) * tc + TAU * ec),
-            ]
-            for ta, ea, tc, ec in zip(
-                self.at_params, self.ae_params, self.ct_params, self.ce_params
+            # networks parameters
+            self.ae_params = tf.get_collection(
+                tf.GraphKeys.GLOBAL_VARIABLES, scope="Actor/eval"
+            )
+            self.at_params = tf.get_collection(
+                tf.GraphKeys.GLOBAL_VARIABLES, scope="Actor/target"
+            )
+            self.ce_params = tf.get_collection(
+                tf.GraphKeys.GLOBAL_VARIABLES, scope="Critic/eval"
+            )
+            self.ct_params = tf.get_collection(
+                tf.GraphKeys.GLOBAL_VARIABLES, scope="Critic/target"
             )
-        ]
 
-        q_target = self.R + GAMMA * q_
-        # in the feed_dic for the td_error, the self.a should change to actions in memory
-        td_error = tf.losses.mean_squared_error(labels=q_target, predictions=q)
-        self.ctrain = tf.train.AdamOptimizer(LR_C).minimize(
-            td_error, var_list=self.ce_params
-        )
+            q_target = self.R + self.gamma * q_
+            td_error = tf.losses.mean_squared_error(
+                labels=q_target, predictions=q_memory, weights=self.W
+            )
+            self.td_error = td_error
+            self.abs_td = tf.abs(q_target - q_memory)
+            self.ctrain = tf.train.AdamOptimizer(self.lr_c).minimize(
+                td_error, var_list=self.ce_params
+            )
 
-        a_loss = -tf.reduce_mean(q)  # maximize the q
-        self.atrain = tf.train.AdamOptimizer(LR_A).minimize(
-            a_loss, var_list=self.ae_params
-        )
+            # the whole update is a single op: critic step, then the actor step on the
+            # updated critic, then the soft target replacement. The q of the actions of
+            # the Actor shares the eval net of the critic, its weights are read after the
+            # critic step
+            with tf.variable_scope(
+                "Critic", reuse=True, custom_getter=self._read_after(self.ctrain)
+            ):
+                q = self._build_c(self.S, self.a, scope="eval", trainable=True)
+            with tf.control_dependencies([self.ctrain]):
+                a_loss = -tf.reduce_mean(q)  # maximize the q
+                self.atrain = tf.train.AdamOptimizer(self.lr_a).minimize(
+                    a_loss, var_list=self.ae_params
+                )
+            with tf.control_dependencies([self.atrain]):
+                soft_replace = [
+                    tf.assign(t, (1 - self.tau) * t + self.tau * e)
+                    for t, e in zip(
+                        self.at_params + self.ct_params, self.ae_params + self.ce_params
+                    )
+                ]
+            self.train_op = tf.group(*soft_replace, name="train")
 
-        self.sess.run(tf.global_variables_initializer())
+            self.sess.run(tf.global_variables_initializer())
+        self._assign_ops = None  # built the first time the state is set
+        self._run_options = self._run_metadata = None  # set to trace the updates
 
     def choose_action(self, s):
         """Choose the action based on the state input"""
         return self.sess.run(self.a, {self.S: s[None, :]})[0]
 
-    def learn(self):
-        """A function that defines the learning process"""
+    def choose_actions(self, s, noise=None):
+        """Choose the actions of a batch of states with a single forward pass
+        @param s: states with shape (n, s_dim)
+        @param noise: exploration noise of the n envs, an ActionNoise, no noise if None
+        @return: the actions with shape (n, a_dim) clipped to the action bound
+        """
+        a = self.sess.run(self.a, {self.S: s})
+        if noise is None:
+            return a
+        return np.clip(a + noise(), -self.a_bound, self.a_bound)
+
+    def learn(self, n_updates=1):
+        """A function that defines the learning process, every update is a single
+        session call running the critic, actor and soft target updates
+        @param n_updates: number of updates, their batches are sampled at once up front
+        @return: the mean critic loss of the updates
+        """
+        indices = self.memory.sample_indices(self.batch_size * n_updates)
+        bs, ba, br, bs_ = self.memory.gather(indices)
+        if self.prioritized:
+            weights = self.memory.weights(indices, n_updates)[:, None]
+
+        loss = 0.0
+        for k in range(n_updates):
+            rows = slice(k * self.batch_size, (k + 1) * self.batch_size)
+            feed = {
+                self.S: bs[rows],
+                self.A: ba[rows],
+                self.R: br[rows],
+                self.S_: bs_[rows],
+            }
+            if not self.prioritized:
+                loss += self._update(feed, [self.td_error, self.train_op])[0]
+                continue
+            feed[self.W] = weights[rows]
+            abs_td, td_error, _ = self._update(
+                feed, [self.abs_td, self.td_error, self.train_op]
+            )
+            loss += td_error
+            self.memory.update_priorities(indices[rows], abs_td[:, 0])
+        return float(loss) / n_updates
 
-        # soft target replacement
-        self.sess.run(self.soft_replace)
+    def _update(self, feed, fetches=None):
+        """one session call of the fused update, traced when run options are set"""
+        return self.sess.run(
+            self.train_op if fetches is None else fetches,
+            feed,
+            options=self._run_options,
+            run_metadata=self._run_metadata,
+        )
 
-        indices = np.random.choice(MEMORY_CAPACITY, size=BATCH_SIZE)
-        bt = self.memory[indices, :]
-        bs = bt[:, : self.s_dim]
-        ba = bt[:, self.s_dim : self.s_dim + self.a_dim]
-        br = bt[:, -self.s_dim - 1 : -self.s_dim]
-        bs_ = bt[:, -self.s_dim :]
+    def trace_updates(self, path, n_updates=1):
+        """Run updates with a full tensorflow trace of their session calls, the traces
+        are written as chrome traces (chrome://tracing) in a folder
+        @param path: the folder of the traces
+        @param n_updates: number of traced updates, one file per update
+        """
+        from tensorflow.python.client import timeline
 
-        self.sess.run(self.atrain, {self.S: bs})
-        self.sess.run(self.ctrain, {self.S: bs, self.a: ba, self.R: br, self.S_: bs_})
+        os.makedirs(path, exist_ok=True)
+        self._run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+        try:
+            for k in range(n_updates):
+                self._run_metadata = tf.RunMetadata()
+                self.learn()
+                trace = timeline.Timeline(self._run_metadata.step_stats)
+                with open(os.path.join(path, f"update_{k}.json"), "w") as f:
+                    f.write(trace.generate_chrome_trace_format())
+        finally:
+            self._run_options = self._run_metadata = None
 
     def store_transition(self, s, a, r, s_):
         """Store the transition in the memory
@@ -117,12 +208,31 @@ class DDPG(object):
         @param r: reward input at time t (t-1) (t-2)
         @param s_: state input at time t+1 (t) (t-1)
         """
-        transition = np.hstack((s, a, [r], s_))
-        index = self.pointer % MEMORY_CAPACITY  # replace the old memory with new memory
-        self.memory[index, :] = transition
-        self.pointer += 1
-        if self.pointer > MEMORY_CAPACITY:  # indicator for learning
-            self.memory_full = True
+        self.memory.add(s, a, r, s_)
+
+    def store_transitions(self, s, a, r, s_):
+        """Store a batch of transitions in the memory, e.g. one step of a batch of envs
+        @param s: states at time t, shape (n, s_dim)
+        @param a: actions at time t, shape (n, a_dim)
+        @param r: rewards at time t, shape (n,)
+        @param s_: states at time t+1, shape (n, s_dim)
+        """
+        self.memory.add_batch(s, a, r, s_)
+
+    @property
+    def prioritized(self):
+        """whether the memory is sampled proportionally to the td errors"""
+        return isinstance(self.memory, PrioritizedReplayBuffer)
+
+    @property
+    def pointer(self):
+        """the number of transitions stored so far"""
+        return self.memory.pointer
+
+    @property
+    def memory_full(self):
+        """indicator for learning, the memory has been filled once"""
+        return self.memory.full
 
     def _build_a(self, s, scope, trainable):
         """A function that defines the actor network
@@ -140,30 +250,86 @@ class DDPG(object):
             )
             return tf.multiply(a, self.a_bound, name="scaled_a")
 
-    def _build_c(self, s, a, scope, trainable):
+    @staticmethod
+    def _read_after(op):
+        """A variable getter reading the variables once the op ran
+        @param op: the op the reads depend on
+        @return: the custom getter of a variable scope
+        """
+
+        def read_after(getter, *args, **kwargs):
+            variable = getter(*args, **kwargs)
+            with tf.control_dependencies([op]):
+                return variable.read_value()
+
+        return read_after
+
+    def _build_c(self, s, a, scope, trainable, reuse=False):
         """
         A function that defines the critic network
         :param s:
         :param a:
         :param scope:
         :param trainable:
+        :param reuse: share the variables of a network already built in the scope
         :return:
         """
 
-        with tf.variable_scope(scope):
+        with tf.variable_scope(scope, reuse=reuse):
             n_l1 = 300
             w1_s = tf.get_variable("w1_s", [self.s_dim, n_l1], trainable=trainable)
             w1_a = tf.get_variable("w1_a", [self.a_dim, n_l1], trainable=trainable)
             b1 = tf.get_variable("b1", [1, n_l1], trainable=trainable)
             net = tf.nn.relu(tf.matmul(s, w1_s) + tf.matmul(a, w1_a) + b1)
-            return tf.layers.dense(net, 1, trainable=trainable)  # Q(s,a)
+            return tf.layers.dense(net, 1, name="dense", trainable=trainable)  # Q(s,a)
 
     def save(self):
         """Save the model to the disk"""
-        saver = tf.train.Saver()
+        with self.graph.as_default():
+            saver = tf.train.Saver()
         saver.save(self.sess, "./params", write_meta_graph=False)
 
     def restore(self):
         """Restore the model from the disk"""
-        saver = tf.train.Saver()
+        with self.graph.as_default():
+            saver = tf.train.Saver()
         saver.restore(self.sess, "./params")
+
+    def get_state(self):
+        """Get a copy of every variable of the model, the networks and the optimizers
+        @return: a dict variable name -> value
+        """
+        with self.graph.as_default():
+            variables = tf.global_variables()
+        values = self.sess.run(variables)
+        return {v.op.name: value for v, value in zip(variables, values)}
+
+    def set_state(self, state):
+        """Set the variables of the model from the dict returned by get_state
+        @param state: a dict variable name -> value
+        """
+        if self._assign_ops is None:
+            self._assign_ops = {}
+            with self.graph.as_default():
+                for v in tf.global_variables():
+                    value = tf.placeholder(v.dtype.base_dtype, v.shape)
+                    self._assign_ops[v.op.name] = (value, tf.assign(v, value))
+        ops, feed = [], {}
+        for name, (value, op) in self._assign_ops.items():
+            ops.append(op)
+            feed[value] = state[name]
+        self.sess.run(ops, feed)
+
+    def actor_weights(self):
+        """Get the weights of the actor for the numpy policy
+        @return: the kernel and bias of the hidden layer and of the output layer
+        """
+        names = ["l1/kernel", "l1/bias", "a/kernel", "a/bias"]
+        params = {p.op.name: p for p in self.ae_params}
+        return self.sess.run([params["Actor/eval/" + name] for name in names])
+
+    def export_actor(self, path=ACTOR_PATH):
+        """Export the weights of the actor to a .npz file for the numpy policy
+        @param path: the path of the file
+        """
+        save_actor(path, *self.actor_weights(), self.a_bound)
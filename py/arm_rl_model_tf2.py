@@ -0,0 +1,286 @@
+import numpy as np
+import tensorflow as tf
+
+from ddpg_params import BATCH_SIZE, GAMMA, LR_A, LR_C, MEMORY_CAPACITY, TAU
+from numpy_policy import ACTOR_PATH, save_actor
+from replay_buffer import PrioritizedReplayBuffer, make_replay_buffer
+
+PARAMS_PATH = "./params_tf2"
+
+
+def build_actor(s_dim: int, a_dim: int) -> tf.keras.Model:
+    """
+    Builds the actor network, the output is in [-1, 1] and scaled by the action bound
+    outside of the model.
+    :param s_dim: state dimension
+    :param a_dim: action dimension
+    :return: the keras model
+    """
+    s = tf.keras.Input((s_dim,), name="s")
+    net = tf.keras.layers.Dense(300, activation="relu", name="l1")(s)
+    a = tf.keras.layers.Dense(a_dim, activation="tanh", name="a")(net)
+    return tf.keras.Model(s, a)
+
+
+def build_critic(s_dim: int, a_dim: int) -> tf.keras.Model:
+    """
+    Builds the critic network, a hidden layer over the state and the action followed by Q(s,a).
+    :param s_dim: state dimension
+    :param a_dim: action dimension
+    :return: the keras model
+    """
+    s = tf.keras.Input((s_dim,), name="s")
+    a = tf.keras.Input((a_dim,), name="a")
+    net = tf.keras.layers.Concatenate()([s, a])
+    net = tf.keras.layers.Dense(300, activation="relu", name="l1")(net)
+    q = tf.keras.layers.Dense(1, name="q")(net)
+    return tf.keras.Model([s, a], q)
+
+
+class DDPG(object):
+    """DDPG (Deep Deterministic Policy Gradient) on TF2, the networks are Keras models and
+    the update step is a `tf.function`, optionally compiled with XLA. It has the same public
+    API as the compat.v1 implementation in `arm_rl_model`."""
+
+    def __init__(
+        self,
+        a_dim,
+        s_dim,
+        a_bound,
+        prioritized=False,
+        memory_path=None,
+        jit_compile=False,
+        lr_a=LR_A,
+        lr_c=LR_C,
+        gamma=GAMMA,
+        tau=TAU,
+        memory_capacity=MEMORY_CAPACITY,
+        batch_size=BATCH_SIZE,
+        threads=None,
+    ):
+        """Initialize the network
+        @param a_dim: action dimension
+        @param s_dim: state dimension
+        @param a_bound: action bound
+        @param prioritized: sample the memory proportionally to the td errors
+        @param memory_path: folder of a disk backed (memmap) memory, in RAM if None
+        @param jit_compile: compile the update step with XLA
+        @param lr_a: learning rate of the actor
+        @param lr_c: learning rate of the critic
+        @param gamma: reward discount
+        @param tau: soft replacement rate of the target networks
+        @param memory_capacity: number of transitions in the memory
+        @param batch_size: number of transitions of an update
+        @param threads: the threads of tensorflow, all the cores if None, it applies to
+            the whole process and must be set before tensorflow runs its first op
+        """
+        if threads:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(threads)
+        self.memory = make_replay_buffer(
+            memory_capacity, s_dim, a_dim, prioritized, memory_path
+        )
+        self.lr_a, self.lr_c = lr_a, lr_c
+        self.gamma, self.tau, self.batch_size = gamma, tau, batch_size
+        self.a_dim, self.s_dim, self.a_bound = a_dim, s_dim, a_bound[1]
+
+        self.actor = build_actor(s_dim, a_dim)
+        self.actor_target = build_actor(s_dim, a_dim)
+        self.critic = build_critic(s_dim, a_dim)
+        self.critic_target = build_critic(s_dim, a_dim)
+        self.actor_target.set_weights(self.actor.get_weights())
+        self.critic_target.set_weights(self.critic.get_weights())
+        self.actor_optimizer = tf.keras.optimizers.Adam(lr_a)
+        self.critic_optimizer = tf.keras.optimizers.Adam(lr_c)
+
+        batch = [
+            tf.TensorSpec([None, s_dim], tf.float32),
+            tf.TensorSpec([None, a_dim], tf.float32),
+            tf.TensorSpec([None, 1], tf.float32),
+            tf.TensorSpec([None, s_dim], tf.float32),
+            tf.TensorSpec([None, 1], tf.float32),
+        ]
+        self._update = tf.function(
+            self._update_step, input_signature=batch, jit_compile=jit_compile
+        )
+        self._act = tf.function(
+            self._act_step, input_signature=[tf.TensorSpec([None, s_dim], tf.float32)]
+        )
+        # the optimizer slots exist up front so the state always has the same variables
+        self.actor_optimizer.build(self.actor.trainable_variables)
+        self.critic_optimizer.build(self.critic.trainable_variables)
+        self.checkpoint = tf.train.Checkpoint(
+            actor=self.actor,
+            actor_target=self.actor_target,
+            critic=self.critic,
+            critic_target=self.critic_target,
+            actor_optimizer=self.actor_optimizer,
+            critic_optimizer=self.critic_optimizer,
+        )
+
+    def _act_step(self, s):
+        return self.actor(s) * self.a_bound
+
+    def _update_step(self, s, a, r, s_, w):
+        """critic step, then the actor step on the updated critic, then the soft target
+        replacement, returns the absolute td errors and the critic loss"""
+        q_ = self.critic_target([s_, self.actor_target(s_) * self.a_bound])
+        q_target = r + self.gamma * q_
+        with tf.GradientTape() as tape:
+            td = q_target - self.critic([s, a])
+            # importance sampling weights of the prioritized memory, ones otherwise
+            td_error = tf.reduce_mean(w * tf.square(td))
+        variables = self.critic.trainable_variables
+        grads = tape.gradient(td_error, variables)
+        self.critic_optimizer.apply_gradients(zip(grads, variables))
+
+        with tf.GradientTape() as tape:
+            q = self.critic([s, self.actor(s) * self.a_bound])
+            a_loss = -tf.reduce_mean(q)  # maximize the q
+        variables = self.actor.trainable_variables
+        grads = tape.gradient(a_loss, variables)
+        self.actor_optimizer.apply_gradients(zip(grads, variables))
+
+        for target, model in (
+            (self.actor_target, self.actor),
+            (self.critic_target, self.critic),
+        ):
+            for t, e in zip(target.weights, model.weights):
+                t.assign((1 - self.tau) * t + self.tau * e)
+        return tf.abs(td), td_error
+
+    def choose_action(self, s):
+        """Choose the action based on the state input"""
+        return self._act(np.asarray(s, dtype=np.float32)[None, :])[0].numpy()
+
+    def choose_actions(self, s, noise=None):
+        """Choose the actions of a batch of states with a single forward pass
+        @param s: states with shape (n, s_dim)
+        @param noise: exploration noise of the n envs, an ActionNoise, no noise if None
+        @return: the actions with shape (n, a_dim) clipped to the action bound
+        """
+        a = self._act(np.asarray(s, dtype=np.float32)).numpy()
+        if noise is None:
+            return a
+        return np.clip(a + noise(), -self.a_bound, self.a_bound)
+
+    def learn(self, n_updates=1):
+        """A function that defines the learning process, every update is a single call
+        of the compiled update step
+        @param n_updates: number of updates, their batches are sampled at once up front
+        @return: the mean critic loss of the updates
+        """
+        indices = self.memory.sample_indices(self.batch_size * n_updates)
+        bs, ba, br, bs_ = self.memory.gather(indices)
+        if self.prioritized:
+            weights = self.memory.weights(indices, n_updates)[:, None]
+        else:
+            weights = np.ones_like(br)
+
+        losses = []
+        for k in range(n_updates):
+            rows = slice(k * self.batch_size, (k + 1) * self.batch_size)
+            abs_td, td_error = self._update(
+                bs[rows], ba[rows], br[rows], bs_[rows], weights[rows]
+            )
+            losses.append(td_error)
+            if self.prioritized:
+                self.memory.update_priorities(indices[rows], abs_td.numpy()[:, 0])
+        return float(tf.add_n(losses)) / n_updates
+
+    def trace_updates(self, path, n_updates=1):
+        """Run updates under the tensorflow profiler, the trace is written in a folder
+        to be opened with the profile plugin of tensorboard
+        @param path: the folder of the trace
+        @param n_updates: number of traced updates
+        """
+        tf.profiler.experimental.start(path)
+        try:
+            self.learn(n_updates)
+        finally:
+            tf.profiler.experimental.stop()
+
+    def store_transition(self, s, a, r, s_):
+        """Store the transition in the memory
+        @param s: state input at time t
+        @param a: action input at time t
+        @param r: reward input at time t
+        @param s_: state input at time t+1
+        """
+        self.memory.add(s, a, r, s_)
+
+    def store_transitions(self, s, a, r, s_):
+        """Store a batch of transitions in the memory, e.g. one step of a batch of envs
+        @param s: states at time t, shape (n, s_dim)
+        @param a: actions at time t, shape (n, a_dim)
+        @param r: rewards at time t, shape (n,)
+        @param s_: states at time t+1, shape (n, s_dim)
+        """
+        self.memory.add_batch(s, a, r, s_)
+
+    @property
+    def prioritized(self):
+        """whether the memory is sampled proportionally to the td errors"""
+        return isinstance(self.memory, PrioritizedReplayBuffer)
+
+    @property
+    def pointer(self):
+        """the number of transitions stored so far"""
+        return self.memory.pointer
+
+    @property
+    def memory_full(self):
+        """indicator for learning, the memory has been filled once"""
+        return self.memory.full
+
+    def save(self):
+        """Save the model to the disk"""
+        self.checkpoint.write(PARAMS_PATH)
+
+    def restore(self):
+        """Restore the model from the disk"""
+        self.checkpoint.read(PARAMS_PATH).expect_partial()
+
+    def _variables(self):
+        """every variable of the model by group, the networks and the optimizers"""
+        groups = {
+            "actor": self.actor.weights,
+            "actor_target": self.actor_target.weights,
+            "critic": self.critic.weights,
+            "critic_target": self.critic_target.weights,
+            "actor_optimizer": self.actor_optimizer.variables,
+            "critic_optimizer": self.critic_optimizer.variables,
+        }
+        for group, variables in groups.items():
+            if callable(variables):  # a method in the keras 2 optimizers
+                variables = variables()
+            for i, v in enumerate(variables):
+                yield f"{group}/{i}", v
+
+    def get_state(self):
+        """Get a copy of every variable of the model, the networks and the optimizers
+        @return: a dict variable name -> value
+        """
+        return {name: v.numpy() for name, v in self._variables()}
+
+    def set_state(self, state):
+        """Set the variables of the model from the dict returned by get_state
+        @param state: a dict variable name -> value
+        """
+        for name, v in self._variables():
+            v.assign(state[name])
+
+    def actor_weights(self):
+        """Get the weights of the actor for the numpy policy
+        @return: the kernel and bias of the hidden layer and of the output layer
+        """
+        return (
+            self.actor.get_layer("l1").get_weights()
+            + self.actor.get_layer("a").get_weights()
+        )
+
+    def export_actor(self, path=ACTOR_PATH):
+        """Export the weights of the actor to a .npz file for the numpy policy
+        @param path: the path of the file
+        """
+        save_actor(path, *self.actor_weights(), self.a_bound)
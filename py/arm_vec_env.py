@@ -0,0 +1,170 @@
+import typing
+
+import numpy as np
+
+from arm_core import Arm
+from arm_kinematics import forward_kinematics
+from goal_sampler import make_rngs
+from math_utils import distance
+
+
+class VectorArm(object):
+    """A batch of independent arms that share the geometry of a template arm. The joint
+    angles of all the arms are kept in a (n_envs, n_links) array so every step is computed
+    with numpy ops over the whole batch, following the same rules as `Arm.step`."""
+
+    def __init__(self, arm: Arm, n_envs: int, seed: int = None):
+        """
+        :param arm: the template arm, its links, constraints, goal and goal sampler are
+            copied to every env
+        :param n_envs: the number of arms in the batch
+        :param seed: the root seed of the per-env random generators
+        """
+        if n_envs < 1:
+            raise ValueError("At least one environment is required.")
+        self.n_envs = n_envs
+        self.origin = arm.origin
+        self.env_size = arm.env_size
+        self.lengths = arm.lengths.copy()
+        self.lower_limits = arm.lower_limits.copy()
+        self.upper_limits = arm.upper_limits.copy()
+        self.step_size = arm.step_size
+        self.goal_len = arm.goal_len
+        self.goal_sampler = arm.get_goal_sampler()
+        self.rngs = make_rngs(seed, n_envs)
+        # env attributes
+        self.state_dim = arm.state_dim
+        self.action_dim = arm.action_dim
+        self.action_bound = arm.action_bound
+        self._base = arm.origin.to_array()
+        self._env_scale = arm.env_size.to_array()
+        self._max_dim = max(arm.env_size.width, arm.env_size.height)
+        # per env state
+        self.angles = np.tile(arm.angles, (n_envs, 1))
+        self.goals = np.tile(np.asarray(arm.goal, dtype=np.float64), (n_envs, 1))
+        self.on_goal = np.zeros(n_envs, dtype=np.int64)
+        self.endpoints = None
+        self._update_kinematics()
+
+    def _update_kinematics(self):
+        """recomputes the endpoints of every link of every arm"""
+        _, _, self.endpoints = forward_kinematics(self._base, self.angles, self.lengths)
+
+    def _goal_hit(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Checks whether the endpoint of each arm falls into its goal box.
+        :return: two boolean arrays with the result of the check along the x and y axis
+        """
+        head = self.endpoints[:, -1, :]
+        half = self.goals[:, 2:] / 2
+        inside = (self.goals[:, :2] - half < head) & (head < self.goals[:, :2] + half)
+        return inside[:, 0], inside[:, 1]
+
+    def get_observation(self) -> np.ndarray:
+        """
+        Returns the observation of every arm.
+        :return: an array with shape (n_envs, state_dim)
+        """
+        endpoints = self.endpoints / self._env_scale  # normalize
+        deltas = (self.goals[:, None, :2] - self.endpoints) / self._env_scale
+        return np.concatenate(
+            (
+                endpoints.reshape(self.n_envs, -1),
+                deltas.reshape(self.n_envs, -1),
+                (self.on_goal > 0)[:, None],
+            ),
+            axis=1,
+        )
+
+    def get_reward(self) -> np.ndarray:
+        """
+        Returns the reward of every arm.
+        """
+        return -distance(self.endpoints[:, -1, :], self.goals[:, :2]) / self._max_dim
+
+    def step(
+        self, actions: np.ndarray
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Performs a step in every environment.
+        :param actions: the actions to perform, shape (n_envs, action_dim)
+        :return: the observations (n_envs, state_dim), rewards (n_envs,) and done flags (n_envs,)
+        """
+        actions = np.asarray(actions, dtype=np.float64)
+        n = actions.shape[1]
+        self.angles[:, :n] += np.clip(actions, -1, 1) * self.step_size
+        np.clip(self.angles, self.lower_limits, self.upper_limits, out=self.angles)
+        self._update_kinematics()
+
+        r = self.get_reward()
+
+        # done and reward
+        in_x, in_y = self._goal_hit()
+        hit = in_x & in_y
+        r[hit] += 1.0
+        self.on_goal = np.where(hit, self.on_goal + 1, np.where(in_x, self.on_goal, 0))
+        done = hit & (self.on_goal > 50)  # if it is over the goal for 50 times
+
+        return self.get_observation(), r, done
+
+    def rng_states(self) -> typing.List[typing.Dict]:
+        """
+        Returns the states of the random generators of the envs.
+        :return: one json serializable state per env
+        """
+        return [rng.bit_generator.state for rng in self.rngs]
+
+    def set_rng_states(self, states: typing.Sequence[typing.Dict]):
+        """
+        Sets the states of the random generators of the envs.
+        :param states: one state per env, as returned by rng_states
+        :return:
+        """
+        for rng, state in zip(self.rngs, states):
+            rng.bit_generator.state = state
+
+    def set_state(self, angles: np.ndarray, goals: np.ndarray) -> np.ndarray:
+        """
+        Puts every arm at the given angles and gives it the given goal, e.g. to run a
+        policy on a fixed set of goals.
+        :param angles: the local angles of the links, clipped to their constraints, shape
+            (n_envs, n_links)
+        :param goals: the goals, shape (n_envs, 3)
+        :return: the observations of every environment, shape (n_envs, state_dim)
+        """
+        self.angles[:] = np.clip(angles, self.lower_limits, self.upper_limits)
+        self.goals[:] = goals
+        self._update_kinematics()
+
+        # check if on goal
+        in_x, in_y = self._goal_hit()
+        self.on_goal[:] = in_x & in_y
+
+        return self.get_observation()
+
+    def reset(self, indices: typing.Sequence[int] = None) -> np.ndarray:
+        """
+        Resets some or all the environments.
+        :param indices: the environments to reset, all of them if None
+        :return: the observations of every environment, shape (n_envs, state_dim)
+        """
+        if indices is None:
+            indices = np.arange(self.n_envs)
+        indices = np.asarray(indices, dtype=np.int64)
+
+        # every env draws its goal and arm angles from its own generator
+        n_links = self.angles.shape[1]
+        u = np.stack([self.rngs[i].random(3 + n_links) for i in indices])
+        self.goals[indices] = self.goal_sampler.from_uniform(u[:, :3])
+
+        # randomize arm angles
+        self.angles[indices] = self.lower_limits + u[:, 3:] * (
+            self.upper_limits - self.lower_limits
+        )
+        self._update_kinematics()
+
+        # check if on goal
+        in_x, in_y = self._goal_hit()
+        self.on_goal[indices] = (in_x & in_y)[indices]
+
+        return self.get_observation()
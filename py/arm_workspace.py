@@ -0,0 +1,194 @@
+import hashlib
+import json
+import math
+import os
+import typing
+
+import numpy as np
+
+from arm_kinematics import forward_kinematics
+from goal_sampler import GoalSource
+
+WORKSPACE_CACHE_DIR = "./workspace_cache"
+
+
+class WorkspaceIndex(GoalSource):
+    """Occupancy grid of the points of the environment the arm can reach under its joint
+    constraints. It is built once per arm geometry by sampling the joint space and cached on
+    disk, then reachability queries are a single lookup and goals can be drawn uniformly over
+    the reachable cells."""
+
+    def __init__(
+        self,
+        grid: np.ndarray,
+        cell_size: float,
+        goal_len: float = 30,
+    ):
+        """
+        :param grid: boolean occupancy grid with shape (n_cells_x, n_cells_y)
+        :param cell_size: the size of the grid cells
+        :param goal_len: the size of the goal box
+        """
+        if not grid.any():
+            raise ValueError("The arm can not reach any point of the environment.")
+        self.grid = grid
+        self.cell_size = cell_size
+        self.goal_len = goal_len
+        self._cells = np.flatnonzero(grid)
+
+    @staticmethod
+    def geometry_key(arm, cell_size: float, n_samples: int, seed: int) -> str:
+        """
+        Returns a key that identifies the geometry of the arm and the build settings.
+        """
+        geometry = {
+            "origin": [float(v) for v in arm.origin],
+            "env_size": [float(v) for v in arm.env_size],
+            "lengths": arm.lengths.tolist(),
+            "lower": arm.lower_limits.tolist(),
+            "upper": arm.upper_limits.tolist(),
+            "cell_size": cell_size,
+            "n_samples": n_samples,
+            "seed": seed,
+        }
+        return hashlib.sha1(json.dumps(geometry, sort_keys=True).encode()).hexdigest()
+
+    @classmethod
+    def build(
+        cls,
+        arm,
+        cell_size: float = 2.0,
+        n_samples: int = 2_000_000,
+        seed: int = 0,
+        batch_size: int = 100_000,
+    ) -> "WorkspaceIndex":
+        """
+        Builds the index sampling the joint space of the arm in batches.
+        :param arm: the arm
+        :param cell_size: the size of the grid cells
+        :param n_samples: the number of joint configurations to sample
+        :param seed: the seed of the sampling
+        :param batch_size: the number of configurations evaluated at once
+        :return: the workspace index
+        """
+        width, height = arm.env_size
+        shape = (math.ceil(width / cell_size), math.ceil(height / cell_size))
+        grid = np.zeros(shape, dtype=bool)
+        rng = np.random.default_rng(seed)
+        for start in range(0, n_samples, batch_size):
+            n = min(batch_size, n_samples - start)
+            angles = rng.uniform(
+                arm.lower_limits, arm.upper_limits, (n, len(arm.links))
+            )
+            _, _, endpoints = forward_kinematics(arm.origin, angles, arm.lengths)
+            cells = np.floor(endpoints[:, -1, :] / cell_size).astype(np.int64)
+            inside = (
+                (cells[:, 0] >= 0)
+                & (cells[:, 0] < shape[0])
+                & (cells[:, 1] >= 0)
+                & (cells[:, 1] < shape[1])
+            )
+            grid[cells[inside, 0], cells[inside, 1]] = True
+        return cls(grid, cell_size, arm.goal_len)
+
+    @classmethod
+    def for_arm(
+        cls,
+        arm,
+        cache_dir: str = WORKSPACE_CACHE_DIR,
+        cell_size: float = 2.0,
+        n_samples: int = 2_000_000,
+        seed: int = 0,
+    ) -> "WorkspaceIndex":
+        """
+        Loads the index of the arm geometry from the cache, building and saving it the first time.
+        :param arm: the arm
+        :param cache_dir: the folder where the indexes are stored
+        :param cell_size: the size of the grid cells
+        :param n_samples: the number of joint configurations to sample
+        :param seed: the seed of the sampling
+        :return: the workspace index
+        """
+        key = cls.geometry_key(arm, cell_size, n_samples, seed)
+        path = os.path.join(cache_dir, f"workspace_{key}.npz")
+        if os.path.exists(path):
+            return cls.load(path)
+        index = cls.build(arm, cell_size, n_samples, seed)
+        os.makedirs(cache_dir, exist_ok=True)
+        # written under a name of this process then renamed, so a reader never loads a
+        # partial file and concurrent builds of the same geometry do not mix their writes
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            index.save(f)
+        os.replace(tmp, path)
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> "WorkspaceIndex":
+        """
+        Loads an index from a .npz file.
+        :param path: the path of the file
+        :return: the workspace index
+        """
+        with np.load(path) as data:
+            return cls(
+                np.unpackbits(data["grid"], count=int(np.prod(data["shape"])))
+                .reshape(data["shape"])
+                .astype(bool),
+                float(data["cell_size"]),
+                float(data["goal_len"]),
+            )
+
+    def save(self, path: typing.Union[str, typing.IO]):
+        """
+        Saves the index into a .npz file.
+        :param path: the path of the file or an open binary file
+        :return:
+        """
+        np.savez_compressed(
+            path,
+            grid=np.packbits(self.grid),
+            shape=np.array(self.grid.shape),
+            cell_size=self.cell_size,
+            goal_len=self.goal_len,
+        )
+
+    def is_reachable(
+        self, points: typing.Union[typing.Sequence, np.ndarray]
+    ) -> np.ndarray:
+        """
+        Checks whether the arm can reach the given points.
+        :param points: points with shape (..., 2)
+        :return: a boolean array with shape (...)
+        """
+        cells = np.floor(np.asarray(points, dtype=np.float64) / self.cell_size).astype(
+            np.int64
+        )
+        ix, iy = cells[..., 0], cells[..., 1]
+        inside = (
+            (ix >= 0)
+            & (ix < self.grid.shape[0])
+            & (iy >= 0)
+            & (iy < self.grid.shape[1])
+        )
+        reachable = np.zeros(ix.shape, dtype=bool)
+        reachable[inside] = self.grid[ix[inside], iy[inside]]
+        return reachable
+
+    @property
+    def area(self) -> float:
+        """the reachable area of the environment"""
+        return len(self._cells) * self.cell_size**2
+
+    def from_uniform(self, u: np.ndarray) -> np.ndarray:
+        cells = self._cells[
+            np.minimum(
+                (u[:, 0] * len(self._cells)).astype(np.int64), len(self._cells) - 1
+            )
+        ]
+        ix, iy = np.unravel_index(cells, self.grid.shape)
+        goals = np.empty((len(u), 3))
+        goals[:, 0] = (ix + u[:, 1]) * self.cell_size
+        goals[:, 1] = (iy + u[:, 2]) * self.cell_size
+        goals[:, 2] = self.goal_len
+        return goals
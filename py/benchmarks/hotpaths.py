@@ -0,0 +1,292 @@
+"""Microbenchmarks of the hot paths of the env, the replay memory and the model.
+
+It measures the calls per second of `Arm.step`, `Arm.get_observation` and
+`ArmLink.distance_to` for every number of links, and of `DDPG.choose_action`,
+`DDPG.store_transition` and `DDPG.learn` for every number of links of the model, batch
+size and memory capacity. Everything runs on the CPU, and the arms, the memories, the
+weights of the models and the inputs are drawn from a fixed seed. The results can be saved
+as json and compared with a baseline, the script exits with 1 when a case got slower than
+the threshold.
+
+    python benchmarks/hotpaths.py run --output hotpaths.json
+    python benchmarks/hotpaths.py run --baseline hotpaths.json --threshold 0.25
+"""
+
+import os
+
+os.environ["CUDA_VISIBLE_DEVICES"] = ""  # before tensorflow is imported
+
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import typing
+
+import numpy as np
+import typer
+
+MAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MAIN_DIR)
+
+import main  # noqa: E402
+
+MIN_SLOWDOWN = 1.0  # microseconds per call, smaller slowdowns are noise
+N_INPUTS = 64  # distinct inputs cycled through by the measured calls
+NETWORKS = ("actor", "actor_target", "critic", "critic_target")
+
+
+def throughput(
+    call: typing.Callable[[], object], repeats: int = 5, min_time: float = 0.1
+) -> float:
+    """
+    Measures the calls per second of a function.
+    :param call: the function, called without arguments
+    :param repeats: the number of timed rounds, the median is kept
+    :param min_time: the minimum seconds of a round, the calls of a round are doubled
+        until a round lasts that long
+    :return: the calls per second
+    """
+
+    def timed(n: int) -> float:
+        start = time.perf_counter()
+        for _ in range(n):
+            call()
+        return time.perf_counter() - start
+
+    n = 1
+    while timed(n) < min_time:
+        n *= 2
+    return statistics.median(n / timed(n) for _ in range(repeats))
+
+
+def make_arm(n_links: int, seed: int):
+    """the arm of the benchmarks, the length of the links keeps the reach of the default
+    arm whatever their number"""
+    link_length = main.LINK_LENGTH * main.N_LINKS / n_links
+    arm = main.setup_env(n_links, link_length)
+    arm.rng = np.random.default_rng(seed)
+    arm.reset()
+    return arm
+
+
+def seed_model(model, seed: int):
+    """
+    Replaces the weights of the networks of a model with values drawn from a seed, the
+    optimizer variables are kept.
+    :param model: the DDPG model
+    :param seed: the seed of the weights
+    :return:
+    """
+    rng = np.random.default_rng(seed)
+    state = model.get_state()
+    for name, value in state.items():
+        network = name.split("/")[0].lower()
+        if network in NETWORKS and "Adam" not in name:
+            state[name] = rng.normal(0, 0.1, value.shape).astype(value.dtype)
+    model.set_state(state)
+    model.memory.rng = np.random.default_rng(seed)
+
+
+def bench_env(
+    n_links: int, seed: int, repeats: int, min_time: float
+) -> typing.Dict[str, float]:
+    """
+    Measures the hot paths of the env.
+    :param n_links: the number of links of the arm
+    :param seed: the seed of the arm and of the actions
+    :param repeats: the timed rounds of a case
+    :param min_time: the minimum seconds of a round
+    :return: the calls per second by case
+    """
+    arm = make_arm(n_links, seed)
+    rng = np.random.default_rng(seed)
+    actions = rng.uniform(-1, 1, (N_INPUTS, n_links))
+    # only the last joint moves, the links before it are not recomputed
+    last_joint = np.zeros_like(actions)
+    last_joint[:, -1] = actions[:, -1]
+    actions, last_joint = itertools.cycle(actions), itertools.cycle(last_joint)
+    link = arm.links[-1]
+    goal = arm.goal
+    return {
+        f"arm_step/links={n_links}": throughput(
+            lambda: arm.step(next(actions)), repeats, min_time
+        ),
+        f"arm_step_last_joint/links={n_links}": throughput(
+            lambda: arm.step(next(last_joint)), repeats, min_time
+        ),
+        f"arm_get_observation/links={n_links}": throughput(
+            # the kinematics are recomputed by every step, not by a repeated call
+            lambda: (arm.invalidate(0), arm.get_observation(goal)),
+            repeats,
+            min_time,
+        ),
+        f"arm_get_observation_last_joint/links={n_links}": throughput(
+            lambda: (arm.invalidate(n_links - 1), arm.get_observation(goal)),
+            repeats,
+            min_time,
+        ),
+        f"link_distance_to/links={n_links}": throughput(
+            lambda: link.distance_to(goal), repeats, min_time
+        ),
+    }
+
+
+def bench_model(
+    backend: str,
+    n_links: int,
+    batch_size: int,
+    memory_capacity: int,
+    threads: int,
+    seed: int,
+    repeats: int,
+    min_time: float,
+) -> typing.Dict[str, float]:
+    """
+    Measures the hot paths of the model and its memory, the memory is filled before
+    learn is measured.
+    :param backend: the model implementation
+    :param n_links: the number of links of the arm
+    :param batch_size: the transitions of an update
+    :param memory_capacity: the transitions of the memory
+    :param threads: the tensorflow threads
+    :param seed: the seed of the weights, the memory sampling and the inputs
+    :param repeats: the timed rounds of a case
+    :param min_time: the minimum seconds of a round
+    :return: the calls per second by case
+    """
+    make_arm(n_links, seed)
+    model = main.setup_model(
+        backend,
+        memory_capacity=memory_capacity,
+        batch_size=batch_size,
+        threads=threads,
+    )
+    seed_model(model, seed)
+    s_dim, a_dim = main.s_dim, main.a_dim
+    rng = np.random.default_rng(seed)
+    states = rng.uniform(-1, 1, (N_INPUTS, s_dim)).astype(np.float32)
+    actions = rng.uniform(-1, 1, (N_INPUTS, a_dim)).astype(np.float32)
+    rewards = rng.uniform(-1, 0, N_INPUTS).astype(np.float32)
+    next_states = np.roll(states, 1, axis=0)
+    transitions = itertools.cycle(zip(states, actions, rewards, next_states))
+    inputs = itertools.cycle(states)
+
+    key = f"links={n_links}/batch={batch_size}/capacity={memory_capacity}"
+    results = {
+        f"choose_action/{key}": throughput(
+            lambda: model.choose_action(next(inputs)), repeats, min_time
+        ),
+        f"store_transition/{key}": throughput(
+            lambda: model.store_transition(*next(transitions)), repeats, min_time
+        ),
+    }
+    for _ in range(0, memory_capacity, N_INPUTS):
+        model.store_transitions(states, actions, rewards, next_states)
+    model.learn()  # builds the update step of the tf2 model
+    results[f"learn/{key}"] = throughput(model.learn, repeats, min_time)
+    return results
+
+
+def regressions(
+    results: typing.Dict[str, float],
+    baseline: typing.Dict[str, float],
+    threshold: float,
+) -> typing.List[str]:
+    """
+    Compares the results with a baseline.
+    :param results: the calls per second by case
+    :param baseline: the calls per second of the baseline by case
+    :param threshold: the accepted relative slowdown of a call, slowdowns under
+        MIN_SLOWDOWN microseconds are always accepted
+    :return: a description of every regression
+    """
+    found = []
+    for case, rate in results.items():
+        before = baseline.get(case)
+        if before is None:
+            continue
+        now_us, before_us = 1e6 / rate, 1e6 / before
+        slowdown = now_us - before_us
+        if slowdown > MIN_SLOWDOWN and slowdown > before_us * threshold:
+            found.append(f"{case}: {now_us:.2f}us per call, baseline {before_us:.2f}us")
+    return found
+
+
+app = typer.Typer()
+
+
+@app.callback()
+def hotpaths():
+    """Microbenchmarks of the env, replay memory and model hot paths"""
+
+
+@app.command()
+def run(
+    links: typing.List[int] = typer.Option(
+        [2, 5, 10, 20, 50], help="numbers of links of the env cases"
+    ),
+    model_links: typing.List[int] = typer.Option(
+        [2, 10, 50], help="numbers of links of the model cases"
+    ),
+    batch_size: typing.List[int] = typer.Option(
+        [32, 256], help="batch sizes of the model cases"
+    ),
+    memory_capacity: typing.List[int] = typer.Option(
+        [10_000, 100_000], help="memory capacities of the model cases"
+    ),
+    backend: str = typer.Option("v1", help="the model implementation, 'v1' or 'tf2'"),
+    threads: int = typer.Option(1, help="tensorflow threads of the models"),
+    repeats: int = typer.Option(5, help="timed rounds per case"),
+    min_time: float = typer.Option(0.1, help="minimum seconds of a round"),
+    seed: int = typer.Option(0, help="seed of the arms, the models and the inputs"),
+    output: str = typer.Option(None, help="json file of the results"),
+    baseline: str = typer.Option(None, help="json file of the baseline results"),
+    threshold: float = typer.Option(0.25, help="accepted relative slowdown"),
+):
+    """Measures the calls per second of the hot paths"""
+    if backend not in main.BACKENDS:
+        raise typer.BadParameter(f"The backend must be one of {main.BACKENDS}")
+    if baseline:
+        with open(baseline) as f:
+            saved = json.load(f)
+        if saved["backend"] != backend:
+            raise typer.BadParameter(
+                f"The baseline was measured with {saved['backend']}"
+            )
+    results = {}
+
+    def show(cases: typing.Dict[str, float]):
+        for case, rate in cases.items():
+            print(f"{case:<56} {rate:12.1f}/s {1e6 / rate:10.2f}us")
+        results.update(cases)
+
+    for n in links:
+        show(bench_env(n, seed, repeats, min_time))
+    for n, size, capacity in itertools.product(
+        model_links, batch_size, memory_capacity
+    ):
+        show(bench_model(backend, n, size, capacity, threads, seed, repeats, min_time))
+    if output:
+        report = {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "backend": backend,
+            "threads": threads,
+            "seed": seed,
+            "calls_per_s": results,
+        }
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {output}")
+    if baseline:
+        found = regressions(results, saved["calls_per_s"], threshold)
+        for line in found:
+            print(f"Regression {line}")
+        if found:
+            raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
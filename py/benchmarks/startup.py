@@ -0,0 +1,205 @@
+"""Cold start benchmark of the commands of main.py.
+
+Every measure runs in a fresh interpreter, for every command it times the `--help` of the
+command (importing main.py and dispatching with typer) and the setup the command does
+before its work (creating the arm, the model, importing the viewer), and it lists the heavy
+modules imported by main.py itself. The results can be saved as json and compared with a
+baseline, the script exits with 1 when a command got slower than the threshold or when
+main.py imports a heavy module again.
+
+    python benchmarks/startup.py run --output startup.json
+    python benchmarks/startup.py run --baseline startup.json --threshold 0.25
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+import typer
+
+MAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = ("train", "sweep", "eval", "evaluate", "export", "render", "replay", "sim")
+HEAVY_MODULES = ("tensorflow", "matplotlib", "pandas", "pyglet")
+MIN_SLOWDOWN = 0.05  # seconds, smaller slowdowns are noise
+
+
+def _setup_model(main, backend: str):
+    main.setup_env()
+    main.setup_model(backend)
+
+
+def _setup_viewer(main, backend: str):
+    main.setup_env(colored=True)
+    import arm_env
+
+
+def _setup_sim(main, backend: str):
+    main.make_arm(10, 40, main.Size2D(600, 600))
+    import arm_env
+
+
+# the work every command does before its loop, the models are not restored
+SETUPS = {
+    "train": _setup_model,
+    "sweep": lambda main, backend: None,
+    "eval": _setup_model,
+    "evaluate": _setup_model,
+    "export": _setup_model,
+    "render": _setup_viewer,
+    "replay": _setup_viewer,
+    "sim": _setup_sim,
+}
+
+
+def probe(command: str, backend: str):
+    """
+    Times the import of main.py and the setup of a command in this interpreter, it prints
+    the result as json.
+    :param command: the command
+    :param backend: the model implementation
+    :return:
+    """
+    sys.path.insert(0, MAIN_DIR)
+    start = time.perf_counter()
+    import main
+
+    imported = time.perf_counter()
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    error = None
+    try:
+        SETUPS[command](main, backend)
+    except Exception as e:  # e.g. no display for the viewer
+        error = repr(e)
+    end = time.perf_counter()
+    result = {
+        "import_s": imported - start,
+        "setup_s": end - imported,
+        "heavy_at_import": heavy,
+        "error": error,
+    }
+    print(json.dumps(result))
+
+
+def _run(args: typing.List[str]) -> typing.Tuple[float, str]:
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable] + args, cwd=MAIN_DIR, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{process.stderr}")
+    return elapsed, process.stdout
+
+
+def measure(command: str, repeats: int = 5, backend: str = "v1") -> typing.Dict:
+    """
+    Measures the cold start of a command.
+    :param command: the command
+    :param repeats: the number of fresh interpreters per measure, the median is kept
+    :param backend: the model implementation of the setup
+    :return: the median seconds of the help, the import and the setup
+    """
+    cli, imports, setups, probes = [], [], [], []
+    for _ in range(repeats):
+        cli.append(_run(["main.py", command, "--help"])[0])
+        _, out = _run(
+            [os.path.abspath(__file__), "probe", command, "--backend", backend]
+        )
+        result = json.loads(out.strip().splitlines()[-1])
+        imports.append(result["import_s"])
+        setups.append(result["setup_s"])
+        probes.append(result)
+    return {
+        "cli_s": statistics.median(cli),
+        "import_s": statistics.median(imports),
+        "setup_s": statistics.median(setups),
+        "heavy_at_import": probes[-1]["heavy_at_import"],
+        "error": probes[-1]["error"],
+    }
+
+
+def regressions(
+    results: typing.Dict, baseline: typing.Dict, threshold: float
+) -> typing.List[str]:
+    """
+    Compares the results with a baseline.
+    :param results: the results by command
+    :param baseline: the results of the baseline by command
+    :param threshold: the accepted relative slowdown, slowdowns under MIN_SLOWDOWN
+        seconds are always accepted
+    :return: a description of every regression
+    """
+    found = []
+    for command, result in results.items():
+        if result["heavy_at_import"]:
+            found.append(f"{command}: main.py imports {result['heavy_at_import']}")
+        for key in ("cli_s", "setup_s"):
+            before = baseline.get(command, {}).get(key)
+            if before is None:
+                continue
+            slowdown = result[key] - before
+            if slowdown > MIN_SLOWDOWN and slowdown > before * threshold:
+                found.append(
+                    f"{command}: {key} {result[key]:.3f}s, baseline {before:.3f}s"
+                )
+    return found
+
+
+app = typer.Typer()
+
+
+@app.command()
+def run(
+    command: typing.List[str] = typer.Option(
+        list(COMMANDS), help="the commands measured"
+    ),
+    repeats: int = typer.Option(5, help="fresh interpreters per measure"),
+    backend: str = typer.Option("v1", help="the model implementation, 'v1' or 'tf2'"),
+    output: str = typer.Option(None, help="json file of the results"),
+    baseline: str = typer.Option(None, help="json file of the baseline results"),
+    threshold: float = typer.Option(0.25, help="accepted relative slowdown"),
+):
+    """Measures the cold start of the commands"""
+    results = {}
+    for name in command:
+        if name not in SETUPS:
+            raise typer.BadParameter(f"The command must be one of {COMMANDS}")
+        results[name] = result = measure(name, repeats, backend)
+        print(
+            f"{name:<8} help {result['cli_s']:7.3f}s  import {result['import_s']:7.3f}s"
+            f"  setup {result['setup_s']:7.3f}s"
+            + (f"  ({result['error']})" if result["error"] else "")
+        )
+    if output:
+        report = {
+            "python": platform.python_version(),
+            "backend": backend,
+            "commands": results,
+        }
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {output}")
+    if baseline:
+        with open(baseline) as f:
+            found = regressions(results, json.load(f)["commands"], threshold)
+        for line in found:
+            print(f"Regression {line}")
+        if found:
+            raise typer.Exit(1)
+
+
+@app.command("probe", hidden=True)
+def probe_command(
+    command: str = typer.Argument(...),
+    backend: str = typer.Option("v1"),
+):
+    probe(command, backend)
+
+
+if __name__ == "__main__":
+    app()
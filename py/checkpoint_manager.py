@@ -0,0 +1,214 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import typing
+
+import numpy as np
+
+CHECKPOINT_DIR = "./checkpoints"
+INDEX_FILE = "checkpoints.json"
+
+
+def _save_npz(path: str, arrays: typing.Dict[str, np.ndarray]):
+    """writes a dict of arrays, the names may contain slashes"""
+    with open(path, "wb") as f:
+        np.savez(f, **{name.replace("/", "|"): value for name, value in arrays.items()})
+
+
+def _load_npz(path: str) -> typing.Dict[str, np.ndarray]:
+    """reads a dict of arrays written by `_save_npz`"""
+    with np.load(path) as data:
+        return {name.replace("|", "/"): data[name] for name in data.files}
+
+
+class CheckpointManager(object):
+    """Saves versioned checkpoints of a training run, the variables of the model, the replay
+    memory and a json metadata file with the episode counter, the env geometry and the hyper
+    parameters. The state is copied on the training thread and written to the disk by a
+    background thread, so saving only stalls the training for the copy. The last `keep_last`
+    checkpoints and the one with the best metric are kept."""
+
+    def __init__(
+        self,
+        root: str = CHECKPOINT_DIR,
+        save_every: int = 50,
+        keep_last: int = 3,
+        resume: bool = False,
+    ):
+        """
+        :param root: the folder of the checkpoints
+        :param save_every: the number of episodes between checkpoints
+        :param keep_last: the number of recent checkpoints kept, 0 to only keep the best
+        :param resume: continue the run of the checkpoints in the folder, a new run
+            refuses a folder that is not empty so it never takes over the checkpoints and
+            the best entry of another run
+        """
+        if keep_last < 0:
+            raise ValueError("The number of kept checkpoints can not be negative.")
+        if not resume and os.path.isdir(root) and os.listdir(root):
+            raise FileExistsError(f"The checkpoint folder {root} is not empty.")
+        self.root = root
+        self.save_every = save_every
+        self.keep_last = keep_last
+        os.makedirs(root, exist_ok=True)
+        self.index = {"checkpoints": [], "best": None}
+        path = os.path.join(root, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.index = json.load(f)
+        self._jobs = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def due(self, episode: int) -> bool:
+        """
+        Whether a checkpoint is due after the given number of episodes.
+        """
+        return self.save_every > 0 and episode > 0 and episode % self.save_every == 0
+
+    def save(self, model, episode: int, metric: float, meta: typing.Dict = None):
+        """
+        Copies the state of the model and its memory and queues the checkpoint. It waits
+        when the previous checkpoint is still being written.
+        :param model: the DDPG model
+        :param episode: the number of episodes completed
+        :param metric: the value that ranks the checkpoints, higher is better
+        :param meta: extra json serializable metadata
+        :return:
+        """
+        self._raise()
+        meta = dict(meta or {}, episode=episode, metric=metric, time=time.time())
+        job = (model.get_state(), model.memory.state_dict(), meta)
+        self._jobs.put(job)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._jobs.task_done()
+                return
+            try:
+                self._write(*job)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._jobs.task_done()
+
+    def _write(
+        self, model_state: typing.Dict, memory_state: typing.Dict, meta: typing.Dict
+    ):
+        """writes a checkpoint into a temporary folder renamed once complete"""
+        name = f"ckpt_{meta['episode']:08d}"
+        path = os.path.join(self.root, name)
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        _save_npz(os.path.join(tmp, "model.npz"), model_state)
+        _save_npz(os.path.join(tmp, "memory.npz"), memory_state)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+        checkpoints = [c for c in self.index["checkpoints"] if c["name"] != name]
+        checkpoints.append(
+            {"name": name, "episode": meta["episode"], "metric": meta["metric"]}
+        )
+        best = max(checkpoints, key=lambda c: c["metric"])["name"]
+        recent = checkpoints[max(len(checkpoints) - self.keep_last, 0) :]
+        keep = {c["name"] for c in recent} | {best}
+        for c in checkpoints:
+            if c["name"] not in keep:
+                shutil.rmtree(os.path.join(self.root, c["name"]), ignore_errors=True)
+        self.index = {
+            "checkpoints": [c for c in checkpoints if c["name"] in keep],
+            "best": best,
+        }
+        index_path = os.path.join(self.root, INDEX_FILE)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+
+    def _raise(self):
+        """raises the error of the background thread on the training thread"""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Saving a checkpoint failed.") from error
+
+    def latest(self) -> typing.Optional[str]:
+        """the path of the latest checkpoint, None if there is none"""
+        if not self.index["checkpoints"]:
+            return None
+        return os.path.join(self.root, self.index["checkpoints"][-1]["name"])
+
+    def best(self) -> typing.Optional[str]:
+        """the path of the checkpoint with the best metric, None if there is none"""
+        if self.index["best"] is None:
+            return None
+        return os.path.join(self.root, self.index["best"])
+
+    @staticmethod
+    def metadata(path: str) -> typing.Dict:
+        """
+        Reads the metadata of a checkpoint.
+        :param path: the folder of the checkpoint
+        :return: the metadata
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            return json.load(f)
+
+    @classmethod
+    def load(cls, path: str) -> typing.Tuple[typing.Dict, typing.Dict, typing.Dict]:
+        """
+        Loads a checkpoint.
+        :param path: the folder of the checkpoint
+        :return: the model state, the memory state and the metadata
+        """
+        return (
+            _load_npz(os.path.join(path, "model.npz")),
+            _load_npz(os.path.join(path, "memory.npz")),
+            cls.metadata(path),
+        )
+
+    def restore(self, model, path: str = None) -> typing.Optional[typing.Dict]:
+        """
+        Restores the model and its memory from a checkpoint.
+        :param model: the DDPG model
+        :param path: the folder of the checkpoint, the latest one if None
+        :return: the metadata of the checkpoint, None if there is no checkpoint
+        """
+        path = path or self.latest()
+        if path is None:
+            return None
+        model_state, memory_state, meta = self.load(path)
+        model.set_state(model_state)
+        model.memory.load_state_dict(memory_state)
+        return meta
+
+    def wait(self):
+        """
+        Waits until the queued checkpoints are written.
+        :return:
+        """
+        self._jobs.join()
+        self._raise()
+
+    def close(self):
+        """
+        Writes the queued checkpoints and stops the background thread.
+        :return:
+        """
+        if self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join()
+        self._raise()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
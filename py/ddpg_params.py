@@ -0,0 +1,9 @@
+#####################  hyper parameters  ####################
+# shared by the DDPG backends, this module must not import tensorflow
+
+LR_A = 0.001  # learning rate for actor
+LR_C = 0.001  # learning rate for critic
+GAMMA = 0.9  # reward discount
+TAU = 0.01  # soft replacement
+MEMORY_CAPACITY = 30000
+BATCH_SIZE = 32
@@ -0,0 +1,125 @@
+import typing
+
+import numpy as np
+
+NOISE_TYPES = ("gaussian", "ou")
+
+
+class ActionNoise(object):
+    """Exploration noise added to the actions of a batch of envs, the state of every env is
+    a row of an array so the noise of the whole batch is drawn at once."""
+
+    def __init__(self, n_envs: int, a_dim: int, sigma: float = 0.1, seed: int = None):
+        """
+        :param n_envs: the number of envs
+        :param a_dim: action dimension
+        :param sigma: the scale of the noise
+        :param seed: the seed of the noise
+        """
+        self.n_envs = n_envs
+        self.a_dim = a_dim
+        self.sigma = sigma
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self) -> np.ndarray:
+        """
+        Draws the noise of the next step.
+        :return: the noise with shape (n_envs, a_dim)
+        """
+        raise NotImplementedError
+
+    def reset(self, indices: typing.Sequence[int] = None):
+        """
+        Resets the state of some or all the envs, e.g. at the start of their episodes.
+        :param indices: the envs to reset, all of them if None
+        :return:
+        """
+
+    def get_state(self) -> typing.Dict:
+        """
+        Returns the state of the noise, its random generator included.
+        :return: a json serializable dict
+        """
+        return {"rng": self.rng.bit_generator.state}
+
+    def set_state(self, state: typing.Dict):
+        """
+        Sets the state returned by get_state.
+        :param state: the state of the noise
+        :return:
+        """
+        self.rng.bit_generator.state = state["rng"]
+
+
+class GaussianNoise(ActionNoise):
+    """Uncorrelated gaussian noise."""
+
+    def __call__(self) -> np.ndarray:
+        return self.rng.normal(0.0, self.sigma, (self.n_envs, self.a_dim))
+
+
+class OrnsteinUhlenbeckNoise(ActionNoise):
+    """Temporally correlated noise that reverts to zero, it explores further than the
+    gaussian noise when the actions are velocities like the angle deltas of the arm."""
+
+    def __init__(
+        self,
+        n_envs: int,
+        a_dim: int,
+        sigma: float = 0.1,
+        theta: float = 0.15,
+        dt: float = 1.0,
+        seed: int = None,
+    ):
+        """
+        :param n_envs: the number of envs
+        :param a_dim: action dimension
+        :param sigma: the scale of the noise
+        :param theta: the rate of the reversion to zero
+        :param dt: the time step
+        :param seed: the seed of the noise
+        """
+        super().__init__(n_envs, a_dim, sigma, seed)
+        self.theta = theta
+        self.dt = dt
+        self.state = np.zeros((n_envs, a_dim))
+
+    def __call__(self) -> np.ndarray:
+        self.state += -self.theta * self.state * self.dt + self.sigma * np.sqrt(
+            self.dt
+        ) * self.rng.standard_normal(self.state.shape)
+        return self.state.copy()
+
+    def reset(self, indices: typing.Sequence[int] = None):
+        if indices is None:
+            self.state[:] = 0.0
+        else:
+            self.state[indices] = 0.0
+
+    def get_state(self) -> typing.Dict:
+        return dict(super().get_state(), state=self.state.tolist())
+
+    def set_state(self, state: typing.Dict):
+        super().set_state(state)
+        self.state[:] = state["state"]
+
+
+def make_noise(
+    kind: str, n_envs: int, a_dim: int, sigma: float = 0.1, seed: int = None
+) -> typing.Optional[ActionNoise]:
+    """
+    Creates the exploration noise of a batch of envs.
+    :param kind: "gaussian", "ou" or None for no noise
+    :param n_envs: the number of envs
+    :param a_dim: action dimension
+    :param sigma: the scale of the noise
+    :param seed: the seed of the noise
+    :return: the noise, None if kind is None
+    """
+    if kind is None:
+        return None
+    if kind == "gaussian":
+        return GaussianNoise(n_envs, a_dim, sigma, seed)
+    if kind == "ou":
+        return OrnsteinUhlenbeckNoise(n_envs, a_dim, sigma, seed=seed)
+    raise ValueError(f"The noise must be one of {NOISE_TYPES}")
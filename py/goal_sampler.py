@@ -0,0 +1,195 @@
+import math
+import typing
+
+import numpy as np
+
+from math_utils import Point2D, Size2D
+
+
+def make_rngs(seed: typing.Optional[int], n: int) -> typing.List[np.random.Generator]:
+    """
+    Creates independent random generators, one per environment.
+    :param seed: the root seed, streams are not reproducible if None
+    :param n: the number of generators
+    :return: the list of generators
+    """
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+class GoalSource(object):
+    """Base class of the goal samplers, goals are drawn as a deterministic transform of
+    uniform numbers so a single generator can serve a whole batch and per-env generators
+    stay reproducible."""
+
+    goal_len = 30
+
+    def from_uniform(self, u: np.ndarray) -> np.ndarray:
+        """
+        Maps uniform numbers to goals.
+        :param u: uniform numbers in [0, 1) with shape (n, 3)
+        :return: goals with shape (n, 3), each row is [x, y, goal_len]
+        """
+        raise NotImplementedError
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Samples a batch of goals from a single generator.
+        :param n: the number of goals
+        :param rng: the random generator
+        :return: goals with shape (n, 3)
+        """
+        return self.from_uniform(rng.random((n, 3)))
+
+    def sample_per_env(self, rngs: typing.Sequence[np.random.Generator]) -> np.ndarray:
+        """
+        Samples one goal per environment, each one from the generator of its env.
+        :param rngs: the generators of the environments
+        :return: goals with shape (len(rngs), 3)
+        """
+        return self.from_uniform(np.stack([rng.random(3) for rng in rngs]))
+
+
+class GoalSampler(GoalSource):
+    """Samples goals uniformly over the annulus the arm can reach, clipped to the environment.
+    The annulus is split in angular bins whose probability is proportional to their area, so
+    every goal costs a constant amount of work and no sample is ever rejected."""
+
+    def __init__(
+        self,
+        origin: Point2D,
+        env_size: Size2D,
+        min_radius: float,
+        max_radius: float,
+        goal_len: float = 30,
+        n_bins: int = 720,
+    ):
+        """
+        :param origin: the origin of the arm
+        :param env_size: the size of the environment
+        :param min_radius: the inner radius of the annulus
+        :param max_radius: the outer radius of the annulus
+        :param goal_len: the size of the goal box
+        :param n_bins: the number of angular bins
+        """
+        self.origin = origin
+        self.env_size = env_size
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.goal_len = goal_len
+
+        edges = np.linspace(0, 2 * math.pi, n_bins + 1)
+        mids = (edges[:-1] + edges[1:]) / 2
+        # the farthest distance we can go along each bin without leaving the env
+        bound = np.minimum.reduce(
+            [
+                self._distance_to_border(edges[:-1]),
+                self._distance_to_border(mids),
+                self._distance_to_border(edges[1:]),
+            ]
+        )
+        outer = np.minimum(bound, max_radius)
+        area = np.clip(outer**2 - min_radius**2, 0, None)
+        if area.sum() <= 0:
+            raise ValueError("The annulus does not intersect the environment.")
+        self._bin_start = edges[:-1]
+        self._bin_width = edges[1] - edges[0]
+        self._outer2 = outer**2
+        self._cdf = np.cumsum(area) / area.sum()
+
+    @classmethod
+    def from_arm(cls, arm, n_bins: int = 720) -> "GoalSampler":
+        """
+        Creates a sampler from the geometry of an arm, the inner radius is the length of
+        the first link, the outer radius is the length of the whole arm.
+        :param arm: the arm
+        :param n_bins: the number of angular bins
+        :return: the sampler
+        """
+        return cls(
+            arm.origin,
+            arm.env_size,
+            float(arm.lengths[0]),
+            float(arm.lengths.sum()),
+            arm.goal_len,
+            n_bins,
+        )
+
+    def _distance_to_border(self, theta: np.ndarray) -> np.ndarray:
+        """distance from the origin to the border of the env along the given directions"""
+        c, s = np.cos(theta), np.sin(theta)
+        ox, oy = self.origin.x, self.origin.y
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tx = np.where(c > 1e-12, (self.env_size.width - ox) / c, np.inf)
+            tx = np.where(c < -1e-12, -ox / c, tx)
+            ty = np.where(s > 1e-12, (self.env_size.height - oy) / s, np.inf)
+            ty = np.where(s < -1e-12, -oy / s, ty)
+        return np.minimum(tx, ty)
+
+    def from_uniform(self, u: np.ndarray) -> np.ndarray:
+        bins = np.minimum(
+            np.searchsorted(self._cdf, u[:, 0], side="right"), len(self._cdf) - 1
+        )
+        theta = self._bin_start[bins] + u[:, 1] * self._bin_width
+        inner2 = self.min_radius**2
+        radius = np.sqrt(inner2 + u[:, 2] * (self._outer2[bins] - inner2))
+        goals = np.empty((len(u), 3))
+        goals[:, 0] = np.clip(
+            self.origin.x + radius * np.cos(theta), 0, self.env_size.width
+        )
+        goals[:, 1] = np.clip(
+            self.origin.y + radius * np.sin(theta), 0, self.env_size.height
+        )
+        goals[:, 2] = self.goal_len
+        return goals
+
+
+class GoalBank(GoalSource):
+    """A precomputed set of goals, sampling picks rows of the bank."""
+
+    def __init__(self, goals: np.ndarray):
+        """
+        :param goals: the goals with shape (n, 3)
+        """
+        self.goals = np.asarray(goals, dtype=np.float64)
+        if len(self.goals) == 0:
+            raise ValueError("The goal bank is empty.")
+        self.goal_len = float(self.goals[0, 2])
+
+    def __len__(self):
+        return len(self.goals)
+
+    @classmethod
+    def from_sampler(
+        cls, sampler: GoalSource, size: int, seed: int = None
+    ) -> "GoalBank":
+        """
+        Fills a bank drawing goals from a sampler.
+        :param sampler: the sampler
+        :param size: the number of goals of the bank
+        :param seed: the seed used to draw the goals
+        :return: the goal bank
+        """
+        return cls(sampler.sample(size, np.random.default_rng(seed)))
+
+    @classmethod
+    def load(cls, path: str) -> "GoalBank":
+        """
+        Loads a bank from a .npy file.
+        :param path: the path of the file
+        :return: the goal bank
+        """
+        return cls(np.load(path))
+
+    def save(self, path: str):
+        """
+        Saves the bank into a .npy file.
+        :param path: the path of the file
+        :return:
+        """
+        np.save(path, self.goals)
+
+    def from_uniform(self, u: np.ndarray) -> np.ndarray:
+        rows = np.minimum(
+            (u[:, 0] * len(self.goals)).astype(np.int64), len(self.goals) - 1
+        )
+        return self.goals[rows]
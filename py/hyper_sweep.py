@@ -0,0 +1,207 @@
+import csv
+import itertools
+import math
+import multiprocessing as mp
+import os
+import typing
+
+import numpy as np
+
+
+class Choice(object):
+    """A searched parameter taking one of a list of values."""
+
+    def __init__(self, values: typing.Sequence):
+        """
+        :param values: the values of the parameter
+        """
+        self.values = list(values)
+
+    def sample(self, rng: np.random.Generator):
+        return self.values[rng.integers(len(self.values))]
+
+
+class Uniform(object):
+    """A searched parameter drawn from a range, uniformly or uniformly in log scale."""
+
+    def __init__(self, low: float, high: float, log: bool = False, dtype: type = float):
+        """
+        :param low: the lower bound of the range
+        :param high: the upper bound of the range
+        :param log: draw the value uniformly in log scale, e.g. for the learning rates
+        :param dtype: the type of the value, int values are rounded
+        """
+        if log and (low <= 0 or high <= 0):
+            raise ValueError("A log range must be positive")
+        self.low, self.high, self.log, self.dtype = low, high, log, dtype
+
+    def sample(self, rng: np.random.Generator):
+        if self.log:
+            value = math.exp(rng.uniform(math.log(self.low), math.log(self.high)))
+        else:
+            value = rng.uniform(self.low, self.high)
+        return int(round(value)) if self.dtype is int else float(value)
+
+
+def parse_space(
+    specs: typing.Sequence[str], types: typing.Dict[str, type]
+) -> typing.Dict[str, typing.Union[Choice, Uniform]]:
+    """
+    Parses the search space of a sweep.
+    :param specs: one spec per parameter, "name=v1,v2,..." for a list of values,
+        "name=low:high" for a range or "name=log:low:high" for a range in log scale
+    :param types: the type of every parameter that can be searched
+    :return: the parameters of the search space by name
+    """
+    space = {}
+    for spec in specs:
+        name, sep, values = spec.partition("=")
+        name = name.strip()
+        if not sep or not values:
+            raise ValueError(f"The parameter {spec!r} must be written name=values")
+        if name not in types:
+            raise ValueError(f"The parameter {name!r} must be one of {tuple(types)}")
+        dtype = types[name]
+        bounds = values.split(":")
+        if len(bounds) == 1:
+            space[name] = Choice([dtype(v) for v in values.split(",")])
+        elif len(bounds) == 3 and bounds[0] == "log":
+            space[name] = Uniform(float(bounds[1]), float(bounds[2]), True, dtype)
+        elif len(bounds) == 2:
+            space[name] = Uniform(float(bounds[0]), float(bounds[1]), False, dtype)
+        else:
+            raise ValueError(f"The range of the parameter {name!r} is not valid")
+    return space
+
+
+def grid_configs(
+    space: typing.Dict[str, typing.Union[Choice, Uniform]],
+) -> typing.List[typing.Dict]:
+    """
+    Enumerates every combination of the values of the search space.
+    :param space: the search space, every parameter must be a list of values
+    :return: the configurations
+    """
+    for name, dim in space.items():
+        if not isinstance(dim, Choice):
+            raise ValueError(
+                f"The range of {name!r} can only be sampled, use --samples"
+            )
+    names = list(space)
+    values = itertools.product(*(space[name].values for name in names))
+    return [dict(zip(names, combination)) for combination in values]
+
+
+def random_configs(
+    space: typing.Dict[str, typing.Union[Choice, Uniform]],
+    n: int,
+    seed: int = None,
+) -> typing.List[typing.Dict]:
+    """
+    Draws random configurations of the search space.
+    :param space: the search space
+    :param n: the number of configurations
+    :param seed: the seed of the draws
+    :return: the configurations
+    """
+    rng = np.random.default_rng(seed)
+    return [{name: dim.sample(rng) for name, dim in space.items()} for _ in range(n)]
+
+
+def write_results(path: str, rows: typing.List[typing.Dict], columns: typing.List[str]):
+    """
+    Writes the results table of a sweep as csv, the file is replaced once complete.
+    :param path: the path of the csv file
+    :param rows: one dict per trial
+    :param columns: the columns of the table
+    :return:
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path + ".tmp", "w", newline="") as f:
+        writer = csv.DictWriter(f, columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(path + ".tmp", path)
+
+
+def format_table(rows: typing.List[typing.Dict], columns: typing.List[str]) -> str:
+    """
+    Formats the results of a sweep as a text table.
+    :param rows: one dict per trial
+    :param columns: the columns of the table
+    :return: the table
+    """
+
+    def cell(value):
+        if isinstance(value, float):
+            return "nan" if math.isnan(value) else f"{value:.4g}"
+        return "" if value is None else str(value)
+
+    cells = [columns] + [[cell(row.get(c)) for c in columns] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    lines = ["  ".join(v.rjust(w) for v, w in zip(line, widths)) for line in cells]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def _run_trial(
+    task: typing.Tuple[int, typing.Callable, typing.Dict],
+) -> typing.Tuple[int, typing.Dict, typing.Optional[str]]:
+    """runs a trial in a worker, the error is returned so the other trials go on"""
+    index, trial, options = task
+    try:
+        return index, trial(options), None
+    except Exception as e:
+        return index, None, repr(e)
+
+
+def run_sweep(
+    trial: typing.Callable[[typing.Dict], typing.Dict],
+    configs: typing.List[typing.Dict],
+    options: typing.Dict = None,
+    n_workers: int = None,
+    results_path: str = None,
+    result_columns: typing.Sequence[str] = (),
+) -> typing.List[typing.Dict]:
+    """
+    Runs the trials of a sweep in a pool of processes, every trial gets a fresh spawned
+    process, so its own tensorflow graph, session and thread limits, and the share of
+    the cores of one worker. The results table is rewritten after every trial.
+    :param trial: a picklable function of the trial, it gets a dict with the
+        configuration under "config", the options and the number of "threads", and
+        returns a dict of results
+    :param configs: the configurations of the trials
+    :param options: the options shared by all the trials
+    :param n_workers: the number of trials run at once, the number of cores if None
+    :param results_path: the csv file of the results table, not written if None
+    :param result_columns: the result columns of the table
+    :return: one row per trial, the configuration and the results, in trial order
+    """
+    cores = os.cpu_count() or 1
+    n_workers = min(n_workers or cores, max(len(configs), 1))
+    threads = max(cores // n_workers, 1)
+    names = list(dict.fromkeys(name for config in configs for name in config))
+    columns = ["trial"] + names + list(result_columns) + ["error"]
+
+    rows = []
+    tasks = [
+        (index, trial, dict(options or {}, config=config, threads=threads))
+        for index, config in enumerate(configs)
+    ]
+    with mp.get_context("spawn").Pool(n_workers, maxtasksperchild=1) as pool:
+        for index, result, error in pool.imap_unordered(_run_trial, tasks):
+            row = dict(configs[index], trial=index)
+            if error is None:
+                row.update(result)
+            else:
+                row["error"] = error
+            rows.append(row)
+            print(f"Trial {len(rows)}/{len(configs)}: {row}")
+            if results_path:
+                write_results(
+                    results_path, sorted(rows, key=lambda r: r["trial"]), columns
+                )
+    rows.sort(key=lambda r: r["trial"])
+    return rows
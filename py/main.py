@@ -1,11 +1,38 @@
-import pyglet
-
-from arm_env import Arm, ArmSimViewer
-from arm_rl_model import DDPG
-from color_utils import ColorUtils
+from arm_core import Arm
+from arm_vec_env import VectorArm
+from arm_parallel_env import ParallelVectorArm
+from arm_workspace import WorkspaceIndex
+from actor_learner import BROADCAST_EVERY, ActorLearner
+from checkpoint_manager import CHECKPOINT_DIR, CheckpointManager
+from exploration_noise import ActionNoise, make_noise
+from hyper_sweep import (
+    format_table,
+    grid_configs,
+    parse_space,
+    random_configs,
+    run_sweep,
+)
+from metrics_sink import MetricsSink, RunMetrics
+from numpy_policy import ACTOR_PATH, NumpyPolicy
+from goal_sampler import GoalBank
+from policy_evaluation import (
+    evaluate_policy,
+    goal_grid,
+    goals_hash,
+    load_evaluation,
+    rank_key,
+    save_evaluation,
+    summarize,
+)
 from math_utils import *
-from plot_utils import plot_episode_stats
+from trajectory_recorder import TrajectoryReader, TrajectoryRecorder
+from training_profiler import TrainingProfiler
+import contextlib
+import numpy as np
+import os
 import random
+import time
+import typing
 import typer
 
 # ****** parameters ******#
@@ -18,74 +45,951 @@ MAX_EP_STEPS = 300
 
 
 # ****** arm setup ******#
-env = Arm(ARM_ORIGIN, env_size=ENV_SIZE, link_width=10)
-colors_dict = ColorUtils.rainbow(n=N_LINKS)
-R = colors_dict["r"]
-G = colors_dict["g"]
-B = colors_dict["b"]
-rainbow_colors = list(zip(B, G, R))
-for i in range(N_LINKS):
-    env.add_link(LINK_LENGTH, rainbow_colors[i])
-env.set_angles(*len(env.links) * [0])
+def make_arm(
+    n_links: int = N_LINKS,
+    link_length: float = LINK_LENGTH,
+    env_size: Size2D = ENV_SIZE,
+    colored: bool = True,
+) -> Arm:
+    """
+    Creates the arm with links of the same length at the bottom center of the environment.
+    :param n_links: the number of links
+    :param link_length: the length of the links
+    :param env_size: the size of the environment
+    :param colored: give the links rainbow colors, they are only drawn by the viewer and
+        computing them imports matplotlib, the links are white otherwise
+    :return: the arm
+    """
+    arm = Arm(Point2D(env_size.width / 2, 0), env_size=env_size, link_width=10)
+    rainbow_colors = n_links * [(255, 255, 255)]
+    if colored:
+        from color_utils import ColorUtils
+
+        colors_dict = ColorUtils.rainbow(n=n_links)
+        R = colors_dict["r"]
+        G = colors_dict["g"]
+        B = colors_dict["b"]
+        rainbow_colors = list(zip(B, G, R))
+    for i in range(n_links):
+        arm.add_link(link_length, rainbow_colors[i])
+    arm.set_angles(*len(arm.links) * [0])
+    return arm
+
+
+# the arm and the model are created by the commands, so importing this module and
+# dispatching a command only pay for what the command uses
+env = None  # created with setup_env
+s_dim = a_dim = a_bound = None
+
+
+def setup_env(
+    n_links: int = N_LINKS,
+    link_length: float = LINK_LENGTH,
+    env_size: Size2D = ENV_SIZE,
+    colored: bool = False,
+) -> Arm:
+    """
+    Creates the arm of the commands and the dimensions of the model.
+    :param n_links: the number of links
+    :param link_length: the length of the links
+    :param env_size: the size of the environment
+    :param colored: give the links rainbow colors, for the viewer
+    :return: the arm
+    """
+    global env, s_dim, a_dim, a_bound
+    env = make_arm(n_links, link_length, env_size, colored)
+    s_dim, a_dim, a_bound = env.state_dim, env.action_dim, env.action_bound
+    return env
+
 
 # ****** model setup ******#
-s_dim = env.state_dim
-a_dim = env.action_dim
-a_bound = env.action_bound
-rl_model = DDPG(a_dim, s_dim, a_bound)
+BACKENDS = ("v1", "tf2")
+rl_model = None  # created by the commands with setup_model
+
+
+def setup_model(
+    backend: str = "v1",
+    prioritized: bool = False,
+    jit: bool = False,
+    memory: str = None,
+    **hparams,
+):
+    """
+    Creates the model with the chosen backend, the backends are imported here because the
+    compat.v1 one disables the TF2 behavior for the whole process.
+    :param backend: "v1" for the compat.v1 session model, "tf2" for the tf.function one
+    :param prioritized: replay the transitions proportionally to their td error
+    :param jit: compile the update step with XLA, tf2 backend only
+    :param memory: folder of a disk backed replay memory, in RAM if None
+    :param hparams: hyper parameters of the model (lr_a, lr_c, gamma, tau,
+        memory_capacity, batch_size) and its threads, the ddpg_params ones if not given
+    :return: the model
+    """
+    global rl_model
+    if backend not in BACKENDS:
+        raise typer.BadParameter(f"The backend must be one of {BACKENDS}")
+    if env is None:
+        setup_env()
+    if backend == "tf2":
+        from arm_rl_model_tf2 import DDPG
+
+        model = DDPG
+        options = dict(hparams, jit_compile=jit)
+    else:
+        from arm_rl_model import DDPG
+
+        model = DDPG
+        options = hparams
+    try:
+        rl_model = model(
+            a_dim,
+            s_dim,
+            a_bound,
+            prioritized=prioritized,
+            memory_path=memory,
+            **options,
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    return rl_model
+
+
+def load_policy(backend: str = "v1", policy: str = None):
+    """
+    Loads the trained policy, either the restored model or the numpy policy exported from it.
+    :param backend: the model implementation, used when policy is None
+    :param policy: the .npz file of an exported actor, the model is restored if None
+    :return: an object with a choose_action method
+    """
+    if policy:
+        return NumpyPolicy.load(policy)
+    setup_model(backend)
+    rl_model.restore()
+    return rl_model
 
 
 app = typer.Typer()
 
 
 @app.command()
-def train():
+def train(
+    n_envs: int = typer.Option(1, help="number of arms stepped together in a batch"),
+    workers: int = typer.Option(
+        0,
+        help="number of worker processes stepping the batch of arms, 0 to step it inline",
+    ),
+    seed: int = typer.Option(
+        None,
+        help="root seed of the resets, the exploration noise and the replay sampling",
+    ),
+    workspace: bool = typer.Option(
+        True, help="draw the goals from the precomputed reachable workspace of the arm"
+    ),
+    record: str = typer.Option(
+        None, help="folder where the transitions of the rollouts are recorded"
+    ),
+    warm_start: str = typer.Option(
+        None, help="recording used to fill the replay memory before training"
+    ),
+    prioritized: bool = typer.Option(
+        False, help="replay the transitions proportionally to their td error"
+    ),
+    updates: int = typer.Option(1, help="gradient updates of the model per step"),
+    backend: str = typer.Option("v1", help="the model implementation, 'v1' or 'tf2'"),
+    jit: bool = typer.Option(False, help="compile the update step with XLA (tf2)"),
+    noise: str = typer.Option(
+        None, help="exploration noise added to the actions, 'gaussian' or 'ou'"
+    ),
+    noise_sigma: float = typer.Option(0.1, help="scale of the exploration noise"),
+    checkpoint_every: int = typer.Option(
+        0, help="episodes between checkpoints saved in the background, 0 to disable"
+    ),
+    checkpoint_dir: str = typer.Option(
+        CHECKPOINT_DIR, help="folder of the checkpoints"
+    ),
+    keep_checkpoints: int = typer.Option(
+        3, help="number of recent checkpoints kept, 0 to only keep the best"
+    ),
+    resume: bool = typer.Option(
+        False, help="resume the run from the latest checkpoint of the checkpoint folder"
+    ),
+    memory: str = typer.Option(
+        None, help="folder of a disk backed replay memory, reopened if it exists"
+    ),
+    actors: int = typer.Option(
+        0, help="number of actor processes collecting experience while this one learns"
+    ),
+    broadcast_every: int = typer.Option(
+        BROADCAST_EVERY,
+        help="learner updates between two broadcasts of the actor weights",
+    ),
+    profile: bool = typer.Option(
+        False, help="measure the time of the phases of the training loop"
+    ),
+    profile_every: float = typer.Option(
+        30.0, help="seconds between two summaries of the profile"
+    ),
+    profile_trace: str = typer.Option(
+        None,
+        help="folder where a tensorflow trace of the updates is exported (profile)",
+    ),
+    metrics: str = typer.Option(
+        None, help="folder where the episode and progress metrics are streamed"
+    ),
+    metrics_format: str = typer.Option("jsonl", help="'jsonl' or 'csv'"),
+    metrics_every: int = typer.Option(
+        1000, help="env steps between two progress records of the metrics"
+    ),
+    quiet: bool = typer.Option(False, help="do not print the episodes"),
+):
     """This function performs the training of the model"""
-    reward_values = []
-    steps_list = []
-    for i in range(MAX_EPISODES):
+    if actors > 0 and (record or prioritized or memory or workers > 0):
+        raise typer.BadParameter(
+            "The actors can not be combined with --record, --prioritized, --memory or --workers"
+        )
+    if memory and (checkpoint_every > 0 or resume):
+        # the files of the disk memory keep changing after a checkpoint is saved
+        raise typer.BadParameter("The checkpoints can not be combined with --memory")
+    setup_env()
+    setup_model(backend, prioritized, jit, memory)
+    meta = run_metadata(backend, spawn_seeds(seed))
+    history, resumed = ([], []), None
+    checkpoints = None
+    if checkpoint_every > 0 or resume:
+        try:
+            checkpoints = CheckpointManager(
+                checkpoint_dir, checkpoint_every, keep_checkpoints, resume
+            )
+        except FileExistsError as e:
+            raise typer.BadParameter(f"{e} Use --resume to continue its run.")
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+    if resume:
+        history, resumed = resume_training(checkpoints, meta)
+    seeds = meta["seeds"]
+    rl_model.memory.rng = np.random.default_rng(seeds["memory"])
+    try:
+        noise_kind, noise = noise, make_noise(
+            noise, n_envs, a_dim, noise_sigma, seeds["noise"]
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    if workspace:
+        env.goal_sampler = WorkspaceIndex.for_arm(env)
+    if warm_start:
+        load_recording(warm_start)
+    recorder = None
+    if record:
+        recorder = TrajectoryRecorder(record, s_dim, a_dim, len(env.links))
+    profiler = make_profiler(
+        profile or bool(profile_trace), profile_every, profile_trace
+    )
+    run_metrics = None
+    if metrics:
+        try:
+            sink = MetricsSink(metrics, metrics_format)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+        run_metrics = RunMetrics(sink, metrics_every)
+    loop = dict(
+        recorder=recorder,
+        updates=updates,
+        noise=noise,
+        checkpoints=checkpoints,
+        meta=meta,
+        history=history,
+        metrics=run_metrics,
+        quiet=quiet,
+        resumed=resumed,
+    )
+    try:
+        if actors > 0:
+            history = train_actor_learner(
+                actors,
+                n_envs,
+                updates,
+                noise_kind,
+                noise_sigma,
+                seeds["env"],
+                broadcast_every,
+                checkpoints,
+                meta,
+                history,
+                run_metrics,
+                quiet,
+                profiler,
+                resumed,
+            )
+        elif workers > 0:
+            with ParallelVectorArm(
+                env, n_envs, n_workers=workers, seed=seeds["env"]
+            ) as venv:
+                profile_env(profiler, venv)
+                history = train_vectorized(venv, **loop)
+        elif n_envs > 1:
+            venv = VectorArm(env, n_envs, seed=seeds["env"])
+            profile_env(profiler, venv)
+            history = train_vectorized(venv, **loop)
+        else:
+            profile_env(profiler, env)
+            history = train_single(seeds["env"], **loop)
+        save_training_results(*history)
+    finally:
+        profiler.close()
+        if run_metrics is not None:
+            run_metrics.close()
+        rl_model.memory.flush()
+        if recorder is not None:
+            recorder.close()
+        if checkpoints is not None:
+            checkpoints.close()
+
+
+def make_profiler(
+    enabled: bool = False, report_every: float = 30.0, trace_dir: str = None
+) -> TrainingProfiler:
+    """
+    Creates the profiler of the training loop and measures the phases of the model and of
+    its memory, the phases of the env are added by `profile_env`.
+    :param enabled: measure the phases, or do nothing
+    :param report_every: the seconds between two summaries
+    :param trace_dir: the folder of the tensorflow trace of the updates, exported once the
+        model learns, no trace if None
+    :return: the profiler
+    """
+
+    def trace(index: int) -> bool:
+        if not rl_model.memory_full:
+            return False
+        path = os.path.join(trace_dir, f"trace_{index}")
+        rl_model.trace_updates(path)
+        print(f"Saved a trace of the updates to {path}")
+        return True
+
+    profiler = TrainingProfiler(enabled, report_every, trace if trace_dir else None)
+    profiler.instrument(rl_model, "choose_actions", "act", lambda s, noise=None: len(s))
+    profiler.instrument(rl_model, "store_transition", "store")
+    profiler.instrument(
+        rl_model, "store_transitions", "store", lambda s, a, r, s_: len(s)
+    )
+    profiler.instrument(rl_model, "learn", "learn", lambda n_updates=1: n_updates)
+    profiler.instrument(rl_model, "_update", "update")
+    profile_memory(profiler)
+    return profiler
+
+
+def profile_memory(profiler: TrainingProfiler):
+    """
+    Measures the sampling of the replay memory of the model.
+    :param profiler: the profiler
+    :return:
+    """
+    profiler.instrument(rl_model.memory, "sample_indices", "sample")
+    profiler.instrument(rl_model.memory, "gather", "gather")
+
+
+def profile_env(
+    profiler: TrainingProfiler,
+    venv: typing.Union[Arm, VectorArm, ParallelVectorArm],
+):
+    """
+    Measures the steps of the env and the observations when they are computed in process.
+    :param profiler: the profiler
+    :param venv: the arm or the batch of arms
+    :return:
+    """
+    profiler.instrument(venv, "step", "env_step", lambda a: len(np.atleast_2d(a)))
+    if hasattr(venv, "get_observation"):
+        profiler.instrument(venv, "get_observation", "observation")
+
+
+SEED_STREAMS = ("env", "noise", "memory")
+
+
+def spawn_seeds(seed: int = None) -> typing.Dict[str, int]:
+    """
+    Derives independent seeds for the random streams of a run from its root seed, so the
+    exploration noise is not drawn from the same bits as the resets of the arms.
+    :param seed: the root seed, drawn from the entropy of the OS if None
+    :return: the seed of the envs, the exploration noise and the memory sampling
+    """
+    children = np.random.SeedSequence(seed).spawn(len(SEED_STREAMS))
+    return {
+        name: int(child.generate_state(1, np.uint64)[0])
+        for name, child in zip(SEED_STREAMS, children)
+    }
+
+
+def run_metadata(backend: str, seeds: typing.Dict[str, int] = None) -> dict:
+    """
+    Describes the training run for the checkpoints, the geometry of the arm, the hyper
+    parameters of the model and the seeds of its random streams.
+    :param backend: the model implementation
+    :param seeds: the seeds of the random streams of the run, see spawn_seeds
+    :return: a json serializable dict
+    """
+    return {
+        "backend": backend,
+        "seeds": seeds,
+        "geometry": {
+            "origin": [float(v) for v in env.origin],
+            "env_size": [float(v) for v in env.env_size],
+            "lengths": env.lengths.tolist(),
+            "lower": env.lower_limits.tolist(),
+            "upper": env.upper_limits.tolist(),
+        },
+        "params": {
+            "lr_a": rl_model.lr_a,
+            "lr_c": rl_model.lr_c,
+            "gamma": rl_model.gamma,
+            "tau": rl_model.tau,
+            "batch_size": rl_model.batch_size,
+            "memory_capacity": rl_model.memory.capacity,
+        },
+        "max_episodes": MAX_EPISODES,
+        "max_ep_steps": MAX_EP_STEPS,
+    }
+
+
+def resume_training(
+    checkpoints: CheckpointManager, meta: dict
+) -> typing.Tuple[typing.Tuple[list, list], typing.Optional[dict]]:
+    """
+    Restores the model and its memory from the latest checkpoint.
+    :param checkpoints: the checkpoint manager
+    :param meta: the metadata of the current run, it must match the checkpoint, its seeds
+        are replaced by the ones of the checkpoint
+    :return: the steps and rewards of the episodes completed so far and the states of the
+        random generators of the run
+    """
+    saved = checkpoints.latest()
+    if saved is None:
+        raise typer.BadParameter(f"There is no checkpoint in {checkpoints.root}")
+    saved_meta = checkpoints.metadata(saved)
+    for key in ("backend", "geometry", "params"):
+        if saved_meta[key] != meta[key]:
+            raise typer.BadParameter(
+                f"The {key} of the checkpoint {saved} does not match the run: "
+                f"{saved_meta[key]} instead of {meta[key]}"
+            )
+    checkpoints.restore(rl_model, saved)
+    # the resumed run keeps the seeds it was started with
+    meta["seeds"] = saved_meta.get("seeds") or meta["seeds"]
+    print(f"Resumed from {saved} at episode {saved_meta['episode']}")
+    history = saved_meta["steps"], saved_meta["rewards"]
+    return history, saved_meta.get("random_state")
+
+
+def random_state(
+    venv: typing.Union[VectorArm, ParallelVectorArm] = None,
+    noise: ActionNoise = None,
+) -> dict:
+    """
+    Collects the states of the random generators of the run, saved with the checkpoints
+    so a resumed run continues their streams instead of replaying them.
+    :param venv: the batch of arms, the single arm if None
+    :param noise: the exploration noise
+    :return: a json serializable dict
+    """
+    return {
+        "envs": venv.rng_states() if venv else [env.rng.bit_generator.state],
+        "memory": rl_model.memory.rng.bit_generator.state,
+        "noise": noise.get_state() if noise else None,
+    }
+
+
+def set_random_state(
+    state: dict,
+    venv: typing.Union[VectorArm, ParallelVectorArm] = None,
+    noise: ActionNoise = None,
+):
+    """
+    Restores the states of the random generators saved by random_state.
+    :param state: the saved states
+    :param venv: the batch of arms, the single arm if None
+    :param noise: the exploration noise
+    :return:
+    """
+    if venv:
+        venv.set_rng_states(state["envs"])
+    else:
+        env.rng.bit_generator.state = state["envs"][0]
+    rl_model.memory.rng.bit_generator.state = state["memory"]
+    if noise and state["noise"]:
+        noise.set_state(state["noise"])
+
+
+def end_episode(
+    steps_list: list,
+    reward_values: list,
+    ep_r: float,
+    steps: int,
+    done: bool,
+    checkpoints: CheckpointManager = None,
+    meta: dict = None,
+    metrics: RunMetrics = None,
+    quiet: bool = False,
+    rng_state: typing.Callable[[], dict] = None,
+):
+    """
+    Records a completed episode, it prints it, appends it to the history, logs it to the
+    metrics and saves a checkpoint when it is due.
+    :param steps_list: the number of steps of every episode
+    :param reward_values: the reward of every episode
+    :param ep_r: the reward of the episode
+    :param steps: the steps of the episode
+    :param done: whether the episode reached the goal
+    :param checkpoints: the checkpoint manager, nothing is saved if None
+    :param meta: the metadata of the run
+    :param metrics: the metrics of the run, nothing is logged if None
+    :param quiet: do not print the episode
+    :param rng_state: collects the states of the random generators saved with the
+        checkpoint
+    :return:
+    """
+    if not quiet:
+        print(
+            "Ep: %i | %s | ep_r: %.1f | step: %i"
+            % (len(reward_values), "---" if not done else "done", ep_r, steps)
+        )
+    reward_values.append(ep_r)
+    steps_list.append(steps)
+    if metrics:
+        metrics.episode(ep_r, steps, done)
+    episode = len(reward_values)
+    if checkpoints is None or not checkpoints.due(episode):
+        return
+    metric = float(np.mean(reward_values[-checkpoints.save_every :]))
+    history = {
+        "steps": [int(v) for v in steps_list],
+        "rewards": [float(v) for v in reward_values],
+    }
+    if rng_state:
+        history["random_state"] = rng_state()
+    checkpoints.save(rl_model, episode, metric, dict(meta, **history))
+
+
+def load_recording(path: str):
+    """
+    Fills the replay memory with the latest transitions of a recording.
+    :param path: the folder of the recording
+    :return:
+    """
+    reader = TrajectoryReader(path)
+    if len(reader) == 0:
+        raise typer.BadParameter(f"There is no transition in the recording {path}")
+    start = max(len(reader) - rl_model.memory.capacity, 0)
+    rl_model.store_transitions(*reader.transitions(start))
+    print(f"Loaded {len(reader) - start} transitions from {path}")
+
+
+def train_single(
+    seed: int = None,
+    recorder: TrajectoryRecorder = None,
+    updates: int = 1,
+    noise: ActionNoise = None,
+    checkpoints: CheckpointManager = None,
+    meta: dict = None,
+    history: typing.Tuple[list, list] = ([], []),
+    metrics: RunMetrics = None,
+    quiet: bool = False,
+    resumed: dict = None,
+):
+    """
+    Trains the model on the single arm environment.
+    :param seed: the seed of the environment resets
+    :param recorder: records the transitions if given
+    :param updates: the gradient updates of the model per step
+    :param noise: the exploration noise, none if None
+    :param checkpoints: saves the checkpoints of the run if given
+    :param meta: the metadata of the run saved with the checkpoints
+    :param history: the steps and rewards of the episodes completed before, when resuming
+    :param metrics: logs the episodes and the progress of the run if given
+    :param quiet: do not print the episodes
+    :param resumed: the states of the random generators of the resumed checkpoint
+    :return: the steps and rewards of every episode
+    """
+    env.rng = np.random.default_rng(seed)
+    if resumed:
+        set_random_state(resumed, noise=noise)
+
+    def rng_state():
+        return random_state(noise=noise)
+
+    steps_list, reward_values = map(list, history)
+    for i in range(len(reward_values), MAX_EPISODES):
         s = env.reset()
         ep_r = 0.0
+        episode = recorder.new_episode() if recorder else None
+        if noise:
+            noise.reset()
         for j in range(MAX_EP_STEPS):
-            a = rl_model.choose_action(s)
+            a = rl_model.choose_actions(s[None, :], noise)[0]
             s_, r, done = env.step(a)
             rl_model.store_transition(s, a, r, s_)
+            if recorder:
+                recorder.record(episode, s, a, r, s_, env.angles, env.goal)
 
             ep_r += r
             if rl_model.memory_full:
                 # start to learn once has fulfilled the memory
-                rl_model.learn()
+                loss = rl_model.learn(updates)
+                if metrics:
+                    metrics.learned(updates, loss)
+            if metrics:
+                metrics.step()
             s = s_
             if done or j == MAX_EP_STEPS - 1:
-                print(
-                    "Ep: %i | %s | ep_r: %.1f | step: %i"
-                    % (i, "---" if not done else "done", ep_r, j)
+                end_episode(
+                    steps_list,
+                    reward_values,
+                    ep_r,
+                    j,
+                    done,
+                    checkpoints,
+                    meta,
+                    metrics,
+                    quiet,
+                    rng_state,
                 )
-                reward_values.append(ep_r)
-                steps_list.append(j)
                 break
 
+    return steps_list, reward_values
+
+
+def train_vectorized(
+    venv: typing.Union[VectorArm, ParallelVectorArm],
+    recorder: TrajectoryRecorder = None,
+    updates: int = 1,
+    noise: ActionNoise = None,
+    checkpoints: CheckpointManager = None,
+    meta: dict = None,
+    history: typing.Tuple[list, list] = ([], []),
+    metrics: RunMetrics = None,
+    quiet: bool = False,
+    resumed: dict = None,
+):
+    """
+    Trains the model collecting experience from a batch of arms, the episodes of
+    every arm are counted together until MAX_EPISODES are completed.
+    :param venv: the batch of arms
+    :param recorder: records the transitions if given
+    :param updates: the gradient updates of the model per step
+    :param noise: the exploration noise of the batch, none if None
+    :param checkpoints: saves the checkpoints of the run if given
+    :param meta: the metadata of the run saved with the checkpoints
+    :param history: the steps and rewards of the episodes completed before, when resuming
+    :param metrics: logs the episodes and the progress of the run if given
+    :param quiet: do not print the episodes
+    :param resumed: the states of the random generators of the resumed checkpoint
+    :return: the steps and rewards of every episode
+    """
+    steps_list, reward_values = map(list, history)
+    ep_r = np.zeros(venv.n_envs)
+    ep_steps = np.zeros(venv.n_envs, dtype=np.int64)
+    if resumed:
+        set_random_state(resumed, venv, noise)
+
+    def rng_state():
+        return random_state(venv, noise)
+
+    s = venv.reset()
+    if recorder:
+        episodes = np.array([recorder.new_episode() for _ in range(venv.n_envs)])
+    while len(reward_values) < MAX_EPISODES:
+        a = rl_model.choose_actions(s, noise)
+        s_, r, done = venv.step(a)
+        rl_model.store_transitions(s, a, r, s_)
+        if recorder:
+            recorder.record_batch(episodes, s, a, r, s_, venv.angles, venv.goals)
+
+        ep_r += r
+        if rl_model.memory_full:
+            # start to learn once has fulfilled the memory
+            loss = rl_model.learn(updates)
+            if metrics:
+                metrics.learned(updates, loss)
+        if metrics:
+            metrics.step(venv.n_envs)
+        s = s_
+        finished = np.flatnonzero(done | (ep_steps == MAX_EP_STEPS - 1))
+        for k in finished:
+            end_episode(
+                steps_list,
+                reward_values,
+                ep_r[k],
+                ep_steps[k],
+                done[k],
+                checkpoints,
+                meta,
+                metrics,
+                quiet,
+                rng_state,
+            )
+        ep_steps += 1
+        if len(finished) > 0:
+            ep_r[finished] = 0.0
+            ep_steps[finished] = 0
+            s = venv.reset(finished)
+            if noise:
+                noise.reset(finished)
+            if recorder:
+                episodes[finished] = [recorder.new_episode() for _ in finished]
+
+    return steps_list[:MAX_EPISODES], reward_values[:MAX_EPISODES]
+
+
+def train_actor_learner(
+    n_actors: int,
+    n_envs: int = 1,
+    updates: int = 1,
+    noise: str = None,
+    noise_sigma: float = 0.1,
+    seed: int = None,
+    broadcast_every: int = BROADCAST_EVERY,
+    checkpoints: CheckpointManager = None,
+    meta: dict = None,
+    history: typing.Tuple[list, list] = ([], []),
+    metrics: RunMetrics = None,
+    quiet: bool = False,
+    profiler: TrainingProfiler = None,
+    resumed: dict = None,
+):
+    """
+    Trains the model while actor processes collect the experience, every actor steps its
+    own batch of arms with a numpy copy of the policy, and this process only learns and
+    broadcasts the new actor weights.
+    :param n_actors: the number of actor processes
+    :param n_envs: the number of arms stepped by every actor
+    :param updates: the gradient updates of the model per learner iteration
+    :param noise: the exploration noise of the actors, "gaussian", "ou" or None
+    :param noise_sigma: the scale of the exploration noise
+    :param seed: the root seed of the actors
+    :param broadcast_every: the learner iterations between two weight broadcasts
+    :param checkpoints: saves the checkpoints of the run if given
+    :param meta: the metadata of the run saved with the checkpoints
+    :param history: the steps and rewards of the episodes completed before, when resuming
+    :param metrics: logs the episodes and the progress of the run if given
+    :param quiet: do not print the episodes
+    :param resumed: the states of the random generators of the resumed checkpoint
+    :param profiler: measures the sampling of the shared memory if given
+    :return: the steps and rewards of every episode
+    """
+    steps_list, reward_values = map(list, history)
+    learned = 0
+    with ActorLearner(
+        env, rl_model, n_actors, n_envs, MAX_EP_STEPS, noise, noise_sigma, seed
+    ) as system:
+        if profiler:
+            profile_memory(profiler)
+        # the envs and the noise of the actors live in their processes, only the
+        # sampling of the shared memory continues its stream
+        if resumed:
+            rl_model.memory.rng.bit_generator.state = resumed["memory"]
+
+        def rng_state():
+            return {"memory": rl_model.memory.rng.bit_generator.state}
+
+        collected = rl_model.pointer
+        while len(reward_values) < MAX_EPISODES:
+            # the episodes completed past MAX_EPISODES are dropped
+            left = MAX_EPISODES - len(reward_values)
+            for ep_r, steps, done in system.episodes()[:left]:
+                end_episode(
+                    steps_list,
+                    reward_values,
+                    ep_r,
+                    steps,
+                    done,
+                    checkpoints,
+                    meta,
+                    metrics,
+                    quiet,
+                    rng_state,
+                )
+            if metrics:
+                # the steps of the actors are the transitions they added
+                metrics.step(rl_model.pointer - collected)
+                collected = rl_model.pointer
+            if rl_model.memory_full:
+                # start to learn once the actors have filled the memory
+                loss = rl_model.learn(updates)
+                if metrics:
+                    metrics.learned(updates, loss)
+                learned += 1
+                if learned % broadcast_every == 0:
+                    system.broadcast()
+            else:
+                time.sleep(0.01)
+
+    return steps_list, reward_values
+
+
+def save_training_results(steps_list: list, reward_values: list):
+    """
+    Saves the model parameters and the plot of the training stats.
+    :param steps_list: the number of steps of every episode
+    :param reward_values: the reward of every episode
+    :return:
+    """
+    from plot_utils import plot_episode_stats
+
     rl_model.save()
     plot_episode_stats(
         steps_list,
         reward_values,
         title=f"DDPG on Arm Environment: N-links {len(env.links)}, Env Size: {ENV_SIZE.width} * {ENV_SIZE.height}",
-        output_file=f"plots/n_links_{len(env.links)}_env_size_{ENV_SIZE.width}X{ENV_SIZE.height}.png"
+        output_file=f"plots/n_links_{len(env.links)}_env_size_{ENV_SIZE.width}X{ENV_SIZE.height}.png",
     )
 
 
+SWEEP_PARAMS = {
+    "lr_a": float,
+    "lr_c": float,
+    "gamma": float,
+    "tau": float,
+    "memory_capacity": int,
+    "batch_size": int,
+    "n_links": int,
+    "link_length": float,
+    "env_size": int,
+}
+SWEEP_RESULTS = ("final_reward", "success_rate", "steps_to_goal", "wall_time")
+
+
+def run_trial(trial: dict) -> dict:
+    """
+    Trains one configuration of a sweep, it runs in its own process so it can replace the
+    arm and the model of the module.
+    :param trial: the configuration under "config" (hyper parameters and geometry), the
+        options of the sweep and the tensorflow threads of the trial
+    :return: the mean reward and the success rate of the last tenth of the episodes,
+        the mean steps of their episodes that reached the goal and the wall time
+    """
+    global MAX_EPISODES, MAX_EP_STEPS
+    config = dict(trial["config"])
+    size = config.pop("env_size", None)
+    setup_env(
+        config.pop("n_links", N_LINKS),
+        config.pop("link_length", LINK_LENGTH),
+        ENV_SIZE if size is None else Size2D(size, size),
+    )
+    MAX_EPISODES, MAX_EP_STEPS = trial["episodes"], trial["max_ep_steps"]
+    n_envs, seeds = trial["n_envs"], spawn_seeds(trial["seed"])
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        setup_model(trial["backend"], threads=trial["threads"], **config)
+        env.goal_sampler = WorkspaceIndex.for_arm(env)
+        rl_model.memory.rng = np.random.default_rng(seeds["memory"])
+        noise = make_noise(
+            trial["noise"], n_envs, a_dim, trial["noise_sigma"], seeds["noise"]
+        )
+        steps_list, reward_values = train_vectorized(
+            VectorArm(env, n_envs, seed=seeds["env"]),
+            updates=trial["updates"],
+            noise=noise,
+        )
+    wall_time = time.perf_counter() - start
+
+    window = max(len(reward_values) // 10, 1)
+    steps = np.asarray(steps_list[-window:])
+    reached = steps < MAX_EP_STEPS - 1
+    return {
+        "final_reward": float(np.mean(reward_values[-window:])),
+        "success_rate": float(np.mean(reached)),
+        "steps_to_goal": float(np.mean(steps[reached])) if reached.any() else None,
+        "wall_time": wall_time,
+    }
+
+
 @app.command()
-def eval():
+def sweep(
+    param: typing.List[str] = typer.Option(
+        ...,
+        help=f"a searched parameter, one of {tuple(SWEEP_PARAMS)}, written "
+        "'name=v1,v2,...' for a grid or 'name=low:high' / 'name=log:low:high' for a "
+        "range sampled with --samples",
+    ),
+    samples: int = typer.Option(
+        0, help="number of random configurations, 0 to run the whole grid"
+    ),
+    episodes: int = typer.Option(MAX_EPISODES, help="episodes of every trial"),
+    max_ep_steps: int = typer.Option(MAX_EP_STEPS, help="steps of an episode"),
+    n_envs: int = typer.Option(1, help="number of arms stepped together in a trial"),
+    updates: int = typer.Option(1, help="gradient updates of the model per step"),
+    backend: str = typer.Option("v1", help="the model implementation, 'v1' or 'tf2'"),
+    noise: str = typer.Option(
+        None, help="exploration noise added to the actions, 'gaussian' or 'ou'"
+    ),
+    noise_sigma: float = typer.Option(0.1, help="scale of the exploration noise"),
+    seed: int = typer.Option(None, help="seed of the random search and the trials"),
+    workers: int = typer.Option(
+        0, help="number of trials run at once, 0 for the number of cores"
+    ),
+    results: str = typer.Option(
+        "sweeps/results.csv", help="csv file of the results table"
+    ),
+):
+    """This function runs a hyper parameter sweep, every trial in its own process"""
+    if backend not in BACKENDS:
+        raise typer.BadParameter(f"The backend must be one of {BACKENDS}")
+    try:
+        space = parse_space(param, SWEEP_PARAMS)
+        if samples > 0:
+            configs = random_configs(space, samples, seed)
+        else:
+            configs = grid_configs(space)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    # the trials of a geometry share its cached workspace index, built once here
+    geometries = {
+        (
+            config.get("n_links", N_LINKS),
+            config.get("link_length", LINK_LENGTH),
+            config.get("env_size"),
+        )
+        for config in configs
+    }
+    for n_links, link_length, size in geometries:
+        env_size = ENV_SIZE if size is None else Size2D(size, size)
+        WorkspaceIndex.for_arm(make_arm(n_links, link_length, env_size, colored=False))
+    options = dict(
+        episodes=episodes,
+        max_ep_steps=max_ep_steps,
+        n_envs=n_envs,
+        updates=updates,
+        backend=backend,
+        noise=noise,
+        noise_sigma=noise_sigma,
+        seed=seed,
+    )
+    rows = run_sweep(
+        run_trial, configs, options, workers or None, results, SWEEP_RESULTS
+    )
+    rows.sort(key=lambda row: -row.get("final_reward", -np.inf))
+    print(format_table(rows, ["trial"] + list(space) + list(SWEEP_RESULTS)))
+    print(f"Results saved to {results}")
+
+
+@app.command()
+def eval(
+    backend: str = typer.Option("v1", help="the model implementation, 'v1' or 'tf2'"),
+    policy: str = typer.Option(
+        None, help="exported actor (.npz) evaluated with numpy instead of the model"
+    ),
+):
     """This function performs the evaluation of the model"""
 
-    rl_model.restore()
+    setup_env()
+    model = load_policy(backend, policy)
     s = env.reset()
     tolerance_counter = 0
     tolerance = 0.001
     prevr = 0
 
     while True:
-        a = rl_model.choose_action(s)
+        a = model.choose_action(s)
         s, r, done = env.step(a)
 
         if abs(r - prevr) < tolerance:
@@ -101,35 +1005,208 @@ def eval():
             break
 
 
+EVALUATION_COLUMNS = (
+    "name",
+    "success_rate",
+    "steps_mean",
+    "steps_p90",
+    "distance_mean",
+    "distance_p90",
+    "latency_us_mean",
+)
+
+
+def evaluated_policies(
+    backend: str, policy: str, checkpoint: typing.List[str]
+) -> typing.Iterator[typing.Tuple[str, object, dict]]:
+    """
+    Loads the policies of the evaluate command one after the other.
+    :param backend: the model implementation
+    :param policy: the .npz file of an exported actor
+    :param checkpoint: folders of checkpoints, restored in the same model
+    :return: the name, the policy and the description of every policy
+    """
+    if policy:
+        name = os.path.splitext(os.path.basename(policy))[0]
+        yield name, NumpyPolicy.load(policy), {"policy": policy}
+    if checkpoint:
+        setup_model(backend)
+        geometry = run_metadata(backend)["geometry"]
+        for path in checkpoint:
+            model_state, _, saved_meta = CheckpointManager.load(path)
+            for key, value in (("backend", backend), ("geometry", geometry)):
+                if saved_meta[key] != value:
+                    raise typer.BadParameter(
+                        f"The {key} of the checkpoint {path} is different"
+                    )
+            rl_model.set_state(model_state)
+            name = os.path.basename(os.path.normpath(path))
+            source = {"checkpoint": path, "episode": saved_meta["episode"]}
+            yield name, rl_model, source
+    if not policy and not checkpoint:
+        yield f"params_{backend}", load_policy(backend), {"params": backend}
+
+
 @app.command()
-def render():
+def evaluate(
+    backend: str = typer.Option("v1", help="the model implementation, 'v1' or 'tf2'"),
+    policy: str = typer.Option(
+        None, help="exported actor (.npz) evaluated with numpy instead of the model"
+    ),
+    checkpoint: typing.List[str] = typer.Option(
+        None, help="folder of a checkpoint evaluated, can be repeated"
+    ),
+    spacing: float = typer.Option(
+        20.0, help="distance between the goals of the grid over the reachable workspace"
+    ),
+    goals: str = typer.Option(
+        None, help="goal bank (.npy) evaluated instead of the grid"
+    ),
+    batch_size: int = typer.Option(256, help="number of goals evaluated at once"),
+    max_ep_steps: int = typer.Option(
+        MAX_EP_STEPS, help="steps before a goal is failed"
+    ),
+    seed: int = typer.Option(0, help="seed of the start angles of the arm"),
+    output: str = typer.Option(
+        "evaluations", help="folder of the json results, one file per policy"
+    ),
+):
+    """This function evaluates policies on a fixed set of goals and ranks them"""
+    if backend not in BACKENDS:
+        raise typer.BadParameter(f"The backend must be one of {BACKENDS}")
+    setup_env()
+    try:
+        if goals:
+            bank = GoalBank.load(goals).goals
+        else:
+            bank = goal_grid(WorkspaceIndex.for_arm(env), spacing)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    venv = VectorArm(env, min(batch_size, len(bank)))
+    meta = dict(
+        run_metadata(backend),
+        goals={"bank": goals} if goals else {"spacing": spacing},
+        seed=seed,
+        max_ep_steps=max_ep_steps,
+    )
+    del meta["seeds"], meta["params"], meta["max_episodes"]
+    print(f"Evaluating on {len(bank)} goals")
+    for name, model, source in evaluated_policies(backend, policy, checkpoint):
+        results = evaluate_policy(venv, model, bank, max_ep_steps, seed)
+        summary = summarize(results)
+        path = os.path.join(output, f"{name}.json")
+        save_evaluation(path, summary, results, bank, dict(meta, name=name, **source))
+        print(f"{name}: success rate {summary['success_rate']:.1%}, saved to {path}")
+
+    # the evaluations of the folder on the same goals, geometry and start angles
+    rows = []
+    for file in sorted(os.listdir(output)):
+        if not file.endswith(".json"):
+            continue
+        saved = load_evaluation(os.path.join(output, file))
+        if all(
+            saved["meta"].get(key) == value
+            for key, value in (
+                ("goals_hash", goals_hash(bank)),
+                ("geometry", meta["geometry"]),
+                ("seed", seed),
+                ("max_ep_steps", max_ep_steps),
+            )
+        ):
+            rows.append(dict(saved["summary"], name=saved["meta"]["name"]))
+    rows.sort(key=rank_key)
+    print(format_table(rows, list(EVALUATION_COLUMNS)))
+
+
+@app.command()
+def render(
+    ik: str = typer.Option(
+        None,
+        help="use the inverse kinematics solver to 'replace' or 'refine' the model",
+    ),
+    workspace: bool = typer.Option(
+        False, help="reject the targets out of the reachable workspace of the arm"
+    ),
+    backend: str = typer.Option("v1", help="the model implementation, 'v1' or 'tf2'"),
+    policy: str = typer.Option(
+        None, help="exported actor (.npz) evaluated with numpy instead of the model"
+    ),
+):
     """
     Renders the environment using the pyglet based viewer.
     """
+    import pyglet
+    from arm_env import ArmSimViewer
+
+    setup_env(colored=True)
+    model = load_policy(backend, policy)
+    index = WorkspaceIndex.for_arm(env) if workspace else None
+    ArmSimViewer(env, model, ENV_SIZE, ik=ik, workspace=index)
+    pyglet.app.run()
+
+
+@app.command()
+def export(
+    backend: str = typer.Option("v1", help="the model implementation, 'v1' or 'tf2'"),
+    path: str = typer.Option(ACTOR_PATH, help="the .npz file of the actor"),
+):
+    """
+    Exports the actor of the trained model for the numpy policy.
+    """
+    setup_env()
+    setup_model(backend)
     rl_model.restore()
-    ArmSimViewer(env, rl_model, ENV_SIZE)
+    rl_model.export_actor(path)
+    print(f"Actor exported to {path}")
+
+
+@app.command()
+def replay(
+    path: str = typer.Argument(..., help="folder of the recording"),
+    episode: int = typer.Option(0, help="the episode to replay"),
+    fps: float = typer.Option(30, help="steps played per second"),
+):
+    """
+    Replays a recorded episode in the pyglet based viewer.
+    """
+    import pyglet
+    from arm_env import ArmSimViewer
+
+    frames = TrajectoryReader(path).episode(episode)
+    if len(frames["angles"]) == 0:
+        raise typer.BadParameter(f"There is no episode {episode} in {path}")
+    setup_env(colored=True)
+    viewer = ArmSimViewer(env, None, ENV_SIZE)
+    viewer.play(frames["angles"], frames["goals"], fps)
     pyglet.app.run()
 
+
 @app.command()
-def sim():
+def sim(
+    ik: str = typer.Option(
+        None, help="move the arm to the target with the inverse kinematics ('replace')"
+    ),
+    workspace: bool = typer.Option(
+        False, help="reject the targets out of the reachable workspace of the arm"
+    ),
+):
+    import pyglet
+    from arm_env import ArmSimViewer
 
     ENV_SIZE = Size2D(600, 600)
-    ARM_ORIGIN = Point2D(ENV_SIZE.width / 2, 0)
     N_LINKS = 10
     LINK_LENGTH = 40
 
-    env = Arm(ARM_ORIGIN, env_size=ENV_SIZE, link_width=10)
-    colors_dict = ColorUtils.rainbow(n=N_LINKS)
-    R = colors_dict["r"]
-    G = colors_dict["g"]
-    B = colors_dict["b"]
-    rainbow_colors = list(zip(B, G, R))
-    for i in range(N_LINKS):
-        env.add_link(LINK_LENGTH, rainbow_colors[i])
-    env.set_angles(*len(env.links) * [0])
-
-    ArmSimViewer(arm=env, env_size=ENV_SIZE, model=None)
-    env.set_angles(90,45,45,180,90,180,45,45,180,90)
+    env = make_arm(N_LINKS, LINK_LENGTH, ENV_SIZE)
+
+    ArmSimViewer(
+        arm=env,
+        env_size=ENV_SIZE,
+        model=None,
+        ik=ik,
+        workspace=WorkspaceIndex.for_arm(env) if workspace else None,
+    )
+    env.set_angles(90, 45, 45, 180, 90, 180, 45, 45, 180, 90)
     pyglet.app.run()
 
 
@@ -1,34 +1,99 @@
 import math
 import typing
 
+import numpy as np
 
-class Point2D(object):
-    """2D point class"""
+__all__ = [
+    "Point2D",
+    "Size2D",
+    "Scalar",
+    "ArrayLike",
+    "split_xy",
+    "rad2deg",
+    "deg2rad",
+    "distance",
+    "angle_to",
+]
 
-    def __init__(self, x: typing.Union[int, float], y: typing.Union[int, float]):
-        self.x = x
-        self.y = y
+
+class Point2D(typing.NamedTuple):
+    """2D point class, immutable and without a per instance dict"""
+
+    x: typing.Union[int, float]
+    y: typing.Union[int, float]
 
     def __repr__(self):
         return f"({self.x}, {self.y})"
 
+    def __array__(self, dtype=None, copy=None):
+        if copy is False:
+            raise ValueError("A Point2D can not be viewed as an array without a copy.")
+        return np.array((self.x, self.y), dtype=dtype)
+
+    def to_array(self) -> np.ndarray:
+        """Returns the point as an array with shape (2,)."""
+        return np.array((self.x, self.y), dtype=np.float64)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "Point2D":
+        """Creates a point from an array with shape (2,)."""
+        return cls(float(array[0]), float(array[1]))
 
-class Size2D(object):
-    """2D size class"""
 
-    def __init__(self, width: int, height: int):
-        self.width = width
-        self.height = height
+class Size2D(typing.NamedTuple):
+    """2D size class, immutable and without a per instance dict"""
+
+    width: int
+    height: int
 
     def __repr__(self):
         return f"({self.width}, {self.height})"
 
+    def __array__(self, dtype=None, copy=None):
+        if copy is False:
+            raise ValueError("A Size2D can not be viewed as an array without a copy.")
+        return np.array((self.width, self.height), dtype=dtype)
+
+    def to_array(self) -> np.ndarray:
+        """Returns the size as an array with shape (2,)."""
+        return np.array((self.width, self.height), dtype=np.float64)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "Size2D":
+        """Creates a size from an array with shape (2,)."""
+        return cls(array[0].item(), array[1].item())
+
 
-def rad2deg(rad: typing.Union[int, float]) -> typing.Union[int, float]:
-    """Converts radians to degrees."""
+Scalar = typing.Union[int, float]
+ArrayLike = typing.Union[Scalar, typing.Sequence, np.ndarray]
+
+
+def split_xy(points: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Returns views over the x and y coordinates of an array of points with shape (..., 2)."""
+    return points[..., 0], points[..., 1]
+
+
+def rad2deg(rad: ArrayLike) -> ArrayLike:
+    """Converts radians to degrees, works on scalars and arrays."""
+    if isinstance(rad, (list, tuple)):
+        rad = np.asarray(rad, dtype=np.float64)
     return rad * 180 / math.pi
 
 
-def deg2rad(deg: typing.Union[int, float]) -> typing.Union[int, float]:
-    """Converts degrees to radians."""
+def deg2rad(deg: ArrayLike) -> ArrayLike:
+    """Converts degrees to radians, works on scalars and arrays."""
+    if isinstance(deg, (list, tuple)):
+        deg = np.asarray(deg, dtype=np.float64)
     return deg * math.pi / 180
+
+
+def distance(p: ArrayLike, q: ArrayLike) -> ArrayLike:
+    """Euclidean distance between points with shape (..., 2), broadcasting over the leading axes."""
+    d = np.asarray(q, dtype=np.float64) - np.asarray(p, dtype=np.float64)
+    return np.hypot(d[..., 0], d[..., 1])
+
+
+def angle_to(origin: ArrayLike, target: ArrayLike) -> ArrayLike:
+    """Angle of the vectors going from origin to target, points with shape (..., 2)."""
+    d = np.asarray(target, dtype=np.float64) - np.asarray(origin, dtype=np.float64)
+    return np.arctan2(d[..., 1], d[..., 0])
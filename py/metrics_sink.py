@@ -0,0 +1,249 @@
+import atexit
+import csv
+import io
+import json
+import os
+import queue
+import signal
+import threading
+import time
+import typing
+
+METRICS_FORMATS = ("jsonl", "csv")
+
+
+class MetricsSink(object):
+    """Streams metric records into rotating JSONL or CSV files, one series of files per
+    kind of record, e.g. metrics/episode.0000.jsonl. Logging a record only puts it in a
+    queue, a background thread writes the queued records in batches and flushes the files
+    so they can be followed with `tail -f`. The records are flushed on close, at exit and
+    when the process receives SIGTERM."""
+
+    def __init__(
+        self,
+        root: str,
+        fmt: str = "jsonl",
+        flush_every: float = 1.0,
+        rotate_bytes: int = 64 * 2**20,
+        handle_signals: bool = True,
+    ):
+        """
+        :param root: the folder of the files
+        :param fmt: "jsonl" or "csv", the columns of a csv file are the keys of its first
+            record
+        :param flush_every: the seconds between two writes of the queued records
+        :param rotate_bytes: the size after which a new file of the same kind is started
+        :param handle_signals: turn SIGTERM into a SystemExit so the run closes cleanly,
+            only possible on the main thread
+        """
+        if fmt not in METRICS_FORMATS:
+            raise ValueError(f"The metrics format must be one of {METRICS_FORMATS}")
+        self.root = root
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self.rotate_bytes = rotate_bytes
+        os.makedirs(root, exist_ok=True)
+        self._files: typing.Dict[str, typing.Tuple[typing.IO, typing.List[str]]] = {}
+        self._indices = self._existing_indices()
+        self._records = queue.SimpleQueue()
+        self._closed = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        self._previous_handler = None
+        if handle_signals and threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGTERM, self._terminate)
+
+    def _existing_indices(self) -> typing.Dict[str, int]:
+        """the next file index of every kind, a resumed run appends new files"""
+        indices = {}
+        for name in os.listdir(self.root):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[2] == self.fmt and parts[1].isdigit():
+                indices[parts[0]] = max(indices.get(parts[0], 0), int(parts[1]) + 1)
+        return indices
+
+    def _terminate(self, signum, frame):
+        raise SystemExit(128 + signum)
+
+    def log(self, kind: str, **values):
+        """
+        Queues a record, the time is added to it.
+        :param kind: the kind of the record, it names its files
+        :param values: the json serializable values of the record
+        :return:
+        """
+        values["time"] = time.time()
+        self._records.put((kind, values))
+
+    def _run(self):
+        while not self._closed.wait(self.flush_every):
+            self._write_queued()
+        self._write_queued()
+        for f, _ in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _write_queued(self):
+        batches: typing.Dict[str, typing.List[typing.Dict]] = {}
+        while True:
+            try:
+                kind, values = self._records.get_nowait()
+            except queue.Empty:
+                break
+            batches.setdefault(kind, []).append(values)
+        for kind, records in batches.items():
+            try:
+                self._write(kind, records)
+            except Exception as e:
+                self._error = e
+
+    def _open(self, kind: str, first: typing.Dict) -> typing.Tuple[typing.IO, list]:
+        index = self._indices.get(kind, 0)
+        self._indices[kind] = index + 1
+        path = os.path.join(self.root, f"{kind}.{index:04d}.{self.fmt}")
+        f = open(path, "w", newline="")
+        columns = list(first)
+        if self.fmt == "csv":
+            csv.writer(f).writerow(columns)
+        self._files[kind] = (f, columns)
+        return f, columns
+
+    def _write(self, kind: str, records: typing.List[typing.Dict]):
+        """writes a batch of records of a kind with a single write"""
+        f, columns = self._files.get(kind) or self._open(kind, records[0])
+        if f.tell() >= self.rotate_bytes:
+            f.close()
+            f, columns = self._open(kind, records[0])
+        if self.fmt == "jsonl":
+            text = "".join(json.dumps(values) + "\n" for values in records)
+        else:
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, columns, extrasaction="ignore")
+            writer.writerows(records)
+            text = buffer.getvalue()
+        f.write(text)
+        f.flush()
+
+    def close(self):
+        """
+        Writes the queued records and closes the files.
+        :return:
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        atexit.unregister(self.close)
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGTERM, self._previous_handler)
+            self._previous_handler = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing the metrics failed.") from error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RunMetrics(object):
+    """The metrics of a training run, an "episode" record for every completed episode and
+    a "progress" record every `every` env steps with the rates since the previous one: the
+    steps and updates per second, the share of the episodes that reached the goal and the
+    mean critic loss."""
+
+    def __init__(
+        self,
+        sink: MetricsSink,
+        every: int = 1000,
+        clock: typing.Callable[[], float] = time.perf_counter,
+    ):
+        """
+        :param sink: the sink of the records
+        :param every: the env steps between two progress records
+        :param clock: the clock of the rates
+        """
+        self.sink = sink
+        self.every = every
+        self.clock = clock
+        self.steps = self.updates = self.episodes = 0
+        self._last = clock()
+        self._last_steps = self._last_updates = 0
+        self._episodes = self._on_goal = 0
+        self._loss = 0.0
+        self._losses = 0
+
+    def episode(self, reward: float, steps: int, done: bool):
+        """
+        Logs a completed episode.
+        :param reward: the reward of the episode
+        :param steps: the steps of the episode
+        :param done: whether the goal was reached
+        :return:
+        """
+        self.sink.log(
+            "episode",
+            episode=self.episodes,
+            reward=float(reward),
+            steps=int(steps),
+            done=bool(done),
+        )
+        self.episodes += 1
+        self._episodes += 1
+        self._on_goal += bool(done)
+
+    def learned(self, n_updates: int, loss: float = None):
+        """
+        Counts the updates of a learn call.
+        :param n_updates: the number of updates
+        :param loss: the mean critic loss of the updates
+        :return:
+        """
+        self.updates += n_updates
+        if loss is not None:
+            self._loss += loss * n_updates
+            self._losses += n_updates
+
+    def step(self, n: int = 1):
+        """
+        Counts env steps and logs the progress when it is due.
+        :param n: the number of steps, e.g. the envs of a batch
+        :return:
+        """
+        self.steps += n
+        if self.steps - self._last_steps >= self.every:
+            self.progress()
+
+    def progress(self):
+        """
+        Logs the progress since the previous progress record.
+        :return:
+        """
+        now = self.clock()
+        interval = max(now - self._last, 1e-9)
+        self.sink.log(
+            "progress",
+            steps=self.steps,
+            updates=self.updates,
+            episodes=self.episodes,
+            steps_per_s=(self.steps - self._last_steps) / interval,
+            updates_per_s=(self.updates - self._last_updates) / interval,
+            on_goal_rate=self._on_goal / self._episodes if self._episodes else None,
+            loss=self._loss / self._losses if self._losses else None,
+        )
+        self._last, self._last_steps, self._last_updates = now, self.steps, self.updates
+        self._episodes = self._on_goal = self._losses = 0
+        self._loss = 0.0
+
+    def close(self):
+        """
+        Logs the last progress and closes the sink.
+        :return:
+        """
+        if self.steps > self._last_steps:
+            self.progress()
+        self.sink.close()
@@ -0,0 +1,90 @@
+import numpy as np
+
+ACTOR_PATH = "./actor.npz"
+
+
+def save_actor(
+    path: str,
+    w1: np.ndarray,
+    b1: np.ndarray,
+    w2: np.ndarray,
+    b2: np.ndarray,
+    a_bound: float,
+):
+    """
+    Writes the weights of the actor network into a .npz file.
+    :param path: the path of the file
+    :param w1: kernel of the hidden layer, shape (s_dim, n_hidden)
+    :param b1: bias of the hidden layer, shape (n_hidden,)
+    :param w2: kernel of the output layer, shape (n_hidden, a_dim)
+    :param b2: bias of the output layer, shape (a_dim,)
+    :param a_bound: the action bound
+    :return:
+    """
+    np.savez(
+        path,
+        w1=np.asarray(w1, dtype=np.float32),
+        b1=np.asarray(b1, dtype=np.float32),
+        w2=np.asarray(w2, dtype=np.float32),
+        b2=np.asarray(b2, dtype=np.float32),
+        a_bound=np.float32(a_bound),
+    )
+
+
+class NumpyPolicy(object):
+    """The actor of the DDPG model, a relu hidden layer and a tanh output scaled by the
+    action bound, evaluated with numpy only. It loads the weights exported by the models so
+    the viewer or a controller process can run the policy without tensorflow."""
+
+    def __init__(
+        self,
+        w1: np.ndarray,
+        b1: np.ndarray,
+        w2: np.ndarray,
+        b2: np.ndarray,
+        a_bound: float,
+    ):
+        """
+        :param w1: kernel of the hidden layer, shape (s_dim, n_hidden)
+        :param b1: bias of the hidden layer, shape (n_hidden,)
+        :param w2: kernel of the output layer, shape (n_hidden, a_dim)
+        :param b2: bias of the output layer, shape (a_dim,)
+        :param a_bound: the action bound
+        """
+        self.w1, self.b1, self.w2, self.b2 = w1, b1, w2, b2
+        self.a_bound = float(a_bound)
+        self.s_dim, self.a_dim = w1.shape[0], w2.shape[1]
+
+    @classmethod
+    def load(cls, path: str = ACTOR_PATH) -> "NumpyPolicy":
+        """
+        Loads the policy from a .npz file written by `save_actor`.
+        :param path: the path of the file
+        :return: the policy
+        """
+        with np.load(path) as data:
+            return cls(
+                data["w1"], data["b1"], data["w2"], data["b2"], float(data["a_bound"])
+            )
+
+    def choose_actions(self, s: np.ndarray, noise=None) -> np.ndarray:
+        """
+        Choose the actions of a batch of states.
+        :param s: states with shape (n, s_dim)
+        :param noise: exploration noise of the n envs, an ActionNoise, no noise if None
+        :return: the actions with shape (n, a_dim)
+        """
+        net = np.asarray(s, dtype=np.float32) @ self.w1
+        net += self.b1
+        np.maximum(net, 0, out=net)
+        a = net @ self.w2
+        a += self.b2
+        np.tanh(a, out=a)
+        a *= self.a_bound
+        if noise is None:
+            return a
+        return np.clip(a + noise(), -self.a_bound, self.a_bound)
+
+    def choose_action(self, s: np.ndarray) -> np.ndarray:
+        """Choose the action based on the state input"""
+        return self.choose_actions(np.asarray(s)[None, :])[0]
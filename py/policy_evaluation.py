@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import time
+import typing
+
+import numpy as np
+
+from arm_vec_env import VectorArm
+from arm_workspace import WorkspaceIndex
+from math_utils import distance
+
+PERCENTILES = (50, 90, 99)
+
+
+def goal_grid(workspace: WorkspaceIndex, spacing: float) -> np.ndarray:
+    """
+    Lays a regular grid of goals over the reachable workspace of the arm.
+    :param workspace: the reachable workspace of the arm
+    :param spacing: the distance between two neighbouring goals
+    :return: the goals with shape (n, 3), row by row from the bottom left corner
+    """
+    if spacing <= 0:
+        raise ValueError("The spacing of the goals must be positive.")
+    width, height = np.array(workspace.grid.shape) * workspace.cell_size
+    xs = np.arange(spacing / 2, width, spacing)
+    ys = np.arange(spacing / 2, height, spacing)
+    points = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+    points = points[workspace.is_reachable(points)]
+    if len(points) == 0:
+        raise ValueError(f"No goal of a grid spaced by {spacing} is reachable.")
+    goals = np.empty((len(points), 3))
+    goals[:, :2] = points
+    goals[:, 2] = workspace.goal_len
+    return goals
+
+
+def goals_hash(goals: np.ndarray) -> str:
+    """the hash of a set of goals, two evaluations are comparable when it is the same"""
+    return hashlib.sha1(np.ascontiguousarray(goals, dtype=np.float64)).hexdigest()
+
+
+def venv_distance(venv: VectorArm) -> np.ndarray:
+    """the distance of the end effector of every arm of the env to its goal"""
+    return distance(venv.endpoints[:, -1, :], venv.goals[:, :2])
+
+
+def evaluate_policy(
+    venv: VectorArm,
+    policy,
+    goals: np.ndarray,
+    max_steps: int,
+    seed: int = 0,
+) -> typing.Dict[str, np.ndarray]:
+    """
+    Runs a policy on the goals in batches of the size of the vectorized env. The start
+    angles of the arm are drawn once per goal from the seed, so the results only depend
+    on the goals and the seed, not on the size of the batches.
+    :param venv: the vectorized env, its goals and angles are set for every batch
+    :param policy: an object with a choose_actions method
+    :param goals: the goals with shape (n, 3)
+    :param max_steps: the steps after which a goal is failed
+    :param seed: the seed of the start angles
+    :return: by goal whether it was reached ("done"), the steps it took, -1 if it was
+        not reached, the final distance of the end effector to the goal and the latency
+        of the inference per goal in seconds
+    """
+    n = len(goals)
+    done = np.zeros(n, dtype=bool)
+    steps = np.full(n, -1, dtype=np.int64)
+    final_distance = np.zeros(n)
+    latency = np.zeros(n)
+    batch_size = venv.n_envs
+    rng = np.random.default_rng(seed)
+    lower, upper = venv.lower_limits, venv.upper_limits
+    angles = lower + rng.random((n, venv.angles.shape[1])) * (upper - lower)
+    for start in range(0, n, batch_size):
+        end = min(start + batch_size, n)
+        count = end - start
+        # the last batch is padded with its last goal, the padding is ignored
+        pad = np.full(batch_size - count, end - 1)
+        rows = np.concatenate((np.arange(start, end), pad))
+        s = venv.set_state(angles[rows], goals[rows])
+
+        finished = np.zeros(batch_size, dtype=bool)
+        batch_steps = np.full(batch_size, -1, dtype=np.int64)
+        batch_distance = np.zeros(batch_size)
+        seconds = 0.0
+        for step in range(1, max_steps + 1):
+            inference = time.perf_counter()
+            a = policy.choose_actions(s)
+            seconds += time.perf_counter() - inference
+            s, _, step_done = venv.step(a)
+            reached = step_done & ~finished
+            if reached.any():
+                batch_steps[reached] = step
+                batch_distance[reached] = venv_distance(venv)[reached]
+                finished |= reached
+                if finished[:count].all():
+                    break
+        batch_distance[~finished] = venv_distance(venv)[~finished]
+        done[start:end] = finished[:count]
+        steps[start:end] = batch_steps[:count]
+        final_distance[start:end] = batch_distance[:count]
+        latency[start:end] = seconds / step / batch_size
+    return {
+        "done": done,
+        "steps": steps,
+        "final_distance": final_distance,
+        "latency": latency,
+    }
+
+
+def summarize(results: typing.Dict[str, np.ndarray]) -> typing.Dict[str, float]:
+    """
+    Summarizes the results of an evaluation.
+    :param results: the results by goal of evaluate_policy
+    :return: the success rate, the mean and percentiles of the steps to the reached
+        goals, of the final distances and of the inference latency per goal
+    """
+    summary = {
+        "goals": int(len(results["done"])),
+        "success_rate": float(results["done"].mean()),
+    }
+    steps = results["steps"][results["done"]]
+    summary["steps_mean"] = float(steps.mean()) if len(steps) else None
+    for p in PERCENTILES:
+        summary[f"steps_p{p}"] = float(np.percentile(steps, p)) if len(steps) else None
+    summary["distance_mean"] = float(results["final_distance"].mean())
+    for p in PERCENTILES:
+        summary[f"distance_p{p}"] = float(np.percentile(results["final_distance"], p))
+    summary["latency_us_mean"] = float(1e6 * results["latency"].mean())
+    for p in PERCENTILES:
+        summary[f"latency_us_p{p}"] = float(1e6 * np.percentile(results["latency"], p))
+    return summary
+
+
+def rank_key(summary: typing.Dict[str, float]) -> typing.Tuple[float, float, float]:
+    """sort key of the summaries, the highest success rate first, then the fewest steps
+    and the smallest final distance"""
+    steps = summary["steps_mean"]
+    return (
+        -summary["success_rate"],
+        float("inf") if steps is None else steps,
+        summary["distance_mean"],
+    )
+
+
+def save_evaluation(
+    path: str,
+    summary: typing.Dict,
+    results: typing.Dict[str, np.ndarray],
+    goals: np.ndarray,
+    meta: typing.Dict = None,
+):
+    """
+    Saves an evaluation as json, the file is replaced once complete.
+    :param path: the path of the json file
+    :param summary: the summary of the results
+    :param results: the results by goal
+    :param goals: the evaluated goals
+    :param meta: what was evaluated and how, e.g. the policy, the geometry and the seed
+    :return:
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    report = {
+        "meta": dict(meta or {}, goals_hash=goals_hash(goals)),
+        "summary": summary,
+        "goals": goals.tolist(),
+        "results": {name: values.tolist() for name, values in results.items()},
+    }
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_evaluation(path: str) -> typing.Dict:
+    """
+    Loads an evaluation saved with save_evaluation.
+    :param path: the path of the json file
+    :return: the meta, the summary, the goals and the results by goal
+    """
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,463 @@
+import math
+import os
+import typing
+
+import numpy as np
+
+
+class ReplayBuffer(object):
+    """Ring buffer of transitions with one preallocated array per field. Transitions are
+    inserted in batches with slice copies and sampled batches are gathered into reusable
+    contiguous arrays, so neither side allocates per step."""
+
+    def __init__(
+        self,
+        capacity: int,
+        s_dim: int,
+        a_dim: int,
+        dtype=np.float32,
+        seed: int = None,
+    ):
+        """
+        :param capacity: the maximum number of transitions, the oldest ones are replaced
+        :param s_dim: state dimension
+        :param a_dim: action dimension
+        :param dtype: the type of the stored values
+        :param seed: the seed of the sampling
+        """
+        self.capacity = capacity
+        self.s_dim, self.a_dim = s_dim, a_dim
+        self.rng = np.random.default_rng(seed)
+        self._batch = None
+        self._allocate(dtype)
+
+    def _allocate(self, dtype):
+        """creates the storage arrays and the pointer"""
+        self.states = np.zeros((self.capacity, self.s_dim), dtype=dtype)
+        self.actions = np.zeros((self.capacity, self.a_dim), dtype=dtype)
+        self.rewards = np.zeros((self.capacity, 1), dtype=dtype)
+        self.next_states = np.zeros((self.capacity, self.s_dim), dtype=dtype)
+        self.pointer = 0  # total number of transitions inserted
+
+    def __len__(self):
+        return min(self.pointer, self.capacity)
+
+    @property
+    def full(self) -> bool:
+        """whether every slot of the buffer holds a transition"""
+        return self.pointer >= self.capacity
+
+    @property
+    def fields(self) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """the storage arrays in (s, a, r, s_) order"""
+        return self.states, self.actions, self.rewards, self.next_states
+
+    def add(self, s, a, r, s_) -> int:
+        """
+        Inserts a single transition.
+        :param s: state at time t
+        :param a: action at time t
+        :param r: reward at time t
+        :param s_: state at time t+1
+        :return: the slot the transition was written to
+        """
+        index = self.pointer % self.capacity
+        self.states[index] = s
+        self.actions[index] = a
+        self.rewards[index] = r
+        self.next_states[index] = s_
+        self.pointer += 1
+        return index
+
+    def add_batch(
+        self,
+        states: np.ndarray,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        next_states: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Inserts a batch of transitions, e.g. one step of a batch of envs. The batch is
+        written with at most two slice copies per field when it wraps around the end.
+        :param states: the states with shape (n, s_dim)
+        :param actions: the actions with shape (n, a_dim)
+        :param rewards: the rewards with shape (n,) or (n, 1)
+        :param next_states: the next states with shape (n, s_dim)
+        :return: the slots the transitions were written to
+        """
+        n = len(states)
+        batch = (states, actions, np.reshape(rewards, (n, 1)), next_states)
+        if n > self.capacity:
+            # only the latest transitions would survive anyway
+            batch = tuple(values[-self.capacity :] for values in batch)
+            self.pointer += n - self.capacity
+            n = self.capacity
+        start = self.pointer % self.capacity
+        head = min(n, self.capacity - start)
+        for array, values in zip(self.fields, batch):
+            array[start : start + head] = values[:head]
+            array[: n - head] = values[head:]
+        self.pointer += n
+        return (start + np.arange(n)) % self.capacity
+
+    def flush(self):
+        """
+        Writes the buffer to the disk, nothing to do for a buffer in RAM.
+        :return:
+        """
+
+    def state_dict(self) -> typing.Dict[str, np.ndarray]:
+        """
+        Returns a copy of the contents of the buffer, e.g. to checkpoint it.
+        :return: a dict name -> array
+        """
+        n = len(self)
+        return {
+            "states": self.states[:n].copy(),
+            "actions": self.actions[:n].copy(),
+            "rewards": self.rewards[:n].copy(),
+            "next_states": self.next_states[:n].copy(),
+            "pointer": np.int64(self.pointer),
+        }
+
+    def load_state_dict(self, state: typing.Dict[str, np.ndarray]):
+        """
+        Restores the contents returned by `state_dict`.
+        :param state: a dict name -> array
+        :return:
+        """
+        n = len(state["rewards"])
+        if n > self.capacity:
+            raise ValueError(
+                f"The state holds {n} transitions, the capacity is {self.capacity}."
+            )
+        for array, name in zip(
+            self.fields, ("states", "actions", "rewards", "next_states")
+        ):
+            array[:n] = state[name]
+        self.pointer = int(state["pointer"])
+
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        """
+        Draws the slots of a batch uniformly among the stored transitions.
+        :param batch_size: the size of the batch
+        :return: the slots
+        """
+        return self.rng.integers(0, len(self), size=batch_size)
+
+    def gather(
+        self, indices: np.ndarray
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gathers the transitions of the given slots into contiguous arrays, the arrays are
+        reused by the next call with the same batch size.
+        :param indices: the slots
+        :return: the (s, a, r, s_) arrays of the batch
+        """
+        n = len(indices)
+        if self._batch is None or len(self._batch[0]) != n:
+            self._batch = tuple(
+                np.empty((n,) + array.shape[1:], dtype=array.dtype)
+                for array in self.fields
+            )
+        for array, out in zip(self.fields, self._batch):
+            np.take(array, indices, axis=0, out=out)
+        return self._batch
+
+    def sample(
+        self, batch_size: int
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Samples a batch of transitions uniformly.
+        :param batch_size: the size of the batch
+        :return: the (s, a, r, s_) arrays of the batch
+        """
+        return self.gather(self.sample_indices(batch_size))
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    """Replay buffer stored in `.npy` files opened as memory maps, one file per field plus a
+    small header with the shape of the buffer and the pointer. The contents survive the
+    process and are paged in by the OS on demand, so the capacity is bounded by the disk
+    instead of the RAM, and another process can reopen the buffer, e.g. read only, without
+    loading it. The pointer lives in the header, so it is written after the transitions.
+    """
+
+    HEADER_FILE = "header.npy"
+    HEADER_FIELDS = ("version", "capacity", "s_dim", "a_dim", "pointer")
+    VERSION = 1
+
+    def __init__(
+        self,
+        capacity: int,
+        s_dim: int,
+        a_dim: int,
+        root: str,
+        readonly: bool = False,
+        dtype=np.float32,
+        seed: int = None,
+    ):
+        """
+        :param capacity: the maximum number of transitions, the oldest ones are replaced
+        :param s_dim: state dimension
+        :param a_dim: action dimension
+        :param root: the folder of the files, an existing buffer in it is reopened
+        :param readonly: open an existing buffer without write access
+        :param dtype: the type of the stored values
+        :param seed: the seed of the sampling
+        """
+        self.root = root
+        self.readonly = readonly
+        super().__init__(capacity, s_dim, a_dim, dtype, seed)
+
+    def _open(self, name: str, shape: typing.Tuple, dtype) -> np.memmap:
+        """opens the file of a field, creating it when it does not exist"""
+        path = os.path.join(self.root, f"{name}.npy")
+        if os.path.exists(path):
+            array = np.load(path, mmap_mode="r" if self.readonly else "r+")
+            if array.shape != shape or array.dtype != np.dtype(dtype):
+                raise ValueError(
+                    f"{path} holds {array.dtype}{array.shape}, expected "
+                    f"{np.dtype(dtype)}{shape}."
+                )
+            return array
+        if self.readonly:
+            raise FileNotFoundError(f"There is no replay buffer in {self.root}.")
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    def _allocate(self, dtype):
+        if not self.readonly:
+            os.makedirs(self.root, exist_ok=True)
+        exists = os.path.exists(os.path.join(self.root, self.HEADER_FILE))
+        self._header = self._open("header", (len(self.HEADER_FIELDS),), np.int64)
+        expected = (self.VERSION, self.capacity, self.s_dim, self.a_dim)
+        if not exists:
+            self._header[:4] = expected
+        elif tuple(self._header[:4]) != expected:
+            raise ValueError(
+                f"The replay buffer in {self.root} has the header "
+                f"{dict(zip(self.HEADER_FIELDS, self._header[:4].tolist()))}."
+            )
+        self.states = self._open("states", (self.capacity, self.s_dim), dtype)
+        self.actions = self._open("actions", (self.capacity, self.a_dim), dtype)
+        self.rewards = self._open("rewards", (self.capacity, 1), dtype)
+        self.next_states = self._open("next_states", (self.capacity, self.s_dim), dtype)
+
+    @property
+    def pointer(self) -> int:
+        """total number of transitions inserted, read from the header"""
+        return int(self._header[4])
+
+    @pointer.setter
+    def pointer(self, value: int):
+        self._header[4] = value
+
+    def flush(self):
+        """
+        Writes the changes of the memory maps to the disk.
+        :return:
+        """
+        if self.readonly:
+            return
+        for array in self.fields:
+            array.flush()
+        self._header.flush()
+
+    def state_dict(self) -> typing.Dict[str, np.ndarray]:
+        """
+        The contents already live in the files, only the pointer is returned, so it can
+        not restore the memory of an older point of the run.
+        :return: a dict name -> array
+        """
+        self.flush()
+        return {"pointer": np.int64(self.pointer)}
+
+    def load_state_dict(self, state: typing.Dict[str, np.ndarray]):
+        if "rewards" in state:
+            super().load_state_dict(state)
+        else:
+            self.pointer = int(state["pointer"])
+
+
+class SumTree(object):
+    """Binary tree of sums stored in a flat array, node k has the children 2k and 2k + 1 and
+    the leaves start at `n_leaves`. Updates and prefix sum searches walk the tree level by
+    level for the whole batch at once, so both are O(batch * log n)."""
+
+    def __init__(self, capacity: int):
+        """
+        :param capacity: the number of leaves in use
+        """
+        self.capacity = capacity
+        self.depth = max(math.ceil(math.log2(capacity)), 1)
+        self.n_leaves = 1 << self.depth
+        self.nodes = np.zeros(2 * self.n_leaves)
+
+    @property
+    def total(self) -> float:
+        """the sum of every leaf"""
+        return self.nodes[1]
+
+    def __getitem__(self, indices) -> np.ndarray:
+        return self.nodes[np.asarray(indices) + self.n_leaves]
+
+    def update(self, indices: np.ndarray, values: np.ndarray):
+        """
+        Sets the value of some leaves and refreshes the sums above them.
+        :param indices: the leaves, when repeated the last value is kept
+        :param values: the new values
+        :return:
+        """
+        nodes = np.asarray(indices, dtype=np.int64) + self.n_leaves
+        self.nodes[nodes] = values
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """
+        Finds the leaves where the given prefix sums fall.
+        :param values: prefix sums in [0, total)
+        :return: the leaves
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            # rounding can push a value past the last leaf with some mass, never go
+            # into an empty subtree
+            right = (values >= self.nodes[left]) & (self.nodes[left + 1] > 0)
+            values -= self.nodes[left] * right
+            nodes = left + right
+        return nodes - self.n_leaves
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Replay buffer that samples the transitions proportionally to their priority, the
+    absolute td error of their last update, see Schaul et al. "Prioritized Experience
+    Replay". New transitions get the highest priority seen so they are replayed at least once.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        s_dim: int,
+        a_dim: int,
+        alpha: float = 0.6,
+        beta: float = 0.4,
+        beta_steps: int = 100_000,
+        epsilon: float = 1e-6,
+        dtype=np.float32,
+        seed: int = None,
+    ):
+        """
+        :param capacity: the maximum number of transitions, the oldest ones are replaced
+        :param s_dim: state dimension
+        :param a_dim: action dimension
+        :param alpha: how much the priorities are used, 0 is uniform sampling
+        :param beta: the initial exponent of the importance sampling weights
+        :param beta_steps: the number of sampled batches until beta reaches 1
+        :param epsilon: added to the priorities so every transition can be replayed
+        :param dtype: the type of the stored values
+        :param seed: the seed of the sampling
+        """
+        super().__init__(capacity, s_dim, a_dim, dtype, seed)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = (1.0 - beta) / max(beta_steps, 1)
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def add(self, s, a, r, s_) -> int:
+        index = super().add(s, a, r, s_)
+        self.tree.update([index], [self.max_priority**self.alpha])
+        return index
+
+    def add_batch(
+        self,
+        states: np.ndarray,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        next_states: np.ndarray,
+    ) -> np.ndarray:
+        indices = super().add_batch(states, actions, rewards, next_states)
+        self.tree.update(indices, np.full(len(indices), self.max_priority**self.alpha))
+        return indices
+
+    def state_dict(self) -> typing.Dict[str, np.ndarray]:
+        state = super().state_dict()
+        state["priorities"] = self.tree[np.arange(len(self))]
+        state["max_priority"] = np.float64(self.max_priority)
+        state["beta"] = np.float64(self.beta)
+        return state
+
+    def load_state_dict(self, state: typing.Dict[str, np.ndarray]):
+        super().load_state_dict(state)
+        if "priorities" not in state:
+            # saved from a uniform buffer, every transition gets the same priority
+            self.tree.update(np.arange(len(self)), np.ones(len(self)))
+            return
+        self.tree.update(np.arange(len(self)), state["priorities"])
+        self.max_priority = float(state["max_priority"])
+        self.beta = float(state["beta"])
+
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        """
+        Draws the slots of a batch proportionally to their priority, one slot from every
+        of the batch_size equal ranges of the total priority.
+        :param batch_size: the size of the batch
+        :return: the slots
+        """
+        segment = self.tree.total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        return np.minimum(self.tree.find(values), len(self) - 1)
+
+    def weights(self, indices: np.ndarray, n_batches: int = 1) -> np.ndarray:
+        """
+        Computes the importance sampling weights of sampled batches, normalized by their
+        maximum, and anneals beta towards 1 by one step per batch.
+        :param indices: the slots of the batches
+        :param n_batches: the number of batches the slots were sampled for
+        :return: the weights with shape (len(indices),)
+        """
+        probabilities = self.tree[indices] / self.tree.total
+        weights = (len(self) * probabilities) ** -self.beta
+        self.beta = min(self.beta + self.beta_increment * n_batches, 1.0)
+        return (weights / weights.max()).astype(self.rewards.dtype)
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray):
+        """
+        Sets the priorities of the transitions after an update.
+        :param indices: the slots of the batch
+        :param td_errors: the td errors of the batch
+        :return:
+        """
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities**self.alpha)
+
+
+def make_replay_buffer(
+    capacity: int,
+    s_dim: int,
+    a_dim: int,
+    prioritized: bool = False,
+    path: str = None,
+) -> ReplayBuffer:
+    """
+    Creates the replay memory of a model.
+    :param capacity: the maximum number of transitions
+    :param s_dim: state dimension
+    :param a_dim: action dimension
+    :param prioritized: sample the transitions proportionally to their td errors
+    :param path: the folder of a disk backed buffer, the buffer is in RAM if None
+    :return: the replay buffer
+    """
+    if prioritized and path:
+        raise ValueError("The prioritized replay buffer can not be disk backed.")
+    if prioritized:
+        return PrioritizedReplayBuffer(capacity, s_dim, a_dim)
+    if path:
+        return MemmapReplayBuffer(capacity, s_dim, a_dim, path)
+    return ReplayBuffer(capacity, s_dim, a_dim)
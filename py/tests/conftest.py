@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# the modules of the project are imported from the py folder, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arm_core import Arm  # noqa: E402
+from math_utils import Point2D, Size2D  # noqa: E402
+
+ENV_SIZE = Size2D(300, 300)
+
+
+@pytest.fixture
+def make_arm():
+    """creates arms at the bottom center of the environment, their links keep the reach
+    of the default two links of 100 whatever their number"""
+
+    def make(n_links: int = 2, seed: int = 0) -> Arm:
+        arm = Arm(Point2D(ENV_SIZE.width / 2, 0), env_size=ENV_SIZE, seed=seed)
+        for _ in range(n_links):
+            arm.add_link(200 / n_links)
+        arm.set_angles(*n_links * [0])
+        return arm
+
+    return make
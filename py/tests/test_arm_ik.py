@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from arm_ik import ArmIKSolver, solve_damped_least_squares, solve_two_link
+from arm_kinematics import forward_kinematics
+
+
+def reachable_targets(arm, n: int, seed: int = 0) -> np.ndarray:
+    """the endpoints of random configurations within the joint limits"""
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(arm.lower_limits, arm.upper_limits, (n, len(arm.links)))
+    return forward_kinematics(arm.origin.to_array(), angles, arm.lengths)[2][:, -1]
+
+
+def assert_solutions(arm, angles, reached, targets, tolerance):
+    assert np.all(angles >= arm.lower_limits - 1e-9)
+    assert np.all(angles <= arm.upper_limits + 1e-9)
+    endpoints = forward_kinematics(arm.origin.to_array(), angles, arm.lengths)[2][:, -1]
+    errors = np.linalg.norm(endpoints - targets, axis=-1)
+    assert np.all(errors[reached] <= tolerance)
+
+
+def test_two_link_closed_form(make_arm):
+    arm = make_arm(2)
+    targets = reachable_targets(arm, 50)
+    angles, reached = solve_two_link(
+        arm.origin.to_array(), arm.lengths, targets, arm.lower_limits, arm.upper_limits
+    )
+    assert reached.all()
+    assert_solutions(arm, angles, reached, targets, 1e-6)
+
+
+@pytest.mark.parametrize("n_links", [3, 5, 10])
+def test_damped_least_squares(make_arm, n_links):
+    arm = make_arm(n_links)
+    targets = reachable_targets(arm, 50)
+    angles, reached = solve_damped_least_squares(
+        arm.origin.to_array(),
+        arm.lengths,
+        targets,
+        arm.lower_limits,
+        arm.upper_limits,
+        max_iters=200,
+    )
+    assert reached.mean() > 0.5
+    assert_solutions(arm, angles, reached, targets, 0.5)
+
+
+@pytest.mark.parametrize("n_links", [2, 5])
+def test_solver_reaches_the_reachable_targets(make_arm, n_links):
+    arm = make_arm(n_links)
+    targets = reachable_targets(arm, 50, seed=1)
+    angles, reached = ArmIKSolver(arm).solve(targets)
+    # the numerical solver can get stuck on a few targets despite the restarts
+    assert reached.mean() >= (1.0 if n_links == 2 else 0.9)
+    assert_solutions(arm, angles, reached, targets, 0.5)
+
+
+@pytest.mark.parametrize("n_links", [2, 5])
+def test_solver_misses_the_targets_out_of_reach(make_arm, n_links):
+    arm = make_arm(n_links)
+    # the links are 200 long in total
+    targets = np.array([[150.0, 250.0], [400.0, 0.0]])
+    angles, reached = ArmIKSolver(arm, restarts=1).solve(targets)
+    assert not reached.any()
+    assert angles.shape == (2, n_links)
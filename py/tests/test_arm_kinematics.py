@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+import pytest
+
+from arm_kinematics import forward_kinematics, update_forward_kinematics
+
+
+def full_pose(arm):
+    """the pose of the arm computed from scratch"""
+    return forward_kinematics(arm.origin.to_array(), arm.angles, arm.lengths)
+
+
+def assert_pose(arm):
+    gangles, origins, endpoints = full_pose(arm)
+    np.testing.assert_allclose(arm.global_angles, gangles, atol=1e-9)
+    np.testing.assert_allclose(arm.origins, origins, atol=1e-9)
+    np.testing.assert_allclose(arm.endpoints, endpoints, atol=1e-9)
+
+
+def test_forward_kinematics_of_two_links():
+    # the first link points up, the second one is offset by -pi/2 and points right
+    gangles, origins, endpoints = forward_kinematics(
+        np.array([0.0, 0.0]), np.array([math.pi / 2, math.pi / 2]), np.array([1.0, 2.0])
+    )
+    np.testing.assert_allclose(gangles, [math.pi / 2, math.pi / 2])
+    np.testing.assert_allclose(origins, [[0, 0], [0, 1]], atol=1e-12)
+    np.testing.assert_allclose(endpoints, [[0, 1], [0, 3]], atol=1e-12)
+
+
+def test_forward_kinematics_of_a_batch():
+    rng = np.random.default_rng(0)
+    angles = rng.uniform(0, math.pi, (4, 3))
+    lengths = np.array([1.0, 2.0, 3.0])
+    batch = forward_kinematics(np.zeros(2), angles, lengths)
+    for i in range(len(angles)):
+        for batched, single in zip(
+            batch, forward_kinematics(np.zeros(2), angles[i], lengths)
+        ):
+            np.testing.assert_allclose(batched[i], single)
+
+
+@pytest.mark.parametrize("start", [0, 1, 3, 4])
+def test_update_matches_full(start):
+    rng = np.random.default_rng(start)
+    base, lengths = np.array([150.0, 0.0]), rng.uniform(10, 50, 5)
+    angles = rng.uniform(0, math.pi, 5)
+    gangles, origins, endpoints = forward_kinematics(base, angles, lengths)
+    angles[start:] = rng.uniform(0, math.pi, 5 - start)
+    update_forward_kinematics(base, angles, lengths, gangles, origins, endpoints, start)
+    for updated, full in zip(
+        (gangles, origins, endpoints), forward_kinematics(base, angles, lengths)
+    ):
+        np.testing.assert_allclose(updated, full, atol=1e-9)
+
+
+@pytest.mark.parametrize("n_links", [2, 3, 10])
+def test_incremental_steps_match_full(make_arm, n_links):
+    arm = make_arm(n_links)
+    arm.reset()
+    rng = np.random.default_rng(n_links)
+    for _ in range(200):
+        # some joints stay still so the steps invalidate from a later joint
+        arm.step(rng.uniform(-2, 2, n_links) * rng.integers(0, 2, n_links))
+        assert_pose(arm)
+
+
+def test_set_link_angle_invalidates_its_descendants(make_arm):
+    arm = make_arm(5)
+    arm.reset()
+    assert_pose(arm)
+    arm.set_link_angle(3, 0.5)
+    assert arm.dirty_from == 3
+    assert_pose(arm)
+
+
+def test_pinned_joints_are_not_recomputed(make_arm):
+    arm = make_arm(3)
+    arm.angles = arm.upper_limits
+    assert_pose(arm)
+    arm.step(np.ones(3))
+    assert arm.dirty_from == len(arm.links)
+    assert_pose(arm)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from arm_parallel_env import ParallelVectorArm
+from arm_vec_env import VectorArm
+
+N_ENVS = 5
+
+
+@pytest.fixture
+def envs(make_arm):
+    """a parallel batch of arms and the inline batch with the same seed"""
+    arm = make_arm(3)
+    with ParallelVectorArm(arm, N_ENVS, n_workers=2, seed=7) as parallel:
+        yield parallel, VectorArm(arm, N_ENVS, seed=7)
+
+
+def test_step_matches_vector_arm(envs):
+    parallel, venv = envs
+    np.testing.assert_allclose(parallel.reset(), venv.reset())
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        actions = rng.uniform(-1, 1, (N_ENVS, 3))
+        for ours, theirs in zip(parallel.step(actions), venv.step(actions)):
+            np.testing.assert_allclose(ours, theirs)
+    np.testing.assert_allclose(parallel.angles, venv.angles)
+    np.testing.assert_allclose(parallel.goals, venv.goals)
+
+
+def test_partial_reset_matches_vector_arm(envs):
+    parallel, venv = envs
+    parallel.reset()
+    venv.reset()
+    # one env of every shard
+    np.testing.assert_allclose(parallel.reset([1, 4]), venv.reset([1, 4]))
+    np.testing.assert_allclose(parallel.goals, venv.goals)
+
+
+def test_step_async_collects_every_shard(envs):
+    parallel, venv = envs
+    parallel.reset()
+    venv.reset()
+    actions = np.full((N_ENVS, 3), 0.5)
+    parallel.step_async(actions)
+    indices, s, r, done, ready = parallel.step_wait()
+    assert ready == [0, 1]
+    np.testing.assert_array_equal(indices, np.arange(N_ENVS))
+    s_, r_, done_ = venv.step(actions)
+    np.testing.assert_allclose(s, s_)
+    np.testing.assert_allclose(r, r_)
+    np.testing.assert_array_equal(done, done_)
+
+
+def test_rng_states_round_trip(envs):
+    parallel, _ = envs
+    states = parallel.rng_states()
+    first = parallel.reset()
+    parallel.set_rng_states(states)
+    np.testing.assert_allclose(parallel.reset(), first)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from arm_vec_env import VectorArm
+
+
+@pytest.mark.parametrize("n_links", [2, 5])
+def test_reset_matches_arm(make_arm, n_links):
+    arms = [make_arm(n_links, seed=seed) for seed in range(3)]
+    venv = VectorArm(arms[0], 3)
+    venv.rngs = [np.random.default_rng(seed) for seed in range(3)]
+
+    s = venv.reset()
+    for i, arm in enumerate(arms):
+        np.testing.assert_allclose(s[i], arm.reset())
+        np.testing.assert_allclose(venv.goals[i], arm.goal)
+        np.testing.assert_allclose(venv.angles[i], arm.angles)
+
+
+@pytest.mark.parametrize("n_links", [2, 5])
+def test_step_matches_arm(make_arm, n_links):
+    arms = [make_arm(n_links, seed=seed) for seed in range(3)]
+    for arm in arms:
+        arm.reset()
+    venv = VectorArm(arms[0], 3)
+    venv.set_state(
+        np.stack([arm.angles for arm in arms]), np.stack([arm.goal for arm in arms])
+    )
+
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        # out of bound actions are clipped, and the joints get pinned at their limits
+        actions = rng.uniform(-2, 2, (3, n_links))
+        s, r, done = venv.step(actions)
+        for i, arm in enumerate(arms):
+            s_i, r_i, done_i = arm.step(actions[i])
+            np.testing.assert_allclose(s[i], s_i)
+            assert r[i] == pytest.approx(r_i)
+            assert done[i] == done_i
+    np.testing.assert_allclose(venv.angles, np.stack([arm.angles for arm in arms]))
+
+
+def test_done_after_staying_on_goal(make_arm):
+    arm = make_arm(2)
+    goal = list(arm.endpoints[-1]) + [arm.goal_len]
+    arm.goal = goal
+    arm.on_goal = 1  # set_state flags the arms already on their goal
+    venv = VectorArm(arm, 2)
+    venv.set_state(np.tile(arm.angles, (2, 1)), np.tile(goal, (2, 1)))
+
+    actions = np.zeros((2, 2))
+    for step in range(1, 100):
+        _, r, done = venv.step(actions)
+        _, r_arm, done_arm = arm.step(actions[0])
+        assert done[0] == done[1] == done_arm
+        assert r[0] == pytest.approx(r_arm)
+        if done_arm:
+            break
+    assert step == 50
+
+
+def test_needs_an_env(make_arm):
+    with pytest.raises(ValueError):
+        VectorArm(make_arm(2), 0)
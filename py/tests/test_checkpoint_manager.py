@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+import typer
+
+import main
+from checkpoint_manager import CheckpointManager
+from replay_buffer import ReplayBuffer
+
+S_DIM, A_DIM = 3, 2
+
+
+class Model(object):
+    """the parts of the DDPG models used by the checkpoints"""
+
+    lr_a, lr_c, gamma, tau, batch_size = 0.001, 0.002, 0.9, 0.01, 4
+
+    def __init__(self, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        # the variable names of the models contain slashes
+        self.variables = {
+            "Actor/eval/l1/kernel": rng.random((S_DIM, 4)),
+            "Critic/eval/q/bias": rng.random(1),
+        }
+        self.memory = ReplayBuffer(16, S_DIM, A_DIM, seed=seed)
+        n = 5 + seed
+        self.memory.add_batch(
+            rng.random((n, S_DIM)),
+            rng.random((n, A_DIM)),
+            rng.random(n),
+            rng.random((n, S_DIM)),
+        )
+
+    def get_state(self):
+        return {name: value.copy() for name, value in self.variables.items()}
+
+    def set_state(self, state):
+        self.variables = {name: state[name] for name in self.variables}
+
+
+def saved_names(checkpoints):
+    return [c["name"] for c in checkpoints.index["checkpoints"]]
+
+
+def test_save_and_restore(tmp_path):
+    model = Model(0)
+    with CheckpointManager(str(tmp_path), save_every=2) as checkpoints:
+        assert not checkpoints.due(1) and checkpoints.due(2)
+        checkpoints.save(model, 2, -1.0, {"run": "a"})
+        checkpoints.wait()
+
+    restored = Model(1)
+    with CheckpointManager(str(tmp_path), save_every=2, resume=True) as checkpoints:
+        meta = checkpoints.restore(restored)
+    assert meta["run"] == "a" and meta["episode"] == 2
+    for name, value in model.variables.items():
+        np.testing.assert_array_equal(restored.variables[name], value)
+    assert restored.memory.pointer == model.memory.pointer
+    for ours, theirs in zip(
+        restored.memory.gather(np.arange(5)), model.memory.gather(np.arange(5))
+    ):
+        np.testing.assert_array_equal(ours, theirs)
+
+
+@pytest.mark.parametrize(
+    "keep_last, kept",
+    [(0, ["ckpt_00000002"]), (2, ["ckpt_00000002", "ckpt_00000008", "ckpt_00000010"])],
+)
+def test_keeps_the_recent_and_the_best(tmp_path, keep_last, kept):
+    model = Model()
+    with CheckpointManager(str(tmp_path), 2, keep_last) as checkpoints:
+        for episode, metric in ((2, 5.0), (4, 1.0), (6, 2.0), (8, 3.0), (10, 4.0)):
+            checkpoints.save(model, episode, metric)
+        checkpoints.wait()
+        assert sorted(saved_names(checkpoints)) == kept
+        assert checkpoints.best().endswith("ckpt_00000002")
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == kept
+
+
+def test_refuses_a_used_folder(tmp_path):
+    with CheckpointManager(str(tmp_path), 1) as checkpoints:
+        checkpoints.save(Model(), 1, 0.0)
+    with pytest.raises(FileExistsError):
+        CheckpointManager(str(tmp_path), 1)
+    with CheckpointManager(str(tmp_path), 1, resume=True) as checkpoints:
+        assert checkpoints.latest().endswith("ckpt_00000001")
+
+
+def test_refuses_a_negative_keep_last(tmp_path):
+    with pytest.raises(ValueError):
+        CheckpointManager(str(tmp_path), 1, -1)
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """the arm and a stand-in model of main, restored after the test"""
+    for name in ("env", "s_dim", "a_dim", "a_bound"):
+        monkeypatch.setattr(main, name, None)
+    main.setup_env()
+    monkeypatch.setattr(main, "rl_model", Model())
+    return main.run_metadata("v1", main.spawn_seeds(0))
+
+
+def test_resume_training(tmp_path, run):
+    rng_state = main.random_state()
+    history = {"steps": [3, 4], "rewards": [-1.0, -2.0], "random_state": rng_state}
+    with CheckpointManager(str(tmp_path), 2) as checkpoints:
+        checkpoints.save(main.rl_model, 2, -1.5, dict(run, **history))
+
+    main.rl_model = Model(1)
+    meta = dict(run, seeds=main.spawn_seeds(1))
+    with CheckpointManager(str(tmp_path), 2, resume=True) as checkpoints:
+        (steps, rewards), resumed = main.resume_training(checkpoints, meta)
+    assert (steps, rewards) == ([3, 4], [-1.0, -2.0])
+    assert resumed == rng_state
+    # the resumed run keeps the seeds of the checkpoint
+    assert meta["seeds"] == main.spawn_seeds(0)
+    assert main.rl_model.memory.pointer == Model(0).memory.pointer
+
+
+def test_resume_refuses_other_params(tmp_path, run):
+    with CheckpointManager(str(tmp_path), 2) as checkpoints:
+        checkpoints.save(main.rl_model, 2, 0.0, dict(run, steps=[], rewards=[]))
+    meta = dict(run, params=dict(run["params"], batch_size=8))
+    with CheckpointManager(str(tmp_path), 2, resume=True) as checkpoints:
+        with pytest.raises(typer.BadParameter):
+            main.resume_training(checkpoints, meta)
+
+
+def test_spawn_seeds():
+    seeds = main.spawn_seeds(0)
+    assert seeds == main.spawn_seeds(0)
+    assert sorted(seeds) == sorted(main.SEED_STREAMS)
+    assert len(set(seeds.values())) == len(seeds)
+    assert main.spawn_seeds(1) != seeds
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from numpy_policy import NumpyPolicy, save_actor
+
+S_DIM, A_DIM = 9, 2
+
+
+def test_matches_the_formula(tmp_path):
+    rng = np.random.default_rng(0)
+    w1, b1 = rng.normal(size=(S_DIM, 16)), rng.normal(size=16)
+    w2, b2 = rng.normal(size=(16, A_DIM)), rng.normal(size=A_DIM)
+    path = str(tmp_path / "actor.npz")
+    save_actor(path, w1, b1, w2, b2, 2.0)
+    policy = NumpyPolicy.load(path)
+    s = rng.random((4, S_DIM))
+    expected = 2.0 * np.tanh(np.maximum(s @ w1 + b1, 0) @ w2 + b2)
+    np.testing.assert_allclose(policy.choose_actions(s), expected, rtol=1e-5)
+    np.testing.assert_allclose(policy.choose_action(s[0]), expected[0], rtol=1e-5)
+
+
+def test_matches_the_tensorflow_actor(tmp_path):
+    # the tf2 backend, the compat.v1 one would disable the TF2 behavior of the process
+    tf2 = pytest.importorskip("arm_rl_model_tf2")
+    model = tf2.DDPG(A_DIM, S_DIM, [-1, 1], memory_capacity=64, batch_size=8)
+    rng = np.random.default_rng(0)
+    states = rng.uniform(-1, 1, (64, S_DIM)).astype(np.float32)
+    actions = rng.uniform(-1, 1, (64, A_DIM)).astype(np.float32)
+    rewards = rng.uniform(-1, 0, 64).astype(np.float32)
+    model.store_transitions(states, actions, rewards, np.roll(states, 1, axis=0))
+    model.learn(5)  # the exported weights are the trained ones
+
+    path = str(tmp_path / "actor.npz")
+    model.export_actor(path)
+    policy = NumpyPolicy.load(path)
+    np.testing.assert_allclose(
+        policy.choose_actions(states), model.choose_actions(states), atol=1e-5
+    )
+    np.testing.assert_allclose(
+        policy.choose_action(states[0]), model.choose_action(states[0]), atol=1e-5
+    )
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from replay_buffer import PrioritizedReplayBuffer, SumTree
+
+S_DIM, A_DIM = 3, 2
+
+
+def fill(memory, n: int):
+    """adds n transitions, the rewards count the rows"""
+    states = np.zeros((n, S_DIM))
+    memory.add_batch(states, np.zeros((n, A_DIM)), np.arange(n), states)
+
+
+@pytest.mark.parametrize("capacity", [1, 5, 8, 100])
+def test_sum_tree_sums(capacity):
+    rng = np.random.default_rng(capacity)
+    tree = SumTree(capacity)
+    values = rng.random(capacity)
+    tree.update(np.arange(capacity), values)
+    assert tree.total == pytest.approx(values.sum())
+    np.testing.assert_allclose(tree[np.arange(capacity)], values)
+    # a repeated leaf keeps its last value
+    tree.update([0, 0], [5.0, 2.0])
+    values[0] = 2.0
+    assert tree.total == pytest.approx(values.sum())
+
+
+def test_sum_tree_find():
+    tree = SumTree(5)
+    tree.update(np.arange(5), [1.0, 0.0, 2.0, 0.5, 0.5])
+    found = tree.find([0.0, 0.99, 1.0, 2.99, 3.0, 3.49, 3.5, 3.99])
+    np.testing.assert_array_equal(found, [0, 0, 2, 2, 3, 3, 4, 4])
+    # rounding past the total never lands on an empty leaf
+    assert tree.find([tree.total])[0] == 4
+
+
+def test_sum_tree_samples_proportionally():
+    rng = np.random.default_rng(0)
+    tree = SumTree(4)
+    priorities = np.array([1.0, 2.0, 3.0, 4.0])
+    tree.update(np.arange(4), priorities)
+    found = tree.find(rng.random(100_000) * tree.total)
+    frequencies = np.bincount(found, minlength=4) / len(found)
+    np.testing.assert_allclose(frequencies, priorities / priorities.sum(), atol=0.01)
+
+
+def test_new_transitions_get_the_max_priority():
+    memory = PrioritizedReplayBuffer(8, S_DIM, A_DIM, alpha=1.0, seed=0)
+    fill(memory, 4)
+    memory.update_priorities(np.arange(4), np.array([0.5, 1.0, 3.0, 0.0]))
+    fill(memory, 1)
+    assert memory.tree[4] == pytest.approx(3.0 + memory.epsilon)
+    assert memory.tree[3] == pytest.approx(memory.epsilon)
+
+
+def test_prioritized_sampling():
+    memory = PrioritizedReplayBuffer(16, S_DIM, A_DIM, alpha=1.0, seed=0)
+    fill(memory, 16)
+    td_errors = np.zeros(16)
+    td_errors[[3, 9]] = [1.0, 3.0]
+    memory.update_priorities(np.arange(16), td_errors)
+    indices = np.concatenate([memory.sample_indices(32) for _ in range(100)])
+    counts = np.bincount(indices, minlength=16)
+    assert counts[[3, 9]].sum() > 0.99 * len(indices)
+    assert counts[9] / counts[3] == pytest.approx(3.0, rel=0.1)
+    # the gathered rows are those of the sampled slots
+    _, _, rewards, _ = memory.gather(indices[:32])
+    np.testing.assert_array_equal(rewards[:, 0], indices[:32])
+
+
+def test_weights_and_beta_annealing():
+    memory = PrioritizedReplayBuffer(
+        4, S_DIM, A_DIM, alpha=1.0, beta=0.5, beta_steps=10, seed=0
+    )
+    fill(memory, 4)
+    memory.update_priorities(np.arange(4), np.array([1.0, 1.0, 2.0, 4.0]))
+    weights = memory.weights(np.arange(4))
+    # (N * P(i)) ** -beta normalized by the largest weight
+    probabilities = memory.tree[np.arange(4)] / memory.tree.total
+    expected = (4 * probabilities) ** -0.5
+    np.testing.assert_allclose(weights, expected / expected.max(), rtol=1e-5)
+    # one annealing step per sampled batch
+    assert memory.beta == pytest.approx(0.55)
+    memory.weights(np.arange(8) % 4, n_batches=2)
+    assert memory.beta == pytest.approx(0.65)
+    memory.weights(np.arange(4), n_batches=100)
+    assert memory.beta == 1.0
+
+
+def test_state_dict_round_trip():
+    memory = PrioritizedReplayBuffer(8, S_DIM, A_DIM, seed=0)
+    fill(memory, 6)
+    memory.update_priorities(np.arange(6), np.arange(6) / 2)
+    memory.weights(np.arange(6))
+    restored = PrioritizedReplayBuffer(8, S_DIM, A_DIM, seed=0)
+    restored.load_state_dict(memory.state_dict())
+    np.testing.assert_allclose(restored.tree[np.arange(8)], memory.tree[np.arange(8)])
+    assert restored.max_priority == memory.max_priority
+    assert restored.beta == memory.beta
+    assert len(restored) == 6
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from trajectory_recorder import TrajectoryReader, TrajectoryRecorder
+
+S_DIM, A_DIM, N_LINKS = 4, 2, 2
+
+
+def transitions(n: int, seed: int = 0):
+    """random transitions, the rewards count the rows"""
+    rng = np.random.default_rng(seed)
+    return (
+        rng.random((n, S_DIM)).astype(np.float32),
+        rng.random((n, A_DIM)).astype(np.float32),
+        np.arange(n, dtype=np.float32),
+        rng.random((n, S_DIM)).astype(np.float32),
+        rng.random((n, N_LINKS)).astype(np.float32),
+        rng.random((n, 3)).astype(np.float32),
+    )
+
+
+def test_round_trip_across_segments(tmp_path):
+    data = transitions(23)
+    with TrajectoryRecorder(tmp_path, S_DIM, A_DIM, N_LINKS, segment_size=5) as rec:
+        episodes = np.array([rec.new_episode() for _ in range(2)])
+        # the two episodes interleave, as the envs of a batch do
+        rec.record_batch(episodes[np.arange(23) % 2], *data)
+
+    reader = TrajectoryReader(tmp_path)
+    assert len(reader) == 23
+    assert reader.n_episodes == 2
+    assert reader.segments == [5, 5, 5, 5, 3]
+    s, a, r, s_ = reader.transitions()
+    for read, written in zip((s, a, r, s_), data):
+        np.testing.assert_array_equal(read, written)
+    # a slice inside a segment is a view of the file, across segments a copy
+    np.testing.assert_array_equal(reader.read("rewards", 6, 9), [6, 7, 8])
+    np.testing.assert_array_equal(reader.read("rewards", 3, 12), np.arange(3, 12))
+    episode = reader.episode(1)
+    np.testing.assert_array_equal(episode["rewards"], np.arange(1, 23, 2))
+    np.testing.assert_array_equal(episode["angles"], data[4][1::2])
+
+
+def test_single_transitions(tmp_path):
+    data = transitions(3)
+    with TrajectoryRecorder(tmp_path, S_DIM, A_DIM, N_LINKS) as rec:
+        episode = rec.new_episode()
+        for row in zip(*data):
+            rec.record(episode, *row)
+    frames = TrajectoryReader(tmp_path).episode(0)
+    np.testing.assert_array_equal(frames["observations"], data[0])
+    np.testing.assert_array_equal(frames["goals"], data[5])
+
+
+def test_empty_recording(tmp_path):
+    TrajectoryRecorder(tmp_path, S_DIM, A_DIM, N_LINKS).close()
+    reader = TrajectoryReader(tmp_path)
+    assert len(reader) == 0
+    assert [x.shape for x in reader.transitions()] == [
+        (0, S_DIM),
+        (0, A_DIM),
+        (0,),
+        (0, S_DIM),
+    ]
+    assert reader.episode(0)["angles"].shape == (0, N_LINKS)
+    with pytest.raises(IndexError):
+        reader.segment("rewards", 0)
+
+
+def test_index_is_flushed_before_close(tmp_path):
+    data = transitions(12)
+    rec = TrajectoryRecorder(tmp_path, S_DIM, A_DIM, N_LINKS, 5, flush_every=2)
+    for i in range(3):
+        episode = rec.new_episode()
+        rows = slice(4 * i, 4 * (i + 1))
+        rec.record_batch(np.full(4, episode), *(x[rows] for x in data))
+    # the run is killed here, the index has the rows of the full segments
+    reader = TrajectoryReader(tmp_path)
+    assert len(reader) == 10
+    np.testing.assert_array_equal(reader.read("rewards"), np.arange(10))
+
+
+def test_refuses_an_existing_recording(tmp_path):
+    TrajectoryRecorder(tmp_path, S_DIM, A_DIM, N_LINKS).close()
+    with pytest.raises(FileExistsError):
+        TrajectoryRecorder(tmp_path, S_DIM, A_DIM, N_LINKS)
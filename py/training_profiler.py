@@ -0,0 +1,146 @@
+import functools
+import time
+import typing
+
+
+class PhaseStats(object):
+    """Accumulated calls, items and time of a phase."""
+
+    __slots__ = ("calls", "items", "seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+
+
+class TrainingProfiler(object):
+    """Per-phase timers and counters of a training run. The phases are measured by wrapping
+    the methods of the env, the model and the memory on the instances, so nothing is
+    wrapped and the hot paths are untouched when the profiler is disabled. A summary of the
+    phases and of the steps and updates per second is printed every `report_every`
+    seconds, and an optional `trace` callback can export the traces of the framework."""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        report_every: float = 30.0,
+        trace: typing.Callable[[int], bool] = None,
+        n_traces: int = 1,
+        clock: typing.Callable[[], float] = time.perf_counter,
+    ):
+        """
+        :param enabled: measure the phases, the profiler does nothing otherwise
+        :param report_every: the seconds between two printed summaries, 0 to only print
+            the final one
+        :param trace: called at a report with the index of the trace, it exports a trace
+            and returns whether it did, e.g. False while the model is not learning yet
+        :param n_traces: the number of traces exported
+        :param clock: the clock of the timers
+        """
+        self.enabled = enabled
+        self.report_every = report_every
+        self.trace = trace
+        self.n_traces = n_traces
+        self.clock = clock
+        self.phases: typing.Dict[str, PhaseStats] = {}
+        self.traces = 0
+        self.start = self._last_report = clock()
+        self._last_items: typing.Dict[str, int] = {}
+        self._tracing = False
+
+    def instrument(
+        self,
+        obj,
+        method: str,
+        phase: str,
+        items: typing.Callable[..., int] = None,
+    ):
+        """
+        Measures the calls of a method of an object as a phase, the method is replaced on
+        the instance only, and only when the profiler is enabled.
+        :param obj: the object
+        :param method: the name of the method
+        :param phase: the name of the phase
+        :param items: computes the number of items of a call from its arguments, e.g. the
+            transitions of a batch, 1 per call if None
+        :return:
+        """
+        if not self.enabled or obj is None:
+            return
+        function = getattr(obj, method)
+        stats = self.phases.setdefault(phase, PhaseStats())
+        clock = self.clock
+
+        @functools.wraps(function)
+        def measured(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = clock()
+                stats.calls += 1
+                stats.items += 1 if items is None else items(*args, **kwargs)
+                stats.seconds += end - start
+                if self.report_every and end - self._last_report >= self.report_every:
+                    self.report(end)
+
+        setattr(obj, method, measured)
+
+    def summary(self, now: float = None) -> typing.Dict[str, typing.Dict[str, float]]:
+        """
+        Summarizes the phases measured so far.
+        :param now: the current time of the clock
+        :return: by phase the calls, the items, the total seconds, the mean milliseconds
+            per call, the share of the wall time and the items per second
+        """
+        now = self.clock() if now is None else now
+        wall = max(now - self.start, 1e-9)
+        return {
+            name: {
+                "calls": stats.calls,
+                "items": stats.items,
+                "seconds": stats.seconds,
+                "ms_per_call": 1e3 * stats.seconds / max(stats.calls, 1),
+                "share": stats.seconds / wall,
+                "items_per_s": stats.items / wall,
+            }
+            for name, stats in self.phases.items()
+        }
+
+    def report(self, now: float = None):
+        """
+        Prints the summary of the phases, the rates of the items since the last report and
+        exports a trace when one is due.
+        :param now: the current time of the clock
+        :return:
+        """
+        now = self.clock() if now is None else now
+        interval = max(now - self._last_report, 1e-9)
+        lines = [f"Profile after {now - self.start:.1f}s"]
+        for name, stats in self.summary(now).items():
+            recent = (stats["items"] - self._last_items.get(name, 0)) / interval
+            self._last_items[name] = stats["items"]
+            lines.append(
+                f"  {name:<12} {stats['share']:6.1%} {stats['ms_per_call']:9.3f} ms/call"
+                f" {recent:10.1f}/s ({stats['calls']} calls, {stats['items']} items)"
+            )
+        print("\n".join(lines))
+        self._last_report = now
+        # the traced updates are measured like the others, a trace does not nest
+        if self.trace and self.traces < self.n_traces and not self._tracing:
+            self._tracing = True
+            try:
+                if self.trace(self.traces):
+                    self.traces += 1
+            finally:
+                self._tracing = False
+            self._last_report = self.clock()
+
+    def close(self):
+        """
+        Prints the final summary.
+        :return:
+        """
+        if self.enabled:
+            self.report()
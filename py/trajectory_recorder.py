@@ -0,0 +1,300 @@
+import glob
+import json
+import os
+import typing
+
+import numpy as np
+
+INDEX_FILE = "index.json"
+
+
+def trajectory_fields(
+    state_dim: int, action_dim: int, n_links: int
+) -> typing.Dict[str, typing.Tuple[str, typing.Tuple]]:
+    """
+    Returns the dtype and the per step shape of every recorded field.
+    :param state_dim: the dimension of the observations
+    :param action_dim: the dimension of the actions
+    :param n_links: the number of links of the arm
+    :return: a dict field -> (dtype, shape)
+    """
+    return {
+        "episodes": ("<i8", ()),
+        "observations": ("<f4", (state_dim,)),
+        "actions": ("<f4", (action_dim,)),
+        "rewards": ("<f4", ()),
+        "next_observations": ("<f4", (state_dim,)),
+        "angles": ("<f4", (n_links,)),
+        "goals": ("<f4", (3,)),
+    }
+
+
+class TrajectoryRecorder(object):
+    """Streams the transitions of the rollouts into append-only memory-mapped .npy segments.
+    Every field has its own segment files of `segment_size` rows, a small json index keeps
+    track of the rows written, so recording never holds more than the open segments in RAM.
+    The index is rewritten when a segment is full and every `flush_every` episodes, so a
+    killed run keeps what was recorded up to its last flush.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        state_dim: int,
+        action_dim: int,
+        n_links: int,
+        segment_size: int = 100_000,
+        flush_every: int = 100,
+    ):
+        """
+        :param root: the folder of the recording, it is created if it does not exist
+        :param state_dim: the dimension of the observations
+        :param action_dim: the dimension of the actions
+        :param n_links: the number of links of the arm
+        :param segment_size: the number of rows of every segment file
+        :param flush_every: the episodes between two flushes of the index
+        """
+        self.root = root
+        self.fields = trajectory_fields(state_dim, action_dim, n_links)
+        self.segment_size = segment_size
+        self.flush_every = flush_every
+        self.segments = []  # rows written in every segment
+        self.n_steps = 0
+        self.n_episodes = 0
+        self._arrays = {}
+        os.makedirs(root, exist_ok=True)
+        # the segments of a run killed before its first flush have no index
+        if os.path.exists(os.path.join(root, INDEX_FILE)) or glob.glob(
+            os.path.join(root, "*_00000.npy")
+        ):
+            raise FileExistsError(f"There is already a recording in {root}.")
+
+    def _open_segment(self):
+        """creates the files of a new segment"""
+        segment = len(self.segments)
+        self._arrays = {
+            field: np.lib.format.open_memmap(
+                os.path.join(self.root, f"{field}_{segment:05d}.npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(self.segment_size,) + shape,
+            )
+            for field, (dtype, shape) in self.fields.items()
+        }
+        self.segments.append(0)
+
+    def new_episode(self) -> int:
+        """
+        Reserves the id of a new episode, the index is flushed every `flush_every`
+        episodes.
+        :return: the episode id
+        """
+        if self.n_episodes > 0 and self.n_episodes % self.flush_every == 0:
+            self.flush()
+        self.n_episodes += 1
+        return self.n_episodes - 1
+
+    def record_batch(
+        self,
+        episodes: np.ndarray,
+        observations: np.ndarray,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        next_observations: np.ndarray,
+        angles: np.ndarray,
+        goals: np.ndarray,
+    ):
+        """
+        Appends a batch of transitions, all the arguments have the same leading dimension.
+        :param episodes: the episode id of every transition
+        :param observations: the observations before the step
+        :param actions: the actions
+        :param rewards: the rewards
+        :param next_observations: the observations after the step
+        :param angles: the local angles of the links after the step
+        :param goals: the goals
+        :return:
+        """
+        batch = {
+            "episodes": episodes,
+            "observations": observations,
+            "actions": actions,
+            "rewards": rewards,
+            "next_observations": next_observations,
+            "angles": angles,
+            "goals": goals,
+        }
+        n = len(rewards)
+        written = 0
+        while written < n:
+            if not self.segments or self.segments[-1] == self.segment_size:
+                if self.segments:
+                    self.flush()  # the full segment is complete on the disk
+                self._open_segment()
+            row = self.segments[-1]
+            count = min(n - written, self.segment_size - row)
+            for field, array in self._arrays.items():
+                array[row : row + count] = batch[field][written : written + count]
+            self.segments[-1] += count
+            self.n_steps += count  # the flush of a full segment counts its rows
+            written += count
+
+    def record(self, episode: int, s, a, r, s_, angles, goal):
+        """
+        Appends a single transition.
+        """
+        self.record_batch(
+            np.array([episode]),
+            np.asarray(s)[None],
+            np.asarray(a)[None],
+            np.array([r]),
+            np.asarray(s_)[None],
+            np.asarray(angles)[None],
+            np.asarray(goal)[None],
+        )
+
+    def flush(self):
+        """
+        Flushes the open segment and the index to the disk.
+        :return:
+        """
+        for array in self._arrays.values():
+            array.flush()
+        index = {
+            "fields": {
+                field: {"dtype": dtype, "shape": list(shape)}
+                for field, (dtype, shape) in self.fields.items()
+            },
+            "segment_size": self.segment_size,
+            "segments": self.segments,
+            "n_steps": self.n_steps,
+            "n_episodes": self.n_episodes,
+        }
+        path = os.path.join(self.root, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        """
+        Flushes and closes the open segment.
+        :return:
+        """
+        self.flush()
+        self._arrays = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TrajectoryReader(object):
+    """Reads a recording, the segments are opened as read only memory maps so slices that
+    fall into a single segment are zero-copy views."""
+
+    def __init__(self, root: str):
+        """
+        :param root: the folder of the recording
+        """
+        self.root = root
+        with open(os.path.join(root, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.fields = list(index["fields"])
+        self._specs = index["fields"]
+        self.segment_size = index["segment_size"]
+        self.segments = index["segments"]
+        self.n_steps = index["n_steps"]
+        self.n_episodes = index["n_episodes"]
+        self._cache = {}
+
+    def __len__(self):
+        return self.n_steps
+
+    def segment(self, field: str, segment: int) -> np.ndarray:
+        """
+        Returns the rows written in a segment of a field as a read only memory map.
+        :param field: the field name
+        :param segment: the segment number
+        :return: the memory mapped rows
+        """
+        if not 0 <= segment < len(self.segments):
+            raise IndexError(f"The recording in {self.root} has no segment {segment}.")
+        key = (field, segment)
+        if key not in self._cache:
+            path = os.path.join(self.root, f"{field}_{segment:05d}.npy")
+            self._cache[key] = np.load(path, mmap_mode="r")[: self.segments[segment]]
+        return self._cache[key]
+
+    def read(self, field: str, start: int = 0, stop: int = None) -> np.ndarray:
+        """
+        Reads the rows [start, stop) of a field, the result is a view when the rows belong
+        to a single segment, otherwise the segments are concatenated into a new array.
+        :param field: the field name
+        :param start: the first row
+        :param stop: the end row, the end of the recording if None
+        :return: the rows
+        """
+        stop = self.n_steps if stop is None else min(stop, self.n_steps)
+        if stop <= start:
+            # e.g. a recording without any segment
+            return self._empty(field)
+        first, last = (
+            start // self.segment_size,
+            max(stop - 1, start) // self.segment_size,
+        )
+        if first == last:
+            offset = first * self.segment_size
+            return self.segment(field, first)[start - offset : stop - offset]
+        parts = []
+        for segment in range(first, last + 1):
+            offset = segment * self.segment_size
+            parts.append(
+                self.segment(field, segment)[max(start - offset, 0) : stop - offset]
+            )
+        return np.concatenate(parts)
+
+    def episode(self, episode: int) -> typing.Dict[str, np.ndarray]:
+        """
+        Gathers every field of an episode.
+        :param episode: the episode id
+        :return: a dict field -> rows of the episode
+        """
+        rows = [np.empty(0, dtype=np.int64)]
+        for segment in range(len(self.segments)):
+            found = np.flatnonzero(self.segment("episodes", segment) == episode)
+            rows.append(found + segment * self.segment_size)
+        rows = np.concatenate(rows)
+        return {field: self._take(field, rows) for field in self.fields}
+
+    def _empty(self, field: str) -> np.ndarray:
+        """no rows of a field"""
+        spec = self._specs[field]
+        return np.empty((0,) + tuple(spec["shape"]), dtype=spec["dtype"])
+
+    def _take(self, field: str, rows: np.ndarray) -> np.ndarray:
+        """gathers arbitrary rows of a field"""
+        if len(rows) == 0:
+            return self._empty(field)
+        if rows[-1] - rows[0] + 1 == len(rows):
+            return self.read(field, int(rows[0]), int(rows[-1]) + 1)
+        parts = [
+            self.segment(field, segment)[
+                rows[rows // self.segment_size == segment] - segment * self.segment_size
+            ]
+            for segment in range(len(self.segments))
+        ]
+        return np.concatenate(parts)
+
+    def transitions(
+        self, start: int = 0, stop: int = None
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the (s, a, r, s_) arrays of the rows [start, stop), e.g. to warm start the
+        replay memory.
+        """
+        return tuple(
+            self.read(field, start, stop)
+            for field in ("observations", "actions", "rewards", "next_observations")
+        )